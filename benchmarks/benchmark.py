@@ -0,0 +1,281 @@
+'''
+Benchmark the Brain and the robot against the local fake Twitter API
+
+Usage:
+    python3 benchmarks/benchmark.py [--scale=10000,100000,1000000]
+        [--only=NAME,...] [--output=FILE] [--compare=FILE] [--no-memory]
+
+Every benchmark and scale prints one JSON line with throughput, p50 and
+p99 latencies per sample and the peak of memory traced in Python, to be kept with
+--output and compared against a former run with --compare.
+'''
+
+import json
+import logging
+import os
+import platform
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pylint: disable=wrong-import-position
+from karlsruher import __version__
+from karlsruher.brain import Brain
+from karlsruher.karlsruher import Karlsruher, retweet_mentions
+from karlsruher.tweepyx import tweepyx
+
+
+# Number of single operations to time per Brain benchmark:
+SAMPLES = 1000
+
+# Number of runs per robot benchmark:
+RUNS = 3
+
+# Temporary directories to remove after all benchmarks:
+TEMPORARY = []
+
+
+def percentile(durations, percent):
+    ''':return: The percentile of the sorted durations.'''
+    return durations[min(len(durations) - 1, int(len(durations) * percent / 100))]
+
+
+def timed(function, *args):
+    ''':return: Seconds the function took.'''
+    started = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - started
+
+
+def temporary():
+    ''':return: A new temporary directory.'''
+    TEMPORARY.append(tempfile.mkdtemp(prefix='karlsruher-benchmark-'))
+    return TEMPORARY[-1]
+
+
+def filled_brain(scale, cache=None):
+    ''':return: A Brain with scale followers, in a temporary file like in production.'''
+    brain = Brain(os.path.join(temporary(), 'brain'), cache=cache)
+    brain.store_many('follower', range(scale))
+    return brain
+
+
+## Brain benchmarks, returning operations per sample and sample durations:
+
+def brain_store(scale):
+    '''Store single entries into a filled space.'''
+    brain = filled_brain(scale)
+    return 1, [timed(brain.store, 'follower', scale + i) for i in range(SAMPLES)]
+
+
+def brain_store_many(scale):
+    '''Store all entries at once.'''
+    brain = filled_brain(0)
+    return scale, [timed(brain.store_many, 'follower', range(scale))]
+
+
+def brain_has(scale):
+    '''Look up single entries, half of them missing.'''
+    brain = filled_brain(scale)
+    return 1, [timed(brain.has, 'follower', i * 2 * scale // SAMPLES) for i in range(SAMPLES)]
+
+
+def brain_has_cached(scale):
+    '''Look up single entries in a cached space, half of them missing.'''
+    brain = filled_brain(scale, cache=('follower',))
+    brain.has('follower', 0)
+    return 1, [timed(brain.has, 'follower', i * 2 * scale // SAMPLES) for i in range(SAMPLES)]
+
+
+def brain_has_many(scale):
+    '''Look up all entries at once, half of them missing.'''
+    brain = filled_brain(scale)
+    return scale, [timed(brain.has_many, 'follower', range(scale // 2, scale + scale // 2))]
+
+
+def brain_get(scale):
+    '''Get the data of single entries.'''
+    brain = filled_brain(scale)
+    return 1, [timed(brain.get, 'follower', i * scale // SAMPLES) for i in range(SAMPLES)]
+
+
+def brain_forget(scale):
+    '''Forget single entries.'''
+    brain = filled_brain(scale)
+    return 1, [timed(brain.forget, 'follower', i * scale // SAMPLES) for i in range(SAMPLES)]
+
+
+def brain_replace(scale):
+    '''Replace a space by a tenth changed delta.'''
+    brain = filled_brain(scale)
+    return scale, [timed(brain.replace, 'follower', range(scale // 10, scale + scale // 10))]
+
+
+## Robot benchmarks against the fake API, returning 1 run per sample and run durations:
+
+class FakeTwitterProcess:
+    '''
+    Run the fake Twitter API in a subprocess, apart from what is measured.
+    '''
+
+    def __init__(self, **options):
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'karlsruher.fakeapi', '--port=0'] + [
+                '--{}={}'.format(name, value) for name, value in options.items()
+            ],
+            stdout=subprocess.PIPE, universal_newlines=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        )
+        self.base_url = re.search(r"'(http://[^']+)'", self.process.stdout.readline()).group(1)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.process.terminate()
+        self.process.wait()
+        self.process.stdout.close()
+
+
+def robot(base_url):
+    ''':return: An unpaced robot in a temporary home, pointed at base_url.'''
+    home = temporary()
+    with open(os.path.join(home, 'auth.yaml'), 'w') as yaml_file:
+        yaml_file.write(tweepyx.YAML_TEMPLATE.format('A', 'B', 'C', 'D'))
+        yaml_file.write("\n    url: '{}'\n".format(base_url))
+    karlsruher = Karlsruher(home)
+    # Measure the robot, not Twitter's rate limits:
+    karlsruher.pacer.endpoints = {}
+    karlsruher.pacer.default = ('default', 10 ** 9, 1)
+    return karlsruher
+
+
+def done(karlsruher):
+    ''':param karlsruher: A robot to clean up.'''
+    karlsruher.aio.close()
+    karlsruher.unlock()
+    karlsruher.brain.connection.close()
+
+
+def housekeeping(scale):
+    '''Import scale followers and a tenth friends, into an empty brain.'''
+    durations = []
+    with FakeTwitterProcess(followers=scale, friends=scale // 10) as server:
+        for _ in range(RUNS):
+            karlsruher = robot(server.base_url)
+            durations.append(timed(karlsruher.housekeeping))
+            done(karlsruher)
+    return 1, durations
+
+
+def housekeeping_delta(scale):
+    '''Import scale followers and a tenth friends, into a filled brain.'''
+    durations = []
+    with FakeTwitterProcess(followers=scale, friends=scale // 10) as server:
+        karlsruher = robot(server.base_url)
+        karlsruher.housekeeping()
+        for _ in range(RUNS):
+            durations.append(timed(karlsruher.housekeeping))
+        done(karlsruher)
+    return 1, durations
+
+
+def retweet(scale):
+    '''Read and retweet a hundredth of scale mentions by scale followers.'''
+    durations = []
+    with FakeTwitterProcess(followers=scale, friends=0, mentions=max(scale // 100, 1)) as server:
+        for _ in range(RUNS):
+            karlsruher = robot(server.base_url)
+            karlsruher.housekeeping()
+            # Page through all mentions:
+            karlsruher.brain.store('mention', 'since_id', 1)
+            karlsruher.queue.max_attempts = 1
+            durations.append(timed(lambda: (retweet_mentions(karlsruher), karlsruher.drain())))
+            done(karlsruher)
+    return 1, durations
+
+
+BENCHMARKS = (
+    brain_store, brain_store_many, brain_has, brain_has_cached, brain_has_many,
+    brain_get, brain_forget, brain_replace, housekeeping, housekeeping_delta, retweet
+)
+
+
+def measure(benchmark, scale, memory=True):
+    '''
+    Run a benchmark, once more with traced memory.
+
+    :return: The result as dict.
+    '''
+    ops, durations = benchmark(scale)
+    durations.sort()
+    result = {
+        'benchmark': benchmark.__name__,
+        'scale': scale,
+        'version': __version__,
+        'python': platform.python_version(),
+        'samples': len(durations),
+        'ops_per_second': round(ops * len(durations) / sum(durations), 1),
+        'p50_ms': round(percentile(durations, 50) * 1000, 4),
+        'p99_ms': round(percentile(durations, 99) * 1000, 4),
+    }
+    if memory:
+        tracemalloc.start()
+        benchmark(scale)
+        result['peak_kib'] = tracemalloc.get_traced_memory()[1] // 1024
+        tracemalloc.stop()
+    return result
+
+
+def compare(result, baseline):
+    ''':return: The throughput ratio to the baseline as text.'''
+    for former in baseline:
+        if (former['benchmark'], former['scale']) == (result['benchmark'], result['scale']):
+            return '{:.2f}x {} ops/s of v{}'.format(
+                result['ops_per_second'] / former['ops_per_second'],
+                result['ops_per_second'], former['version']
+            )
+    return 'no baseline'
+
+
+def main():
+    '''
+    Run the benchmarks as given by the options.
+    '''
+    options = dict(
+        arg[2:].split('=', 1) for arg in sys.argv[1:] if arg.startswith('--') and '=' in arg
+    )
+    scales = [int(scale) for scale in options.get('scale', '10000,100000,1000000').split(',')]
+    names = options['only'].split(',') if 'only' in options else None
+    baseline = []
+    if 'compare' in options:
+        with open(options['compare']) as baseline_file:
+            baseline = [json.loads(line) for line in baseline_file if line.strip()]
+    output = open(options['output'], 'a') if 'output' in options else None
+    logging.basicConfig(level=logging.ERROR)
+    try:
+        for scale in scales:
+            for benchmark in BENCHMARKS:
+                if names and benchmark.__name__ not in names:
+                    continue
+                result = measure(benchmark, scale, '--no-memory' not in sys.argv)
+                print(json.dumps(result, sort_keys=True), flush=True)
+                if baseline:
+                    print('  {}'.format(compare(result, baseline)), file=sys.stderr)
+                if output:
+                    output.write(json.dumps(result, sort_keys=True) + '\n')
+    finally:
+        if output:
+            output.close()
+        for directory in TEMPORARY:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
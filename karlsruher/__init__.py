@@ -2,12 +2,49 @@
 Karlsruher
 '''
 
+# The lazy names of __all__ are resolved by the module __getattr__ below:
+# pylint: disable=undefined-all-variable
+
+import importlib
+import sys
+
 __author__ = 'Sascha Schlindwein'
 __credits__ = ['@syn2']
 
 from .__version__ import __version__
-from .tweepyx import tweepyx
-from .brain import Brain
-from .karlsruher import Karlsruher, CONSOLE_HELP_TEXT, read_mentions, retweet_mentions
-from .rheinpegel import rhein
-from .vergisses import delete_aged_tweets
+
+# Public names and their modules, imported on first access, so importing
+# the package for the console or setup.py does not import tweepy & Co.:
+EXPORTS = {
+    'tweepyx': 'tweepyx',
+    'Brain': 'brain',
+    'Karlsruher': 'karlsruher',
+    'CONSOLE_HELP_TEXT': 'commands',
+    'read_mentions': 'karlsruher',
+    'retweet_mentions': 'karlsruher',
+    'rhein': 'rheinpegel',
+    'delete_aged_tweets': 'vergisses',
+    'Scheduler': 'scheduler',
+    'Runner': 'runner',
+    'Pipeline': 'pipeline',
+    'Stage': 'pipeline',
+}
+
+__all__ = ['__version__'] + list(EXPORTS)
+
+
+def __getattr__(name):
+    '''
+    :param name: A public name.
+    :return: The object, imported from its module.
+    '''
+    if name not in EXPORTS:
+        raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+    value = getattr(importlib.import_module('.' + EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+if sys.version_info < (3, 7): # pragma: no cover, no module __getattr__ before
+    for export in EXPORTS:
+        __getattr__(export)
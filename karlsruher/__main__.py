@@ -3,17 +3,109 @@ Main function, logging configuration, run application
 '''
 
 import logging
+import signal
 import sys
 
-from karlsruher import Karlsruher
-from karlsruher import CONSOLE_HELP_TEXT
-from karlsruher import read_mentions
-from karlsruher import retweet_mentions
-from karlsruher import delete_aged_tweets
-from karlsruher import rhein
+from karlsruher.commands import CONSOLE_HELP_TEXT, drain, refresh, selected
+from karlsruher.scheduler import Scheduler
 
 
-# pylint: disable=too-many-branches
+def options(name):
+    '''
+    :param name: The name of an option given as "--name=value", maybe repeated.
+    :return: The values of the option, in order.
+    '''
+    prefix = '--{}='.format(name)
+    return [arg[len(prefix):] for arg in sys.argv if arg.startswith(prefix)]
+
+
+def option(name, default=None):
+    '''
+    :param name: The name of an option given as "--name=value".
+    :return: The value of the option, or the default.
+    '''
+    values = options(name)
+    return values[0] if values else default
+
+
+def listed(value):
+    ''':return: The comma separated value as tuple.'''
+    return tuple(value.split(','))
+
+
+# Options of every account as option name, attribute and type:
+ACCOUNT_OPTIONS = (
+    ('identity-ttl', 'identity_ttl', float),
+    ('budget', 'budget', int),
+    ('bulk', 'bulk', int),
+    ('stations', 'stations', listed),
+    ('timeseries', 'timeseries', listed),
+)
+
+
+def configure(runner):
+    '''
+    Apply the given account options to every account.
+
+    :param runner: A Runner instance.
+    '''
+    for karlsruher in runner.accounts:
+        for name, attribute, convert in ACCOUNT_OPTIONS:
+            if option(name):
+                setattr(karlsruher, attribute, convert(option(name)))
+
+
+def daemon(runner, commands):
+    '''
+    Repeat the given commands at their intervals until SIGTERM or SIGINT.
+    :param runner: A Runner instance.
+    :param commands: The given Command instances.
+    '''
+    from karlsruher.metrics import REGISTRY # pylint: disable=import-outside-toplevel
+    scheduler = Scheduler()
+    for command in commands:
+        function = command.function
+        if command.interval:
+            scheduler.every(
+                float(option('interval-{}'.format(command.name), command.interval)),
+                command.name, runner.submit, [function]
+            )
+    if not scheduler.jobs:
+        raise RuntimeError('Please specify commands to run as daemon.')
+    if drain not in [command.function for command in commands]:
+        scheduler.every(float(option('interval-drain', 30)), 'drain', runner.submit, [drain])
+    scheduler.every(
+        min(karlsruher.identity_ttl for karlsruher in runner.accounts),
+        'refresh', runner.submit, [refresh]
+    )
+    if option('metrics'):
+        scheduler.every(60, 'metrics', REGISTRY.write, option('metrics'))
+    if option('metrics-port'):
+        REGISTRY.serve(int(option('metrics-port')))
+    signal.signal(signal.SIGTERM, scheduler.stop)
+    signal.signal(signal.SIGINT, scheduler.stop)
+    scheduler.run()
+
+
+def profile(runner, commands):
+    '''
+    Run commands for one account after the other in this thread, profiled
+    into the home directory of each account.
+
+    :param runner: A Runner instance.
+    :param commands: The functions to call with each instance, in order.
+    :return: True if all commands succeeded.
+    '''
+    from karlsruher.profiling import profiled # pylint: disable=import-outside-toplevel
+    name = '-'.join(command.__name__ for command in commands)
+    succeeded = True
+    for karlsruher in runner.accounts:
+        with profiled(karlsruher.home, name):
+            succeeded = runner.execute(karlsruher, commands) and succeeded
+    return succeeded
+
+
+# pylint: disable=too-many-return-statements
 def main():
     '''
     Main function.
@@ -39,26 +131,14 @@ def main():
         print(CONSOLE_HELP_TEXT.splitlines()[0])
         return 0
 
-    try:
-        karlsruher = Karlsruher()
-
-        if '-housekeeping' in sys.argv:
-            karlsruher.housekeeping()
-        if '-wakeup' in sys.argv:
-            karlsruher.wake_up('console')
-        if '-sleep' in sys.argv:
-            karlsruher.go_sleep('console')
-        if '-read' in sys.argv:
-            read_mentions(karlsruher)
-        if '-retweet' in sys.argv:
-            retweet_mentions(karlsruher)
-        if '-forget' in sys.argv:
-            delete_aged_tweets(karlsruher)
-        if '-rhein' in sys.argv:
-            rhein(karlsruher)
-
-        return 0
+    # Import the robot and the given commands only when running them:
+    # pylint: disable=import-outside-toplevel
+    from karlsruher.metrics import REGISTRY
+    from karlsruher.runner import Runner
+    commands = selected(sys.argv)
 
+    try:
+        runner = Runner(options('home') or [None], workers=int(option('workers', 4)))
     except NotADirectoryError as not_a_dir_error:
         print(not_a_dir_error)
         return 1
@@ -66,6 +146,29 @@ def main():
         print(runtime_error)
         return 1
 
+    try:
+        configure(runner)
+
+        if '-daemon' in sys.argv:
+            daemon(runner, commands)
+            return 0
+
+        # Queued actions are always sent after the given commands:
+        functions = [command.function for command in commands if command.function is not drain]
+        functions.append(drain)
+        if '-profile' in sys.argv:
+            return 0 if profile(runner, functions) else 1
+        futures = runner.submit(functions)
+        return 0 if all(future.result() for future in futures) else 1
+
+    except RuntimeError as runtime_error:
+        print(runtime_error)
+        return 1
+    finally:
+        runner.close()
+        if option('metrics'):
+            REGISTRY.write(option('metrics'))
+
 
 if __name__ == '__main__':
     sys.exit(main())
@@ -0,0 +1,147 @@
+'''
+Durable queue of outbound Twitter API actions, kept in the brain
+'''
+
+import hashlib
+import json
+import logging
+import time
+
+from tweepy.error import TweepError
+
+from .metrics import REGISTRY
+from .vergisses import index_tweets
+
+
+class ActionQueue:
+    '''
+    Keep outbound API calls in the brain until they succeeded.
+
+    Every action is stored under an idempotency key, so it is enqueued
+    once only. The drainer sends due actions in concurrent batches, retries
+    failing ones with exponential backoff and drops them after max_attempts
+    or on permanent errors. The due time of an action is its timestamp in
+    the brain, so due actions are found by index. Actions survive restarts.
+    An action resent after a crash that already succeeded is recognized by
+    Twitter's duplicate error codes.
+    '''
+
+    # Brain space of the queue:
+    space = 'queue'
+
+    # Number of actions to send concurrently:
+    batch_size = 10
+
+    # Number of attempts before an action is dropped:
+    max_attempts = 8
+
+    # Seconds to wait before the first retry, doubled for every further one:
+    backoff = 60
+
+    # Twitter error codes meaning the action has already happened:
+    done_codes = (187, 327)
+
+    # Twitter error codes meaning the action will never succeed:
+    permanent_codes = (34, 136, 144, 179, 186, 385)
+
+    # Endpoints creating own tweets, to index for deleting them when aged:
+    tweeting = ('retweet', 'update_status')
+
+    def __init__(self, brain, aio):
+        '''
+        :param brain: The Brain to keep the actions in.
+        :param aio: The AsyncAPI to send the actions with.
+        '''
+        self.logger = logging.getLogger(__class__.__name__)
+        self.brain = brain
+        self.aio = aio
+
+    def __len__(self):
+        ''':return: Number of queued actions.'''
+        return self.brain.count(self.space)
+
+
+    def enqueue(self, endpoint, key=None, **params):
+        '''
+        Queue an API call, unless its key is queued already.
+
+        :param endpoint: The name of the API method, like retweet.
+        :param key: Optional idempotency key, derived from the call by default.
+        :param params: The parameters of the API method.
+        :return: True if queued, False if the key was queued already.
+        '''
+        if not key:
+            key = '{}:{}'.format(endpoint, hashlib.sha1(
+                json.dumps(params, sort_keys=True).encode('utf-8')
+            ).hexdigest())
+        if self.brain.has(self.space, key):
+            return False
+        self.logger.debug('Enqueue %s %s', key, params)
+        self.brain.store(self.space, key, json.dumps(
+            {'endpoint': endpoint, 'params': params, 'attempts': 0}
+        ))
+        return True
+
+
+    def due(self):
+        '''
+        :return: The next batch of due actions as list of key and action, oldest first.
+        '''
+        return [
+            (key, json.loads(data)) for key, data in self.brain.due(self.space, self.batch_size)
+        ]
+
+
+    def drain(self):
+        '''
+        Send all due actions, batch by batch.
+
+        :return: Number of actions sent successfully.
+        '''
+        sent = 0
+        batch = self.due()
+        while batch:
+            results = self.aio.gather(*(
+                self.aio.request(action['endpoint'], **action['params']) for _, action in batch
+            ))
+            for (key, action), result in zip(batch, results):
+                if not isinstance(result, Exception) or self.is_done(result):
+                    if action['endpoint'] in self.tweeting and not isinstance(result, Exception):
+                        index_tweets(self.brain, [result])
+                    self.brain.forget(self.space, key)
+                    REGISTRY.count('actions', endpoint=action['endpoint'], outcome='sent')
+                    sent += 1
+                else:
+                    self.retry(key, action, result)
+            batch = self.due()
+        return sent
+
+
+    def retry(self, key, action, error):
+        '''
+        Reschedule a failed action with exponential backoff, or drop it.
+
+        :param key: The idempotency key.
+        :param action: The action.
+        :param error: The exception the action failed with.
+        '''
+        action['attempts'] += 1
+        if action['attempts'] >= self.max_attempts or self.is_permanent(error):
+            self.logger.error('Dropping %s after %s attempts: %s', key, action['attempts'], error)
+            REGISTRY.count('actions', endpoint=action['endpoint'], outcome='dropped')
+            self.brain.forget(self.space, key)
+            return
+        delay = self.backoff * 2 ** (action['attempts'] - 1)
+        self.logger.warning('Retrying %s in %s seconds: %s', key, delay, error)
+        REGISTRY.count('actions', endpoint=action['endpoint'], outcome='retried')
+        self.brain.store(self.space, key, json.dumps(action), time.time() + delay)
+
+
+    def is_done(self, error):
+        ''':return: True if the error means the action has already happened.'''
+        return isinstance(error, TweepError) and error.api_code in self.done_codes
+
+
+    def is_permanent(self, error):
+        ''':return: True if the error means the action will never succeed.'''
+        return isinstance(error, TweepError) and error.api_code in self.permanent_codes
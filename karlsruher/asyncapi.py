@@ -0,0 +1,189 @@
+'''
+Asyncio facade for the Twitter API calls of the robot
+'''
+
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import requests
+from tweepy.error import TweepError
+from tweepy.parsers import ModelParser
+
+from .metrics import REGISTRY
+
+# Root URL of Twitter's REST API:
+TWITTER_API_URL = 'https://api.twitter.com/1.1'
+
+
+class AsyncAPI: # pylint: disable=too-many-instance-attributes
+    '''
+    Issue independent Twitter API calls concurrently.
+
+    Requests run on a thread pool sharing one pooled keep-alive HTTP session,
+    signed by a tweepy auth handler and parsed into tweepy models. Given a
+    synchronous api instead, calls are delegated to it on the thread pool.
+    Every call is paced by the optional Pacer.
+    '''
+
+    # Endpoints as name: HTTP method, path, positional parameters, payload type and list:
+    endpoints = {
+        'me': ('GET', '/account/verify_credentials.json', (), 'user', False),
+        'list_members': (
+            'GET', '/lists/members.json', ('owner_screen_name', 'slug'), 'user', True
+        ),
+        'followers_ids': ('GET', '/followers/ids.json', (), 'ids', False),
+        'friends_ids': ('GET', '/friends/ids.json', (), 'ids', False),
+        'mentions_timeline': ('GET', '/statuses/mentions_timeline.json', (), 'status', True),
+        'user_timeline': ('GET', '/statuses/user_timeline.json', (), 'status', True),
+        'retweet': ('POST', '/statuses/retweet/{id}.json', ('id',), 'status', False),
+        'update_status': ('POST', '/statuses/update.json', ('status',), 'status', False),
+        'destroy_status': ('POST', '/statuses/destroy/{id}.json', ('id',), 'status', False),
+    }
+
+    # pylint: disable=too-many-arguments,too-many-positional-arguments
+    def __init__(self, auth_handler=None, base_url=TWITTER_API_URL,
+                 pool_size=8, timeout=60, pacer=None, api=None, executor=None):
+        '''
+        :param auth_handler: The tweepy auth handler to sign requests with.
+        :param base_url: The root URL of the API, for testing a local server.
+        :param pool_size: The number of concurrent requests and kept connections,
+                          the number of threads of a shared executor.
+        :param timeout: The timeout of requests in seconds.
+        :param pacer: Optional Pacer to pace calls with.
+        :param api: Optional synchronous api to delegate calls to instead.
+        :param executor: Optional thread pool to share, instead of an own one.
+        '''
+        self.logger = logging.getLogger(__class__.__name__)
+        self.auth_handler = auth_handler
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.pacer = pacer
+        self.api = api
+        self.parser = ModelParser()
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.shared = executor is not None
+        self.executor = executor if self.shared else ThreadPoolExecutor(max_workers=pool_size)
+        self.loop = None
+
+
+    def close(self):
+        '''
+        Close the HTTP session, the own thread pool and the event loop.
+        '''
+        self.session.close()
+        if not self.shared:
+            self.executor.shutdown(wait=True)
+        if self.loop:
+            self.loop.close()
+            self.loop = None
+
+
+    def run(self, coroutine):
+        '''
+        Run a coroutine to completion on the own event loop.
+
+        :param coroutine: The coroutine.
+        :return: The result of the coroutine.
+        '''
+        if not self.loop:
+            self.loop = asyncio.new_event_loop()
+        return self.loop.run_until_complete(coroutine)
+
+
+    def gather(self, *coroutines):
+        '''
+        Run coroutines concurrently, failing ones return their exception.
+
+        :param coroutines: The coroutines.
+        :return: List of results or exceptions, in order.
+        '''
+        async def gathering():
+            return await asyncio.gather(*coroutines, return_exceptions=True)
+        return self.run(gathering())
+
+
+    async def request(self, endpoint, *args, **params):
+        '''
+        Call an endpoint like the equally named tweepy.API method.
+
+        :param endpoint: The name of the API method.
+        :return: The parsed result, with cursors when a cursor was given.
+        '''
+        if self.pacer:
+            delay = self.pacer.reserve(endpoint)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        return await asyncio.get_event_loop().run_in_executor(
+            self.executor, lambda: self.perform(endpoint, *args, **params)
+        )
+
+
+    def perform(self, endpoint, *args, **params):
+        '''
+        Call an endpoint synchronously without pacing, timed and counted in
+        the metrics, by the given api or by an own request.
+
+        :param endpoint: The name of the API method.
+        :return: The parsed result, with cursors when a cursor was given.
+        '''
+        started = time.perf_counter()
+        try:
+            if not self.api:
+                return self.execute(endpoint, *args, **params)
+            try:
+                return getattr(self.api, endpoint)(*args, **params)
+            finally:
+                if self.pacer:
+                    self.pacer.observe(endpoint, getattr(self.api, 'last_response', None))
+        except TweepError as tweep_error:
+            REGISTRY.count('api_errors', endpoint=endpoint, code=tweep_error.api_code)
+            raise
+        finally:
+            REGISTRY.observe('api_call', time.perf_counter() - started, endpoint=endpoint)
+
+
+    def execute(self, endpoint, *args, **params):
+        '''
+        Perform a request synchronously, for the thread pool.
+
+        :param endpoint: The name of the API method.
+        :return: The parsed result, with cursors when a cursor was given.
+        '''
+        method, path, names, payload_type, payload_list = self.endpoints[endpoint]
+        params.update(zip(names, args))
+        params = dict((name, str(value)) for name, value in params.items() if value is not None)
+        if '{id}' in path:
+            path = path.format(id=params.pop('id'))
+        self.logger.debug('%s %s %s', method, path, params)
+        try:
+            response = self.session.request(
+                method, self.base_url + path,
+                params=params if method == 'GET' else None,
+                data=params if method == 'POST' else None,
+                auth=self.auth_handler.apply_auth() if self.auth_handler else None,
+                timeout=self.timeout
+            )
+        except requests.RequestException as request_error:
+            # Like tweepy, fail unsent requests as TweepError:
+            raise TweepError('Failed to send request: {}'.format(request_error)) \
+                from request_error
+        if self.pacer:
+            self.pacer.observe(endpoint, response)
+        if not 200 <= response.status_code < 300:
+            try:
+                error_msg, api_code = self.parser.parse_error(response.text)
+            except Exception: # pylint: disable=broad-except
+                error_msg, api_code = 'Twitter error response: status code = {}'.format(
+                    response.status_code
+                ), None
+            raise TweepError(error_msg, response, api_code=api_code)
+        return self.parser.parse(
+            SimpleNamespace(api=None, payload_type=payload_type, payload_list=payload_list),
+            response.text, return_cursors='cursor' in params
+        )
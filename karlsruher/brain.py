@@ -4,34 +4,103 @@ Using SQLite3 Database as Brain
 
 import logging
 import sqlite3
+import time
+from collections import OrderedDict
 
-class Brain:
+from .metrics import REGISTRY
+
+
+class SpaceCache:
     '''
-    Provide persistent memories in a simple SQLite3 database table.
+    Remember the membership of entries in one space.
+
+    A cache is complete while its space fits into the size limit, then
+    any entry not in the cache is not in the space. Otherwise it keeps the
+    most recently used entries only, both known and unknown ones, starting
+    empty and filled by lookups.
     '''
 
-    def __init__(self, database=':memory:'):
+    def __init__(self, entries, size, complete=True):
+        '''
+        :param entries: The entries of the space, or of no interest when incomplete.
+        :param size: The maximum number of entries to remember.
+        :param complete: Whether the entries are all of the space or not.
+        '''
+        self.size = size
+        self.complete = complete and len(entries) <= size
+        self.members = OrderedDict(
+            (entry, True) for entry in (entries[:size] if self.complete else ())
+        )
+
+    def lookup(self, entry):
+        ''':return: True or False if known, otherwise None.'''
+        if self.complete:
+            return entry in self.members
+        have = self.members.get(entry)
+        if have is not None:
+            self.members.move_to_end(entry)
+        return have
+
+    def remember(self, entry, have):
+        '''
+        :param entry: The entry.
+        :param have: Whether the space has the entry or not.
+        '''
+        if self.complete and not have:
+            self.members.pop(entry, None)
+            return
+        self.members[entry] = have
+        self.members.move_to_end(entry)
+        if len(self.members) > self.size:
+            self.complete = False
+            self.members.popitem(last=False)
+
+
+# The operations of the database are its public methods:
+class Brain: # pylint: disable=too-many-public-methods
+    '''
+    Provide persistent memories in a simple SQLite3 database.
+
+    Schema version 1 keeps entries in a WITHOUT ROWID table keyed by the
+    integer ID of their space and the entry itself, which is stored as an
+    integer whenever it is one. Version 2 indexes entries by their timestamp
+    for pruning. Version 3 adds time series of values, keyed by their space
+    and timestamp. Older databases are migrated on connect.
+    '''
+
+    # Current schema version, kept in SQLite's user_version:
+    schema_version = 3
+
+    # Maximum number of entries per query, below SQLite's variable limit:
+    chunk_size = 500
+
+    def __init__(self, database=':memory:', cache=None, cache_size=100000):
         '''
         :param database: The sqlite3 database connection string,
                             using in-memory database as default.
+        :param cache: Optional spaces to cache the membership of entries for.
+        :param cache_size: Maximum number of entries to cache per space.
         '''
         self.logger = logging.getLogger(__class__.__name__)
-        self.connection = sqlite3.connect(database=database)
+        self.cached_spaces = set(str(space) for space in cache) if cache else set()
+        self.cache_size = cache_size
+        self.cache = {}
+        self.connection = sqlite3.connect(database=database, check_same_thread=False)
         self.connection.row_factory = sqlite3.Row
-        self.connection.cursor().execute('''
-            CREATE TABLE IF NOT EXISTS brain (
-                space VARCHAR NOT NULL,
-                entry VARCHAR NOT NULL,
-                data TEXT,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                PRIMARY KEY (space, entry)
-            )''')
-        self.connection.commit()
+        self.connection.create_function('brain_key', 1, Brain.key)
+        self.migrate()
+        self.spaces = dict(
+            (row['name'], row['id'])
+            for row in self.connection.execute('SELECT id, name FROM space')
+        )
 
     def __repr__(self):
         ''':return: Database metrics as string representation.'''
         cursor = self.connection.cursor()
-        cursor.execute("SELECT space, COUNT(entry) AS count FROM brain GROUP BY space")
+        cursor.execute(
+            'SELECT space.name AS space, COUNT(memory.entry) AS count'
+            ' FROM memory JOIN space ON memory.space = space.id GROUP BY space.name'
+        )
         string = 'Having'
         for item in cursor.fetchall():
             string += ' {1} {0}s,'.format(item['space'], str(item['count']))
@@ -40,8 +109,96 @@ class Brain:
         return string + '.'
 
 
+    # Schema:
+
+    @staticmethod
+    def key(entry):
+        '''
+        :param entry: The entry.
+        :return: The entry as stored, an integer if it is one, otherwise a string.
+        '''
+        key = str(entry)
+        if key and key.strip('0123456789') == '' and (key == '0' or key[0] != '0'):
+            value = int(key)
+            if value < 2 ** 63:
+                return value
+        return key
+
+
+    def migrate(self):
+        '''
+        Create or migrate the database schema to the current version.
+        '''
+        version = self.connection.execute('PRAGMA user_version').fetchone()[0]
+        if version >= Brain.schema_version:
+            return
+        legacy = self.connection.execute(
+            "SELECT name FROM sqlite_master WHERE type='table' AND name='brain'"
+        ).fetchone() is not None
+        self.logger.debug('Migrating schema version %s to %s', version, Brain.schema_version)
+        script = '''
+            BEGIN;
+            CREATE TABLE IF NOT EXISTS space (
+                id INTEGER PRIMARY KEY,
+                name VARCHAR NOT NULL UNIQUE
+            );
+            CREATE TABLE IF NOT EXISTS memory (
+                space INTEGER NOT NULL REFERENCES space (id),
+                entry NOT NULL,
+                data TEXT,
+                timestamp INTEGER NOT NULL DEFAULT (CAST(strftime('%s', 'now') AS INTEGER)),
+                PRIMARY KEY (space, entry)
+            ) WITHOUT ROWID;
+        '''
+        if legacy:
+            script += '''
+            INSERT OR IGNORE INTO space (name) SELECT DISTINCT space FROM brain;
+            INSERT OR REPLACE INTO memory (space, entry, data, timestamp)
+                SELECT space.id, brain_key(brain.entry), brain.data,
+                    COALESCE(CAST(strftime('%s', brain.timestamp) AS INTEGER), 0)
+                FROM brain JOIN space ON brain.space = space.name;
+            DROP TABLE brain;
+            '''
+        script += '''
+            CREATE INDEX IF NOT EXISTS memory_timestamp ON memory (space, timestamp);
+            CREATE TABLE IF NOT EXISTS series (
+                space INTEGER NOT NULL REFERENCES space (id),
+                timestamp INTEGER NOT NULL,
+                value REAL NOT NULL,
+                PRIMARY KEY (space, timestamp)
+            ) WITHOUT ROWID;
+        '''
+        script += 'PRAGMA user_version = {};\nCOMMIT;'.format(Brain.schema_version)
+        try:
+            self.connection.executescript(script)
+        except sqlite3.Error:
+            self.connection.rollback()
+            raise
+        if legacy:
+            self.connection.execute('VACUUM')
+        if legacy or version:
+            self.logger.info('Migrated brain to schema version %s.', Brain.schema_version)
+
+
+    def space_id(self, space, create=False):
+        '''
+        :param space: The space.
+        :param create: Whether to create an unknown space or not.
+        :return: The integer ID of the space, None if unknown.
+        '''
+        space = str(space)
+        if space not in self.spaces and create:
+            with self.connection:
+                self.connection.execute('INSERT OR IGNORE INTO space (name) VALUES (?)', (space,))
+            self.spaces[space] = self.connection.execute(
+                'SELECT id FROM space WHERE name=?', (space,)
+            ).fetchone()['id']
+        return self.spaces.get(space)
+
+
     # Read:
 
+    @REGISTRY.timed('brain', operation='has')
     def has(self, space, entry):
         '''
         Indicate whether brain has the given entry or not.
@@ -50,15 +207,180 @@ class Brain:
         :param entry: The entry.
         :return: True if brain has the given entry, otherwise False.
         '''
+        space_cache = self.space_cache(space)
+        if space_cache:
+            have = space_cache.lookup(str(entry))
+            if have is not None:
+                return have
         cursor = self.connection.cursor()
         cursor.execute(
-            'SELECT entry FROM brain WHERE space=? AND entry=?', (str(space), str(entry),)
+            'SELECT entry FROM memory WHERE space=? AND entry=?',
+            (self.space_id(space), Brain.key(entry),)
         )
         have = cursor.fetchone() is not None
+        if space_cache:
+            space_cache.remember(str(entry), have)
         self.logger.debug('%s %s %s', 'Having' if have else 'Not having', space, entry)
         return have
 
 
+    @REGISTRY.timed('brain', operation='has_many')
+    def has_many(self, space, entries):
+        '''
+        Indicate which of the given entries brain has, querying in chunks.
+
+        :param space: The space.
+        :param entries: An iterable of entries.
+        :return: Set of the given entries brain has.
+        '''
+        keys = {}
+        for entry in entries:
+            keys.setdefault(str(entry), []).append(entry)
+        space_cache = self.space_cache(space)
+        having = set()
+        unknown = []
+        for key in keys:
+            have = space_cache.lookup(key) if space_cache else None
+            if have is None:
+                unknown.append(key)
+            elif have:
+                having.add(key)
+        cursor = self.connection.cursor()
+        for offset in range(0, len(unknown), self.chunk_size):
+            chunk = unknown[offset:offset + self.chunk_size]
+            cursor.execute(
+                'SELECT entry FROM memory WHERE space=? AND entry IN ({})'.format(
+                    ','.join('?' * len(chunk))
+                ),
+                [self.space_id(space)] + [Brain.key(key) for key in chunk]
+            )
+            found = set(str(row['entry']) for row in cursor.fetchall())
+            having.update(found)
+            if space_cache:
+                for key in chunk:
+                    space_cache.remember(key, key in found)
+        self.logger.debug('Having %s of %s %s', len(having), len(keys), space)
+        return set(entry for key in having for entry in keys[key])
+
+
+    def entries(self, space):
+        '''
+        Provide all entries of a space.
+
+        :param space: The space.
+        :return: Generator of the entries, as stored.
+        '''
+        cursor = self.connection.cursor()
+        cursor.execute('SELECT entry FROM memory WHERE space=?', (self.space_id(space),))
+        for row in cursor:
+            yield row['entry']
+
+
+    def items(self, space):
+        '''
+        Provide all entries of a space with their data, oldest first.
+
+        :param space: The space.
+        :return: Generator of tuples of entry and data.
+        '''
+        cursor = self.connection.cursor()
+        cursor.execute(
+            'SELECT entry, data FROM memory WHERE space=? ORDER BY timestamp',
+            (self.space_id(space),)
+        )
+        for row in cursor:
+            yield row['entry'], row['data']
+
+
+    @REGISTRY.timed('brain', operation='aged')
+    def aged(self, space, max_age, limit=-1):
+        '''
+        Provide the entries older than the given age, oldest first.
+
+        :param space: The space.
+        :param max_age: The age in seconds.
+        :param limit: Optional maximum number of entries.
+        :return: List of the entries, as stored.
+        '''
+        cursor = self.connection.execute(
+            'SELECT entry FROM memory WHERE space=? AND timestamp<? ORDER BY timestamp LIMIT ?',
+            (self.space_id(space), int(time.time() - max_age), limit,)
+        )
+        return [row['entry'] for row in cursor]
+
+
+    @REGISTRY.timed('brain', operation='due')
+    def due(self, space, limit=-1):
+        '''
+        Provide the entries with data whose timestamp has come, like
+        scheduled ones, oldest first.
+
+        :param space: The space.
+        :param limit: Optional maximum number of entries.
+        :return: List of tuples of entry and data.
+        '''
+        cursor = self.connection.execute(
+            'SELECT entry, data FROM memory WHERE space=? AND timestamp<=?'
+            ' ORDER BY timestamp LIMIT ?',
+            (self.space_id(space), int(time.time()), limit,)
+        )
+        return [(row['entry'], row['data']) for row in cursor]
+
+
+    @REGISTRY.timed('brain', operation='count')
+    def count(self, space):
+        '''
+        :param space: The space.
+        :return: Number of entries in the space.
+        '''
+        return self.connection.execute(
+            'SELECT COUNT(*) FROM memory WHERE space=?', (self.space_id(space),)
+        ).fetchone()[0]
+
+
+    def space_cache(self, space):
+        '''
+        Provide the cache of a space, load it on first use when it fits into
+        the size limit, otherwise start with an empty cache.
+
+        :param space: The space.
+        :return: The SpaceCache or None when the space is not cached.
+        '''
+        space = str(space)
+        if space not in self.cached_spaces:
+            return None
+        if space not in self.cache:
+            space_id = self.space_id(space)
+            # Skipping over the index is cheap, loading the entries is not:
+            if self.connection.execute(
+                    'SELECT entry FROM memory WHERE space=? LIMIT 1 OFFSET ?',
+                    (space_id, self.cache_size,)
+            ).fetchone():
+                self.cache[space] = SpaceCache([], self.cache_size, complete=False)
+            else:
+                self.cache[space] = SpaceCache([
+                    str(row['entry']) for row in self.connection.execute(
+                        'SELECT entry FROM memory WHERE space=?', (space_id,)
+                    )
+                ], self.cache_size)
+        return self.cache[space]
+
+
+    def remember(self, space, entries, have):
+        '''
+        Update the cache of a space, if loaded, by entries written.
+
+        :param space: The space.
+        :param entries: A list of the entries.
+        :param have: Whether the space has the entries now or not.
+        '''
+        space_cache = self.cache.get(str(space))
+        if space_cache:
+            for entry in entries:
+                space_cache.remember(str(entry), have)
+
+
+    @REGISTRY.timed('brain', operation='get')
     def get(self, space, entry, default=None):
         '''
         Provide the data of the specified entry, implement a READ operation.
@@ -69,34 +391,157 @@ class Brain:
         '''
         cursor = self.connection.cursor()
         cursor.execute(
-            'SELECT data FROM brain WHERE space=? AND entry=?', (str(space), str(entry),)
+            'SELECT data FROM memory WHERE space=? AND entry=?',
+            (self.space_id(space), Brain.key(entry),)
         )
         data = cursor.fetchone()
         self.logger.debug('%s %s %s', 'Having' if data else 'Not having', space, entry)
         return data['data'] if data else default
 
 
+    @REGISTRY.timed('brain', operation='age')
+    def age(self, space, entry):
+        '''
+        Provide the age of the specified entry.
+
+        :param space: The space.
+        :param entry: The entry.
+        :return: Seconds since the entry was stored, None if brain has not the entry.
+        '''
+        cursor = self.connection.cursor()
+        cursor.execute(
+            'SELECT timestamp FROM memory WHERE space=? AND entry=?',
+            (self.space_id(space), Brain.key(entry),)
+        )
+        row = cursor.fetchone()
+        return int(time.time()) - row['timestamp'] if row else None
+
+
     # Create & update:
 
-    def store(self, space, entry, data=None):
+    @REGISTRY.timed('brain', operation='store')
+    def store(self, space, entry, data=None, timestamp=None):
         '''
         Store the specified entry, implement a CREATE and UPDATE operation.
 
         :param space: The space.
         :param entry: The entry.
         :param data: The data, optional.
+        :param timestamp: The epoch to store the entry with, now by default.
         :return: Number of affected rows in database, either 0 or 1.
         '''
         self.logger.debug('Store %s %s %s', space, entry, data)
         cursor = self.connection.cursor()
         cursor.execute(
-            'INSERT OR REPLACE INTO brain (space, entry, data) VALUES (?,?,?)',
-            (str(space), str(entry), str(data) if data else data,)
+            'INSERT OR REPLACE INTO memory (space, entry, data, timestamp)'
+            " VALUES (?,?,?,COALESCE(?,CAST(strftime('%s', 'now') AS INTEGER)))",
+            (
+                self.space_id(space, True), Brain.key(entry), str(data) if data else data,
+                int(timestamp) if timestamp is not None else None,
+            )
         )
         self.connection.commit()
+        if str(space) in self.cache:
+            self.cache[str(space)].remember(str(entry), True)
         return cursor.rowcount
 
 
+    @REGISTRY.timed('brain', operation='store_many')
+    def store_many(self, space, entries, data=None):
+        '''
+        Store the specified entries within one single transaction.
+
+        :param space: The space.
+        :param entries: An iterable of entries, consumed lazily.
+        :param data: The data for every entry, optional.
+        :return: Number of affected rows in database.
+        '''
+        self.logger.debug('Store many %s', space)
+        data = str(data) if data else data
+        space_id = self.space_id(space, True)
+        if str(space) in self.cache:
+            entries = list(entries)
+        with self.connection:
+            cursor = self.connection.executemany(
+                'INSERT OR REPLACE INTO memory (space, entry, data) VALUES (?,?,?)',
+                ((space_id, Brain.key(entry), data,) for entry in entries)
+            )
+        self.remember(space, entries, True)
+        return cursor.rowcount
+
+
+    @REGISTRY.timed('brain', operation='store_dated')
+    def store_dated(self, space, dated):
+        '''
+        Store the specified entries with their own timestamps, like the
+        creation of tweets, within one single transaction.
+
+        :param space: The space.
+        :param dated: An iterable of tuples of entry and epoch timestamp.
+        :return: Number of affected rows in database.
+        '''
+        self.logger.debug('Store dated %s', space)
+        space_id = self.space_id(space, True)
+        if str(space) in self.cache:
+            dated = list(dated)
+        with self.connection:
+            cursor = self.connection.executemany(
+                'INSERT OR REPLACE INTO memory (space, entry, timestamp) VALUES (?,?,?)',
+                ((space_id, Brain.key(entry), int(timestamp),) for entry, timestamp in dated)
+            )
+        if str(space) in self.cache:
+            self.remember(space, [entry for entry, _ in dated], True)
+        return cursor.rowcount
+
+
+    @REGISTRY.timed('brain', operation='replace')
+    def replace(self, space, entries):
+        '''
+        Replace all entries of a space atomically.
+
+        The entries are collected in a temporary staging table first, then
+        only the delta is applied within one single transaction: new entries
+        are stored and entries not given anymore are forgotten. The space
+        stays untouched when the entries fail halfway.
+
+        :param space: The space.
+        :param entries: An iterable of entries, consumed lazily.
+        :return: Tuple of the numbers of stored and forgotten entries.
+        '''
+        self.logger.debug('Replace %s', space)
+        cursor = self.connection.cursor()
+        cursor.execute('CREATE TEMP TABLE IF NOT EXISTS staging (entry PRIMARY KEY)')
+        space_id = self.space_id(space, True)
+        staged = set() if str(space) in self.cache else None
+        def staging():
+            for entry in entries:
+                if staged is not None:
+                    staged.add(str(entry))
+                yield (Brain.key(entry),)
+        with self.connection:
+            cursor.execute('DELETE FROM staging')
+            cursor.executemany('INSERT OR IGNORE INTO staging (entry) VALUES (?)', staging())
+            cursor.execute(
+                'DELETE FROM memory WHERE space=? AND entry NOT IN (SELECT entry FROM staging)',
+                (space_id,)
+            )
+            forgotten = cursor.rowcount
+            cursor.execute(
+                'INSERT INTO memory (space, entry) SELECT ?, entry FROM staging'
+                ' WHERE entry NOT IN (SELECT entry FROM memory WHERE space=?)',
+                (space_id, space_id,)
+            )
+            stored = cursor.rowcount
+            cursor.execute('DELETE FROM staging')
+        if staged is not None:
+            # The space is the staged entries now:
+            self.cache[str(space)] = SpaceCache(sorted(staged), self.cache_size) \
+                if len(staged) <= self.cache_size \
+                else SpaceCache([], self.cache_size, complete=False)
+        return stored, forgotten
+
+
+    @REGISTRY.timed('brain', operation='forget')
     def forget(self, space, entry=None):
         '''
         Forget entries, implement a DELETE operation.
@@ -108,8 +553,164 @@ class Brain:
         self.logger.debug('Forget %s %s', space, entry if entry else 'any')
         cursor = self.connection.cursor()
         if entry:
-            cursor.execute('DELETE FROM brain WHERE space=? AND entry=?', (str(space), str(entry),))
+            cursor.execute(
+                'DELETE FROM memory WHERE space=? AND entry=?',
+                (self.space_id(space), Brain.key(entry),)
+            )
         else:
-            cursor.execute('DELETE FROM brain WHERE space=?', (str(space),))
+            cursor.execute('DELETE FROM memory WHERE space=?', (self.space_id(space),))
         self.connection.commit()
+        if str(space) in self.cache:
+            if entry:
+                self.cache[str(space)].remember(str(entry), False)
+            else:
+                self.cache[str(space)] = SpaceCache([], self.cache_size)
+        return cursor.rowcount
+
+
+    @REGISTRY.timed('brain', operation='forget_many')
+    def forget_many(self, space, entries):
+        '''
+        Forget the specified entries within one single transaction.
+
+        :param space: The space.
+        :param entries: An iterable of entries, consumed lazily.
+        :return: Number of affected rows in database.
+        '''
+        self.logger.debug('Forget many %s', space)
+        space_id = self.space_id(space)
+        if str(space) in self.cache:
+            entries = list(entries)
+        with self.connection:
+            cursor = self.connection.executemany(
+                'DELETE FROM memory WHERE space=? AND entry=?',
+                ((space_id, Brain.key(entry),) for entry in entries)
+            )
+        self.remember(space, entries, False)
+        return cursor.rowcount
+
+
+    @REGISTRY.timed('brain', operation='prune')
+    def prune(self, space, max_age, batch_size=1000):
+        '''
+        Forget entries older than the given age, in bounded batches that
+        are committed one by one to never hold a long write lock.
+
+        :param space: The space.
+        :param max_age: The maximum age of entries in seconds.
+        :param batch_size: The maximum number of entries per batch.
+        :return: Number of affected rows in database.
+        '''
+        self.logger.debug('Prune %s older than %s seconds', space, max_age)
+        space_id = self.space_id(space)
+        deadline = int(time.time() - max_age)
+        count = 0
+        while True:
+            with self.connection:
+                pruned = [row['entry'] for row in self.connection.execute(
+                    'SELECT entry FROM memory WHERE space=? AND timestamp<? LIMIT ?',
+                    (space_id, deadline, batch_size,)
+                )]
+                self.connection.executemany(
+                    'DELETE FROM memory WHERE space=? AND entry=?',
+                    ((space_id, entry,) for entry in pruned)
+                )
+            self.remember(space, pruned, False)
+            count += len(pruned)
+            if len(pruned) < batch_size:
+                break
+        return count
+
+
+    # Time series:
+
+    @REGISTRY.timed('brain', operation='record')
+    def record(self, space, timestamp, value):
+        '''
+        Record a value of a time series, replacing one of the same timestamp.
+
+        :param space: The space of the time series.
+        :param timestamp: The epoch of the value.
+        :param value: The value.
+        :return: Number of affected rows in database.
+        '''
+        self.logger.debug('Record %s %s %s', space, timestamp, value)
+        space_id = self.space_id(space, True)
+        with self.connection:
+            cursor = self.connection.execute(
+                'INSERT OR REPLACE INTO series (space, timestamp, value) VALUES (?,?,?)',
+                (space_id, int(timestamp), value,)
+            )
         return cursor.rowcount
+
+
+    @REGISTRY.timed('brain', operation='series')
+    def series(self, space, since=0):
+        '''
+        Provide the values of a time series, oldest first.
+
+        :param space: The space of the time series.
+        :param since: Optional epoch of the oldest value to provide.
+        :return: List of tuples of timestamp and value.
+        '''
+        cursor = self.connection.execute(
+            'SELECT timestamp, value FROM series WHERE space=? AND timestamp>=? ORDER BY timestamp',
+            (self.space_id(space), int(since),)
+        )
+        return [(row['timestamp'], row['value']) for row in cursor]
+
+
+    @REGISTRY.timed('brain', operation='downsample')
+    def downsample(self, space, max_age, step, retention=None):
+        '''
+        Replace the values of a time series older than max_age by their
+        average per step, and forget the ones older than retention,
+        within one single transaction.
+
+        Only whole steps are averaged, so downsampling again does not
+        change them. The end of the averaged values is kept per series as
+        watermark in the 'downsampled' space, so every call averages the
+        newly expired values only.
+
+        :param space: The space of the time series.
+        :param max_age: The age in seconds to keep every value within.
+        :param step: The seconds to average older values over.
+        :param retention: Optional age in seconds to forget values after.
+        :return: Number of values left.
+        '''
+        self.logger.debug('Downsample %s older than %s seconds by %s', space, max_age, step)
+        space_id = self.space_id(space)
+        if space_id is None:
+            return 0
+        watermarks = self.space_id('downsampled', True)
+        watermark = int(self.get('downsampled', space, 0))
+        now = int(time.time())
+        deadline = (now - max_age) // step * step
+        with self.connection:
+            if retention is not None:
+                self.connection.execute(
+                    'DELETE FROM series WHERE space=? AND timestamp<?',
+                    (space_id, now - retention,)
+                )
+            if deadline > watermark:
+                averages = self.connection.execute(
+                    'SELECT timestamp / ? * ? AS step, AVG(value) AS value FROM series'
+                    ' WHERE space=? AND timestamp>=? AND timestamp<? GROUP BY step',
+                    (step, step, space_id, watermark, deadline,)
+                ).fetchall()
+                self.connection.execute(
+                    'DELETE FROM series WHERE space=? AND timestamp>=? AND timestamp<?',
+                    (space_id, watermark, deadline,)
+                )
+                self.connection.executemany(
+                    'INSERT INTO series (space, timestamp, value) VALUES (?,?,?)',
+                    ((space_id, row['step'], row['value'],) for row in averages)
+                )
+                self.connection.execute(
+                    'INSERT OR REPLACE INTO memory (space, entry, data) VALUES (?,?,?)',
+                    (watermarks, Brain.key(space), str(deadline),)
+                )
+        self.remember('downsampled', [space], True)
+        return self.connection.execute(
+            'SELECT COUNT(*) FROM series WHERE space=?', (space_id,)
+        ).fetchone()[0]
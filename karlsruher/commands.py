@@ -0,0 +1,196 @@
+'''
+Console commands, registered by name and imported only when they run
+'''
+
+import importlib
+import logging
+
+from .__version__ import __version__
+
+
+
+CONSOLE_HELP_TEXT = '''
+
+Karlsruher Twitter Robot v{}
+
+Required argument:
+
+    --home=PATH     specify a home directory for 
+                    auth.yaml, brain and log files
+
+Usage Examples:
+    Do housekeeping (fetch followers) with:
+        $ karlsruher --home=PATH -housekeeping
+
+    Retweet follower's mentions with:
+        $ karlsruher --home=PATH -retweet
+
+    Delete aged tweets with:
+        $ karlsruher --home=PATH -forget
+
+    Prune expired entries from the brain with:
+        $ karlsruher --home=PATH -prune
+
+    Fetch and record water levels and flows of pegelonline stations with:
+        $ karlsruher --home=PATH -pegel --stations=UUID,UUID --timeseries=W,Q
+
+    Run as daemon, repeating the given commands at their intervals:
+        $ karlsruher --home=PATH -daemon -retweet -housekeeping
+
+    Run commands for several accounts from one process, sharing a
+    pool of optional --workers=COUNT workers, default 4:
+        $ karlsruher --home=PATH1 --home=PATH2 -retweet
+
+    Run commands of installed plugins, registered as entry points of
+    group "karlsruher.commands" named like the command:
+        $ karlsruher --home=PATH -myplugin
+
+Daemon intervals in seconds, optional:
+    --interval-housekeeping=SECONDS     default 86400
+    --interval-retweet=SECONDS          default 300
+    --interval-forget=SECONDS           default 86400
+    --interval-prune=SECONDS            default 86400
+    --interval-rhein=SECONDS            default 3600
+    --interval-pegel=SECONDS            default 900
+    --interval-drain=SECONDS            default 30, sending queued
+                                        retweets and tweets
+
+Optional, just append:
+    --identity-ttl=SECONDS  refresh own name and advisors after, default 3600
+    --budget=PAGES  fetch at most PAGES of followers and friends per run,
+                    housekeeping resumes where it stopped
+    --bulk=COUNT    delete up to COUNT aged tweets concurrently per batch,
+                    default 100, forget resumes where it stopped
+    --stations=UUID,...     pegelonline stations for -pegel
+    --timeseries=NAME,...   their timeseries for -pegel, default W,Q
+    --metrics=FILE  write API call, Brain and mention metrics in Prometheus
+                    text format to FILE, every minute as daemon
+    --metrics-port=PORT     serve the metrics on http://127.0.0.1:PORT/metrics
+                            as daemon
+    -profile        profile CPU time and memory of the given commands, not
+                    as daemon, writes a sorted report profile-*.txt and a
+                    stats file profile-*.prof into the home directory
+    -debug          sets console logging to DEBUG
+    -version        print version information and exit
+    -help           you are reading this right now
+
+
+Cheers!
+'''.strip().format(__version__)
+
+
+
+class Command:
+    '''
+    A console command "-name", calling a function with each Karlsruher instance.
+    The function is given as "module:function" and imported on first use.
+    '''
+
+    def __init__(self, name, target, interval=None):
+        '''
+        :param name: The name of the command.
+        :param target: The function as "module:function".
+        :param interval: Default interval in seconds as daemon, None not to repeat.
+        '''
+        self.name = name
+        self.target = target
+        self.interval = interval
+        self.loaded = None
+
+    def __repr__(self):
+        ''':return: The command as string representation.'''
+        return '-{} {}'.format(self.name, self.target)
+
+    @property
+    def function(self):
+        ''':return: The function, imported on first access.'''
+        if self.loaded is None:
+            module, _, function = self.target.partition(':')
+            self.loaded = getattr(importlib.import_module(module), function)
+            if self.interval is None:
+                self.interval = getattr(self.loaded, 'interval', None)
+        return self.loaded
+
+
+def housekeeping(karlsruher):
+    ''':param karlsruher: A Karlsruher instance.'''
+    karlsruher.housekeeping()
+
+
+def wakeup(karlsruher):
+    ''':param karlsruher: A Karlsruher instance.'''
+    karlsruher.wake_up('console')
+
+
+def sleep(karlsruher):
+    ''':param karlsruher: A Karlsruher instance.'''
+    karlsruher.go_sleep('console')
+
+
+def prune(karlsruher):
+    ''':param karlsruher: A Karlsruher instance.'''
+    karlsruher.prune()
+
+
+def drain(karlsruher):
+    ''':param karlsruher: A Karlsruher instance.'''
+    karlsruher.drain()
+
+
+def refresh(karlsruher):
+    ''':param karlsruher: A Karlsruher instance.'''
+    karlsruher.refresh()
+
+
+# Commands in order of execution, with their default intervals in seconds
+# for daemon mode, None for commands not to repeat:
+COMMANDS = (
+    Command('housekeeping', 'karlsruher.commands:housekeeping', 86400),
+    Command('wakeup', 'karlsruher.commands:wakeup'),
+    Command('sleep', 'karlsruher.commands:sleep'),
+    Command('read', 'karlsruher.karlsruher:read_mentions'),
+    Command('retweet', 'karlsruher.karlsruher:retweet_mentions', 300),
+    Command('forget', 'karlsruher.vergisses:delete_aged_tweets', 86400),
+    Command('prune', 'karlsruher.commands:prune', 86400),
+    Command('rhein', 'karlsruher.rheinpegel:rhein', 3600),
+    Command('pegel', 'karlsruher.rheinpegel:pegel', 900),
+    Command('drain', 'karlsruher.commands:drain', 30),
+)
+
+# Switches that are no commands:
+SWITCHES = ('-daemon', '-debug', '-help', '-profile', '-version')
+
+# Entry point group of plugin commands:
+PLUGINS = 'karlsruher.commands'
+
+
+def plugins():
+    '''
+    :return: Commands of installed plugins, run after the built-in ones.
+    '''
+    try:
+        from importlib.metadata import entry_points # pylint: disable=import-outside-toplevel
+    except ImportError: # pragma: no cover, before Python 3.8
+        return ()
+    found = entry_points()
+    found = found.select(group=PLUGINS) if hasattr(found, 'select') else found.get(PLUGINS, ())
+    return tuple(Command(entry_point.name, entry_point.value) for entry_point in found)
+
+
+def selected(argv):
+    '''
+    Find the commands given as "-name", looking up plugins only for
+    unknown names, to keep the start of built-in commands fast.
+
+    :param argv: The command line arguments.
+    :return: The given commands, in order of execution.
+    '''
+    flags = [arg for arg in argv[1:] if arg.startswith('-') and not arg.startswith('--')]
+    commands = list(COMMANDS)
+    unknown = set(flags) - set(SWITCHES) - set('-' + command.name for command in commands)
+    if unknown:
+        commands.extend(plugins())
+        unknown -= set('-' + command.name for command in commands)
+    for flag in sorted(unknown):
+        logging.getLogger('Commands').warning('Unknown command %s', flag)
+    return [command for command in commands if '-' + command.name in flags]
@@ -0,0 +1,489 @@
+'''
+Local stand-ins for the Twitter and pegelonline APIs, for load and integration testing
+'''
+
+import json
+import random
+import re
+import sys
+import threading
+import time
+
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qsl, urlsplit
+
+
+class FakeServer(ThreadingMixIn, HTTPServer):
+    '''
+    Serve in a background thread, counting requests by path, connections
+    and the most requests answered at once.
+    '''
+
+    daemon_threads = True
+
+    def __init__(self, address, handler, latency=0.0):
+        '''
+        :param address: The host and port to listen on.
+        :param handler: The request handler class.
+        :param latency: Seconds to delay every response.
+        '''
+        super().__init__(address, handler)
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.requests = Counter()
+        self.connections = 0
+        self.active = 0
+        self.overlap = 0
+        self.thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *_):
+        self.stop()
+
+
+    def start(self):
+        '''
+        Serve in a background thread.
+
+        :return: This server.
+        '''
+        self.thread = threading.Thread(target=self.serve_forever, args=(0.05,), daemon=True)
+        self.thread.start()
+        return self
+
+
+    def stop(self):
+        '''
+        Stop serving and close the socket.
+        '''
+        self.shutdown()
+        self.server_close()
+
+
+    def finish_request(self, request, client_address):
+        '''
+        Count the connection, then answer its requests.
+        '''
+        with self.lock:
+            self.connections += 1
+        super().finish_request(request, client_address)
+
+
+    @contextmanager
+    def answering(self):
+        '''
+        Count a request as in flight while answering it.
+        '''
+        with self.lock:
+            self.active += 1
+            self.overlap = max(self.overlap, self.active)
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+# The state of the fake are its attributes:
+class FakeTwitter(FakeServer): # pylint: disable=too-many-instance-attributes
+    '''
+    Serve synthetic Twitter data on localhost, like the endpoints the robot uses.
+
+    Responses are delayed by latency seconds. With a rate_limit, every
+    endpoint allows that many calls per window, sends x-rate-limit headers
+    and answers 429 once exhausted. Retweets, tweets and deletions change
+    the state, so repeated ones fail like on Twitter.
+    '''
+
+    # pylint: disable=too-many-arguments,too-many-positional-arguments
+    def __init__(self, address=('127.0.0.1', 0), latency=0.0, rate_limit=None, window=900,
+                 followers=1000, friends=100, mentions=200, timeline=100, seed=0):
+        '''
+        :param address: The host and port to listen on, a free port by default.
+        :param latency: Seconds to delay every response.
+        :param rate_limit: Calls per endpoint and window, None for unlimited.
+        :param window: The rate-limit window in seconds.
+        :param followers: Number of followers.
+        :param friends: Number of friends.
+        :param mentions: Number of mentions.
+        :param timeline: Number of own tweets.
+        :param seed: Seed for the synthetic data.
+        '''
+        super().__init__(address, FakeTwitterHandler, latency)
+        self.rate_limit = rate_limit
+        self.window = window
+        self.budgets = {}
+
+        rnd = random.Random(seed)
+        now = time.time()
+        self.me = self.user(1, 'FakeRobot')
+        self.advisors = [self.user(2, 'advisor_1'), self.user(3, 'advisor_2')]
+        self.follower_ids = list(range(1000000, 1000000 + followers))
+        self.friend_ids = list(range(1000000, 1000000 + friends))
+        self.mentions = []
+        for mention_id in range(10 ** 15 + mentions, 10 ** 15, -1):
+            user_id = rnd.choice(self.follower_ids) if self.follower_ids and rnd.random() < 0.8 \
+                else rnd.randrange(2000000, 3000000)
+            self.mentions.append(self.status(
+                mention_id, '@{} Synthetic mention {}'.format(self.me['screen_name'], mention_id),
+                self.user(user_id, 'user_{}'.format(user_id), rnd.random() < 0.05),
+                now - (10 ** 15 + mentions - mention_id) * 60,
+                in_reply_to_status_id=rnd.choice([None] * 9 + [mention_id - 1])
+            ))
+        self.timeline = [
+            self.status(tweet_id, 'Synthetic tweet {}'.format(tweet_id), self.me,
+                        now - (2 * 10 ** 15 + timeline - tweet_id) * 3600)
+            for tweet_id in range(2 * 10 ** 15 + timeline, 2 * 10 ** 15, -1)
+        ]
+        self.retweeted = set()
+        self.next_id = 3 * 10 ** 15
+
+    @property
+    def base_url(self):
+        ''':return: The root URL to point an API client at.'''
+        return 'http://{}:{}/1.1'.format(*self.server_address[:2])
+
+
+    @staticmethod
+    def user(user_id, screen_name, protected=False):
+        ''':return: A user as JSON object.'''
+        return {
+            'id': user_id, 'id_str': str(user_id), 'screen_name': screen_name,
+            'name': screen_name, 'protected': protected
+        }
+
+
+    @staticmethod
+    def status(status_id, text, user, created, in_reply_to_status_id=None):
+        ''':return: A status as JSON object.'''
+        return {
+            'id': status_id, 'id_str': str(status_id), 'text': text, 'user': user,
+            'created_at': formatdate(created),
+            'in_reply_to_status_id': in_reply_to_status_id
+        }
+
+
+    def budget(self, endpoint):
+        '''
+        Take one call from the budget of an endpoint.
+
+        :param endpoint: The endpoint.
+        :return: Tuple of remaining calls and reset epoch, None for unlimited.
+        '''
+        if self.rate_limit is None:
+            return None
+        with self.lock:
+            remaining, reset = self.budgets.get(endpoint, (self.rate_limit, 0))
+            if reset <= time.time():
+                remaining, reset = self.rate_limit, int(time.time() + self.window)
+            remaining -= 1
+            self.budgets[endpoint] = (max(remaining, 0), reset)
+        return remaining, reset
+
+
+    @staticmethod
+    def cursored(ids, params):
+        ''':return: A page of ids with cursors, cursors are offsets.'''
+        offset = max(int(params.get('cursor', -1)), 0)
+        count = int(params.get('count', 5000))
+        end = offset + count
+        return {
+            'ids': ids[offset:end],
+            'previous_cursor': offset,
+            'next_cursor': end if end < len(ids) else 0
+        }
+
+
+    @staticmethod
+    def paged(statuses, params):
+        ''':return: A page of statuses by count, since_id and max_id, newest first.'''
+        since_id = int(params.get('since_id', 0))
+        max_id = int(params.get('max_id', sys.maxsize))
+        return [
+            status for status in statuses if since_id < status['id'] <= max_id
+        ][:int(params.get('count', 20))]
+
+
+    def get(self, path, params): # pylint: disable=too-many-return-statements
+        '''
+        :return: Tuple of HTTP status and JSON object.
+        '''
+        if path == '/1.1/account/verify_credentials.json':
+            return 200, self.me
+        if path == '/1.1/lists/members.json':
+            return 200, {'users': self.advisors, 'next_cursor': 0, 'previous_cursor': 0}
+        if path == '/1.1/followers/ids.json':
+            return 200, self.cursored(self.follower_ids, params)
+        if path == '/1.1/friends/ids.json':
+            return 200, self.cursored(self.friend_ids, params)
+        if path == '/1.1/statuses/mentions_timeline.json':
+            return 200, self.paged(self.mentions, params)
+        if path == '/1.1/statuses/user_timeline.json':
+            with self.lock:
+                return 200, self.paged(self.timeline, params)
+        return 404, error(34, 'Sorry, that page does not exist.')
+
+
+    def post(self, path, params): # pylint: disable=too-many-return-statements
+        '''
+        :return: Tuple of HTTP status and JSON object.
+        '''
+        match = re.match(r'^/1\.1/statuses/(retweet|destroy)/(\d+)\.json$', path)
+        with self.lock:
+            if match and match.group(1) == 'retweet':
+                status_id = int(match.group(2))
+                if status_id in self.retweeted:
+                    return 403, error(327, 'You have already retweeted this Tweet.')
+                self.retweeted.add(status_id)
+                return 200, self.created('RT {}'.format(status_id))
+            if match:
+                status_id = int(match.group(2))
+                for status in self.timeline:
+                    if status['id'] == status_id:
+                        self.timeline.remove(status)
+                        return 200, status
+                return 404, error(144, 'No status found with that ID.')
+            if path == '/1.1/statuses/update.json':
+                text = params.get('status', '')
+                if any(status['text'] == text for status in self.timeline):
+                    return 403, error(187, 'Status is a duplicate.')
+                created = self.created(text, params.get('in_reply_to_status_id'))
+                self.timeline.insert(0, created)
+                return 200, created
+        return 404, error(34, 'Sorry, that page does not exist.')
+
+
+    def created(self, text, in_reply_to_status_id=None):
+        ''':return: A new own status, call with the lock held.'''
+        self.next_id += 1
+        return self.status(
+            self.next_id, text, self.me, time.time(),
+            int(in_reply_to_status_id) if in_reply_to_status_id else None
+        )
+
+
+def error(code, message):
+    ''':return: A Twitter error response as JSON object.'''
+    return {'errors': [{'code': code, 'message': message}]}
+
+
+class FakeTwitterHandler(BaseHTTPRequestHandler):
+    '''
+    Answer requests from the state of the FakeTwitter server.
+    '''
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *_):
+        pass
+
+    def do_GET(self): # pylint: disable=invalid-name
+        '''Answer GET requests.'''
+        url = urlsplit(self.path)
+        self.answer(url.path, self.server.get, dict(parse_qsl(url.query)))
+
+    def do_POST(self): # pylint: disable=invalid-name
+        '''Answer POST requests, with parameters in the query or the body.'''
+        url = urlsplit(self.path)
+        length = int(self.headers.get('Content-Length', 0))
+        params = dict(parse_qsl(url.query))
+        params.update(parse_qsl(self.rfile.read(length).decode('utf-8')))
+        self.answer(url.path, self.server.post, params)
+
+    def answer(self, path, handler, params):
+        '''
+        Answer by the handler, within the rate limit and after the latency.
+
+        :param path: The path of the endpoint.
+        :param handler: The server method to answer with.
+        :param params: The request parameters.
+        '''
+        with self.server.lock:
+            self.server.requests[path] += 1
+        budget = self.server.budget(path)
+        with self.server.answering():
+            if budget and budget[0] < 0:
+                status, payload = 429, error(88, 'Rate limit exceeded.')
+            else:
+                status, payload = handler(path, params)
+            if self.server.latency:
+                time.sleep(self.server.latency)
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json;charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        if budget:
+            self.send_header('x-rate-limit-limit', str(self.server.rate_limit))
+            self.send_header('x-rate-limit-remaining', str(max(budget[0], 0)))
+            self.send_header('x-rate-limit-reset', str(budget[1]))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class FakePegelonline(FakeServer):
+    '''
+    Serve current measurements of gauges on localhost, like pegelonline.
+
+    Every measurement has the ETag of its timestamp, so conditional requests
+    are answered 304 until the next measure(). The first failures requests
+    are answered 503, for testing retries. Without bulk, stations.json is
+    not found, for testing fallbacks.
+    '''
+
+    # pylint: disable=too-many-arguments,too-many-positional-arguments
+    def __init__(self, address=('127.0.0.1', 0), latency=0.0, failures=0, stations=None,
+                 bulk=True):
+        '''
+        :param address: The host and port to listen on, a free port by default.
+        :param latency: Seconds to delay every response.
+        :param failures: Number of requests to fail first.
+        :param stations: Dict of station UUIDs to dicts of timeseries and values,
+                         Maxau with water level W and flow Q by default.
+        :param bulk: Whether to serve stations.json or not.
+        '''
+        super().__init__(address, FakePegelonlineHandler, latency)
+        self.failures = failures
+        self.bulk = bulk
+        self.measurements = {}
+        for station, values in (stations or {
+                'b6c6d5c8-e2d5-4469-8dd8-fa972ef7eaea': {'W': 500.0, 'Q': 1000.0}
+        }).items():
+            for timeseries, value in values.items():
+                self.measure(station, timeseries, value)
+
+    @property
+    def base_url(self):
+        ''':return: The root URL to point a client at.'''
+        return 'http://{}:{}/webservices/rest-api/v2'.format(*self.server_address[:2])
+
+
+    def measure(self, station, timeseries, value, measured=None):
+        '''
+        Take a measurement.
+
+        :param station: The station UUID.
+        :param timeseries: The timeseries, like W or Q.
+        :param value: The value.
+        :param measured: The epoch of the measurement, now by default.
+        '''
+        timestamp = datetime.fromtimestamp(
+            int(time.time() if measured is None else measured), timezone.utc
+        ).strftime('%Y-%m-%dT%H:%M:%S+00:00')
+        with self.lock:
+            self.measurements[(station, timeseries)] = {
+                'timestamp': timestamp, 'value': value, 'trend': 0,
+                'stateMnwMhw': 'normal', 'stateNswHsw': 'unknown'
+            }
+
+
+    @staticmethod
+    def shortname(station):
+        ''':return: The short name of a station.'''
+        return 'MAXAU' if station == 'b6c6d5c8-e2d5-4469-8dd8-fa972ef7eaea' else station[:8].upper()
+
+
+    def stations(self, params):
+        ''':return: The stations by ids, with timeseries and current measurements if included.'''
+        ids = params['ids'].split(',') if 'ids' in params else None
+        stations = {}
+        for (station, timeseries), measurement in sorted(self.measurements.items()):
+            if ids is not None and station not in ids:
+                continue
+            found = stations.setdefault(station, {
+                'uuid': station, 'shortname': self.shortname(station), 'timeseries': []
+            })
+            if params.get('includeTimeseries') == 'true':
+                found['timeseries'].append({
+                    'shortname': timeseries, 'unit': 'cm' if timeseries == 'W' else 'm3/s'
+                })
+                if params.get('includeCurrentMeasurement') == 'true':
+                    found['timeseries'][-1]['currentMeasurement'] = dict(measurement)
+        return list(stations.values())
+
+
+    def get(self, path, params):
+        '''
+        :return: Tuple of HTTP status and JSON object.
+        '''
+        with self.lock:
+            if self.failures > 0:
+                self.failures -= 1
+                return 503, {'status': 503, 'message': 'Service Unavailable'}
+            if path == '/webservices/rest-api/v2/stations.json' and self.bulk:
+                return 200, self.stations(params)
+            match = re.match(
+                r'^/webservices/rest-api/v2/stations/([^/]+)/([^/]+)'
+                r'/currentmeasurement\.json$', path
+            )
+            if match and match.groups() in self.measurements:
+                return 200, dict(self.measurements[match.groups()])
+        return 404, {'status': 404, 'message': 'Not Found'}
+
+
+class FakePegelonlineHandler(BaseHTTPRequestHandler):
+    '''
+    Answer requests from the measurements of the FakePegelonline server.
+    '''
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *_):
+        pass
+
+    def do_GET(self): # pylint: disable=invalid-name
+        '''Answer GET requests, conditional ones by ETag.'''
+        url = urlsplit(self.path)
+        with self.server.lock:
+            self.server.requests[url.path] += 1
+        with self.server.answering():
+            status, payload = self.server.get(url.path, dict(parse_qsl(url.query)))
+            if self.server.latency:
+                time.sleep(self.server.latency)
+        etag = '"{}"'.format(payload['timestamp']) \
+            if isinstance(payload, dict) and 'timestamp' in payload else None
+        if etag and etag == self.headers.get('If-None-Match'):
+            status, payload = 304, None
+        body = json.dumps(payload).encode('utf-8') if payload is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json;charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        if etag:
+            self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def main():
+    '''
+    Serve until interrupted, options are given as "--name=value".
+    '''
+    options = dict(
+        arg[2:].split('=', 1) for arg in sys.argv[1:] if arg.startswith('--') and '=' in arg
+    )
+    server = FakeTwitter(
+        ('127.0.0.1', int(options.get('port', 8080))),
+        latency=float(options.get('latency', 0)),
+        rate_limit=int(options['rate-limit']) if 'rate-limit' in options else None,
+        followers=int(options.get('followers', 1000)),
+        friends=int(options.get('friends', 100)),
+        mentions=int(options.get('mentions', 200)),
+        timeline=int(options.get('timeline', 100))
+    )
+    print('Serving fake Twitter API, set "twitter: url: \'{}\'" in auth.yaml.'.format(
+        server.base_url
+    ), flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -12,53 +12,56 @@ from tweepy.error import TweepError
 
 from .tweepyx import tweepyx
 from .brain import Brain
+from .pacing import Pacer
+from .asyncapi import AsyncAPI, TWITTER_API_URL
+from .actions import ActionQueue
+from . import pipeline
+from .pipeline import Pipeline
 from .__version__ import __version__
+from .commands import CONSOLE_HELP_TEXT # pylint: disable=unused-import
 
 
 
-CONSOLE_HELP_TEXT = '''
-
-Karlsruher Twitter Robot v{}
-
-Required argument:
-
-    --home=PATH     specify a home directory for 
-                    auth.yaml, brain and log files
-
-Usage Examples:
-    Do housekeeping (fetch followers) with:
-        $ karlsruher --home=PATH -housekeeping
-
-    Retweet follower's mentions with:
-        $ karlsruher --home=PATH -retweet
+# The operations of the robot are its public methods, its collaborators are its attributes:
+class Karlsruher: # pylint: disable=too-many-public-methods,too-many-instance-attributes
+    '''
+    Karlsruher Twitter Robot.
+    '''
 
-Optional, just append:
-    -debug          sets console logging to DEBUG
-    -version        print version information and exit
-    -help           you are reading this right now
+    # Time to live of brain entries per space in seconds, for pruning:
+    ttl = {'tweet': 30 * 24 * 60 * 60}
 
+    # Time to live of own screen_name and advisors in seconds:
+    identity_ttl = 60 * 60
 
-Cheers!
-'''.strip().format(__version__)
+    # Seconds to wait before fetching advisors again after a failed fetch:
+    retry_ttl = 10 * 60
 
+    # Maximum number of pages per cursored fetch and invocation, None for all:
+    budget = None
 
+    # Seconds to resume a cursored fetch within, it restarts when older:
+    cursor_ttl = 24 * 60 * 60
 
-class Karlsruher:
-    '''
-    Karlsruher Twitter Robot.
-    '''
+    # Number of aged tweets to delete concurrently per batch:
+    bulk = 100
 
-    # Delay between retweets in seconds:
-    delay = 3.275
+    # Pegelonline station UUIDs and their timeseries to fetch with -pegel:
+    stations = ()
+    timeseries = ('W', 'Q')
 
 
-    def __init__(self, home=None, brain=None, api=None):
+    # pylint: disable=too-many-arguments
+    def __init__(self, home=None, brain=None, api=None, executor=None, pool_size=8):
         '''
         Bootstrap instance and connect to Twitter.
 
         :param home: Optional, the home directory, taken from commandline.
         :param brain: For testing, a mocked Brain instance.
         :param api: For testing, a mocked Tweepy API instance.
+        :param executor: Optional thread pool for API requests, to share it.
+        :param pool_size: The number of concurrent API requests, the number of
+                          threads of a shared executor.
         '''
 
         # Check for a home directory:
@@ -71,30 +74,30 @@ class Karlsruher:
         if not os.path.isdir(home):
             raise NotADirectoryError('Specified home "{}" not found.'.format(home))
 
+        self.home = home
+
         # Start logging:
         self.logger = logging.getLogger(__class__.__name__)
         self.logger.info('Karlsruher Twitter Robot v%s', __version__)
 
         # Check and create lock file:
         self.lockfile = '{}/lock'.format(home)
-        if os.path.isfile(self.lockfile):
-            raise RuntimeError('Locked by "{}".'.format(self.lockfile))
-        open(self.lockfile, 'w').close()
+        self.lock()
 
         # Connect to brain:
-        self.brain = brain if brain else Brain('{}/brain'.format(home))
+        # Only small spaces are cached, growing ones are served by their index:
+        self.brain = brain if brain else Brain('{}/brain'.format(home), cache=('advisor', 'sleep'))
 
-        # Connect to Twitter and determine own screen_name:
+        # Connect to Twitter, own screen_name and advisors are fetched lazily:
         self.api = api if api else tweepyx.API('{}/auth.yaml'.format(home))
-        self.screen_name = self.api.me().screen_name
-
-        # Fetch advisors from list to brain:
-        self.brain.forget('advisor')
-        try:
-            for member in self.api.list_members(self.screen_name, 'advisors'):
-                self.brain.store('advisor', member.id)
-        except TweepError: # pragma: no cover
-            self.logger.error('Could not fetch advisors from list.')
+        self.pacer = Pacer()
+        self.aio = AsyncAPI(
+            auth_handler=self.api.auth, base_url=self.api.base_url or TWITTER_API_URL,
+            pool_size=pool_size, pacer=self.pacer, executor=executor
+        ) if isinstance(self.api, tweepy.API) \
+            else AsyncAPI(api=self.api, pool_size=pool_size, pacer=self.pacer, executor=executor)
+        self.queue = ActionQueue(self.brain, self.aio)
+        self.refreshed = {}
 
         # Log status:
         self.logger.info(self)
@@ -105,16 +108,148 @@ class Karlsruher:
         '''
         :return: String representation.
         '''
-        return 'Hello, my name is @{0}! {1}'.format(self.screen_name, self.brain)
+        return 'Hello, my name is @{0}! {1}'.format(
+            self.brain.get('me', 'screen_name', '?'), self.brain
+        )
 
 
 
     def __del__(self):
         '''
-        Remove lockfile on destruction.
+        Remove lockfile and close the async API on destruction.
+        '''
+        self.unlock()
+        if hasattr(self, 'aio'):
+            self.aio.close()
+
+
+
+    def lock(self):
+        '''
+        Create the lockfile holding our process ID, take over a stale
+        lockfile whose process is gone.
+        '''
+        if os.path.isfile(self.lockfile):
+            with open(self.lockfile, 'r') as lockfile:
+                pid = lockfile.read().strip()
+            if not pid.isdigit() or Karlsruher.is_running(int(pid)):
+                raise RuntimeError('Locked by "{}".'.format(self.lockfile))
+            self.logger.warning('Taking over stale lock of process %s.', pid)
+        with open(self.lockfile, 'w') as lockfile:
+            lockfile.write(str(os.getpid()))
+        self.locked = True
+
+
+
+    def unlock(self):
+        '''
+        Remove the lockfile.
         '''
-        if hasattr(self, 'lockfile') and os.path.isfile(self.lockfile):
+        if getattr(self, 'locked', False) and os.path.isfile(self.lockfile):
             os.remove(self.lockfile)
+        self.locked = False
+
+
+
+    @staticmethod
+    def is_running(pid):
+        '''
+        :param pid: A process ID.
+        :return: True if the process is running, otherwise False.
+        '''
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError: # pragma: no cover
+            return True
+        return True
+
+
+
+    def call(self, endpoint, *args, **kwargs):
+        '''
+        Call the API paced by its rate-limit budget, on the pooled HTTP
+        session of the AsyncAPI unless it delegates to a given api.
+
+        :param endpoint: The name of the API method.
+        :return: The result of the API method.
+        '''
+        self.pacer.acquire(endpoint)
+        return self.aio.perform(endpoint, *args, **kwargs)
+
+
+
+    def expired(self, entry):
+        '''
+        :param entry: An identity entry, like "screen_name" or "advisors".
+        :return: True if the entry was not refreshed within identity_ttl.
+        '''
+        refreshed = self.refreshed.get(entry)
+        if refreshed is None:
+            age = self.brain.age('me', entry)
+            if age is None:
+                return True
+            refreshed = self.refreshed[entry] = time.time() - age
+        return time.time() - refreshed > self.identity_ttl
+
+
+
+    @property
+    def screen_name(self):
+        ''':return: Own screen_name, fetched lazily and cached in the brain.'''
+        if self.expired('screen_name'):
+            self.fetch_screen_name()
+        return self.brain.get('me', 'screen_name')
+
+
+
+    def fetch_screen_name(self):
+        '''
+        Fetch own screen_name to brain.
+        '''
+        self.brain.store('me', 'screen_name', self.call('me').screen_name)
+        self.refreshed['screen_name'] = time.time()
+
+
+
+    def is_advisor(self, user_id):
+        '''
+        :param user_id: A user ID.
+        :return: True if the user is an advisor, otherwise False.
+        '''
+        if self.expired('advisors'):
+            self.fetch_advisors()
+        return self.brain.has('advisor', user_id)
+
+
+
+    def fetch_advisors(self):
+        '''
+        Fetch advisors from list to brain.
+        '''
+        try:
+            self.brain.replace(
+                'advisor',
+                [member.id for member in self.call('list_members', self.screen_name, 'advisors')]
+            )
+        except TweepError:
+            self.logger.error('Could not fetch advisors from list.')
+            # Count the failed attempt as refresh to retry after retry_ttl only:
+            self.refreshed['advisors'] = time.time() - max(self.identity_ttl - self.retry_ttl, 0)
+            return
+        self.brain.store('me', 'advisors')
+        self.refreshed['advisors'] = time.time()
+
+
+
+    def refresh(self):
+        '''
+        Refresh own screen_name and advisors, for long-running processes.
+        '''
+        self.fetch_screen_name()
+        self.fetch_advisors()
+        self.logger.info('Refreshed identity of @%s.', self.screen_name)
 
 
 
@@ -123,23 +258,79 @@ class Karlsruher:
         Import followers and friends from Twitter into the brain.
         '''
         self.logger.info('Housekeeping...')
-        try:
+        fetched = self.aio.gather(
+            self.fetch_ids('followers_ids', 'follower'), self.fetch_ids('friends_ids', 'friend')
+        )
+        for space, ids in zip(('follower', 'friend'), fetched):
+            if isinstance(ids, TweepError):
+                self.logger.error('Could not fetch %ss, will resume: %s', space, ids)
+                continue
+            if isinstance(ids, Exception):
+                raise ids
+            if ids is None:
+                self.logger.info('Fetching %ss exceeded the budget, will resume.', space)
+                continue
+            self.logger.info(
+                '%ss: %s new, %s gone.', space.title(), *self.brain.replace(space, ids)
+            )
+        self.logger.info(self.brain)
+        self.logger.info('Housekeeping done.')
 
-            self.brain.forget('follower')
-            self.api.followers_ids.pagination_mode = 'cursor'
-            for follower_id in tweepy.Cursor(self.api.followers_ids).items():
-                self.brain.store('follower', follower_id)
 
-            self.brain.forget('friend')
-            self.api.friends_ids.pagination_mode = 'cursor'
-            for friend_id in tweepy.Cursor(self.api.friends_ids).items():
-                self.brain.store('friend', friend_id)
 
-        except TweepError: # pragma: no cover
-            self.logger.error('Could not fetch followers and/or friends.')
+    async def fetch_ids(self, endpoint, space):
+        '''
+        Fetch IDs page by page in memory, resuming at the cursor persisted
+        by a previous interrupted or budgeted run. Only a run stopping early
+        persists its pages to a staging space and its cursor, so a complete
+        run writes nothing but the changes.
+
+        :param endpoint: A cursored API method returning IDs, like followers_ids.
+        :param space: The space the IDs are for, like follower.
+        :return: All IDs when all pages are fetched, None when the budget is exceeded.
+        '''
+        staging = 'staging:{}'.format(space)
+        age = self.brain.age('cursor', space)
+        resumed = age is not None and age <= self.cursor_ttl
+        if resumed:
+            cursor = int(self.brain.get('cursor', space) or 0)
+            self.logger.info('Resuming to fetch %ss at cursor %s.', space, cursor)
+        else:
+            self.brain.forget(staging)
+            cursor = -1
+        ids = []
+        pages = 0
+        try:
+            while cursor:
+                if self.budget is not None and pages >= self.budget:
+                    break
+                page, (_, next_cursor) = await self.aio.request(endpoint, cursor=cursor)
+                ids.extend(page)
+                cursor = next_cursor
+                pages += 1
         finally:
-            self.logger.info(self.brain)
-            self.logger.info('Housekeeping done.')
+            if cursor and pages:
+                self.brain.store_many(staging, ids)
+                self.brain.store('cursor', space, cursor)
+        if cursor:
+            return None
+        if resumed:
+            ids.extend(self.brain.entries(staging))
+            self.brain.forget(staging)
+        if age is not None:
+            self.brain.forget('cursor', space)
+        return ids
+
+
+
+    def prune(self):
+        '''
+        Forget expired entries from the brain, as given by the ttl policies.
+        '''
+        self.logger.info('Pruning...')
+        for space, max_age in sorted(self.ttl.items()):
+            self.logger.info('Forgot %s expired %ss.', self.brain.prune(space, max_age), space)
+        self.logger.info('Pruning done.')
 
 
 
@@ -171,7 +362,7 @@ class Karlsruher:
         :param mention: The mention to expect an advise from.
         :return: True if an advise was followed, otherwise False.
         '''
-        if not self.brain.has('advisor', mention.user.id):
+        if not self.is_advisor(mention.user.id):
             return False
 
         trigger = '@{}!'.format(self.screen_name.lower())
@@ -195,55 +386,53 @@ class Karlsruher:
 
 
 
+    def mentions(self, *stages):
+        '''
+        :param stages: Further stages to run the latest mentions through.
+        :return: A Pipeline of the latest mentions *without* mentions by
+                    myself, mentions that contain advises and mentions that
+                    were read before, followed by the given stages.
+        '''
+        return Pipeline(self, *(pipeline.LATEST + stages))
+
+
+
     def latest_mentions(self, count=200):
         '''
-        :param count: Optional number of mentions to fetch.
+        :param count: Optional number of mentions to fetch per page.
         :return: Latest mentions *without* mentions by myself, mentions that
                     contain advises and mentions that were read before.
         '''
-        mentions = []
-        for mention in self.api.mentions_timeline(count=count):
-            if str(mention.user.screen_name) == str(self.screen_name):
-                continue
-            if self.brain.has('tweet', mention.id):
-                continue
-            if self.apply_advise(mention):
-                continue
-            mentions.append(mention)
-        return mentions
+        return list(self.mentions().run(mention_pages(self, count)))
 
 
 
     def retweet(self, tweet):
         '''
+        Queue a retweet, sent with the next drain.
+
         :param tweet: The tweet to retweet.
+        :return: True if queued, False if queued already.
         '''
-        self.logger.info('Retweeting: %s ...', tweet.user.screen_name)
-        try:
-            return self.api.retweet(tweet.id)
-        except TweepError as tweep_error: # pragma: no cover
-            self.logger.error(tweep_error)
-        finally:
-            time.sleep(self.delay)
+        self.logger.info('Queueing retweet: %s ...', tweet.user.screen_name)
+        return self.queue.enqueue('retweet', 'retweet:{}'.format(tweet.id), id=tweet.id)
 
 
 
     def tweet(self, text, in_reply_to_status_id=None):
         '''
+        Queue a tweet, sent with the next drain.
+
         :param text: The text to tweet.
-        :param in_reply_to_status_id:
-        :return:
+        :param in_reply_to_status_id: Optional ID of the tweet to reply to.
+        :return: True if queued, False if queued already.
         '''
-        self.logger.info('Tweeting: "%s"', text)
-        try:
-            return self.api.update_status(
-                in_reply_to_status_id=in_reply_to_status_id,
-                text=text
+        self.logger.info('Queueing tweet: "%s"', text)
+        if in_reply_to_status_id:
+            return self.queue.enqueue(
+                'update_status', status=text, in_reply_to_status_id=in_reply_to_status_id
             )
-        except TweepError as tweep_error: # pragma: no cover
-            self.logger.error(tweep_error)
-        finally:
-            time.sleep(self.delay)
+        return self.queue.enqueue('update_status', status=text)
 
 
 
@@ -257,54 +446,74 @@ class Karlsruher:
         required_name = '@{}'.format(tweet.user.screen_name)
         if required_name not in text:
             text = '{0} {1}'.format(required_name, text)
-        self.tweet(in_reply_to_status_id=tweet.id, text=text)
+        self.queue.enqueue(
+            'update_status', 'reply:{}'.format(tweet.id),
+            status=text, in_reply_to_status_id=tweet.id
+        )
 
 
-## Behavior:
 
-def read_mentions(karlsruher):
+    def drain(self):
+        '''
+        Send the queued actions, like retweets and replies.
+        '''
+        self.logger.info('Sending %s queued actions...', len(self.queue))
+        self.logger.info('Sending queued actions done, %s sent.', self.queue.drain())
+
+
+## Paging:
+
+def mention_pages(karlsruher, count=200):
     '''
-    Read mentions to console log.
+    Fetch the mentions since the persisted since_id watermark, paging
+    backwards with max_id when more than one page arrived in between.
+    The watermark is moved when all pages were fetched.
+
     :param karlsruher: A Karlsruher instance.
+    :param count: Optional number of mentions to fetch per page.
+    :return: A generator of pages of mentions, newest first.
     '''
-    karlsruher.logger.info('Reading mentions...')
+    since_id = karlsruher.brain.get('mention', 'since_id')
+    newest = None
+    page = karlsruher.call('mentions_timeline', count=count, since_id=since_id)
+    while True:
+        if page:
+            newest = max([newest or 0] + [mention.id for mention in page])
+            yield page
+        if not since_id or len(page) < count:
+            break
+        page = karlsruher.call(
+            'mentions_timeline', count=count, since_id=since_id,
+            max_id=min(mention.id for mention in page) - 1
+        )
+    if newest:
+        karlsruher.brain.store('mention', 'since_id', newest)
 
-    for mention in karlsruher.latest_mentions():
 
-        karlsruher.brain.store('tweet', mention.id)
 
-        karlsruher.logger.info(
-            'Reading mention @%s %s:\n%s\n',
-            mention.user.screen_name,
-            mention.id,
-            mention.text
-        )
+## Behavior:
 
+def read_mentions(karlsruher):
+    '''
+    Read mentions to console log.
+    :param karlsruher: A Karlsruher instance.
+    '''
+    karlsruher.logger.info('Reading mentions...')
+    karlsruher.mentions(
+        pipeline.remember, pipeline.read
+    ).consume(mention_pages(karlsruher))
     karlsruher.logger.info('Reading mentions done.')
 
 
 
 def retweet_mentions(karlsruher):
     '''
-    Retweet mentions but not replies, by non-protected followers.
+    Queue retweets of mentions but not replies, by non-protected followers.
     :param karlsruher: A Karlsruher instance.
     '''
     karlsruher.logger.info('Reading mentions for retweets...')
-
-    for mention in karlsruher.latest_mentions():
-
-        karlsruher.brain.store('tweet', mention.id)
-
-        if str(mention.in_reply_to_status_id) != 'None':
-            continue
-
-        if str(mention.user.protected) == 'True':
-            continue
-
-        if karlsruher.is_sleeping():
-            continue
-
-        if karlsruher.brain.has('follower', mention.user.id):
-            karlsruher.retweet(mention)
-
+    karlsruher.mentions(
+        pipeline.remember, pipeline.no_replies, pipeline.unprotected,
+        pipeline.awake, pipeline.by_followers, pipeline.retweet
+    ).consume(mention_pages(karlsruher))
     karlsruher.logger.info('Reading mentions for retweets done.')
@@ -0,0 +1,205 @@
+'''
+Count and time what the robot does, export it in Prometheus text format
+'''
+
+import functools
+import logging
+import os
+import threading
+import time
+
+from contextlib import contextmanager
+
+
+class Metrics:
+    '''
+    Keep counters and summaries of durations by name and labels.
+
+    Summaries keep the count and the sum of seconds only, so recording
+    stays cheap enough for hot paths like Brain lookups.
+    '''
+
+    # Prefix of all exported metric names:
+    prefix = 'karlsruher_'
+
+    def __init__(self):
+        self.logger = logging.getLogger(__class__.__name__)
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.summaries = {}
+
+    @staticmethod
+    def key(name, labels):
+        ''':return: The metric name and its sorted labels, as dict key.'''
+        return name, tuple(sorted(labels.items()))
+
+
+    def count(self, name, value=1, **labels):
+        '''
+        Increase a counter.
+
+        :param name: The name of the counter.
+        :param value: The value to add.
+        :param labels: The labels of the counter.
+        '''
+        key = self.key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+
+    def observe(self, name, seconds, **labels):
+        '''
+        Record a duration.
+
+        :param name: The name of the summary.
+        :param seconds: The duration.
+        :param labels: The labels of the summary.
+        '''
+        self.record(self.key(name, labels), seconds)
+
+
+    def record(self, key, seconds):
+        '''
+        Record a duration by key.
+
+        :param key: The key of the summary.
+        :param seconds: The duration.
+        '''
+        with self.lock:
+            summary = self.summaries.setdefault(key, [0, 0.0])
+            summary[0] += 1
+            summary[1] += seconds
+
+
+    @contextmanager
+    def timer(self, name, **labels):
+        '''
+        Record the duration of a with-block, also when it fails.
+
+        :param name: The name of the summary.
+        :param labels: The labels of the summary.
+        '''
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+
+    def timed(self, name, **labels):
+        '''
+        :param name: The name of the summary.
+        :param labels: The labels of the summary.
+        :return: A decorator recording the duration of every call.
+        '''
+        key = self.key(name, labels)
+        def decorate(function):
+            @functools.wraps(function)
+            def timing(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    self.record(key, time.perf_counter() - started)
+            return timing
+        return decorate
+
+
+    def clear(self):
+        '''
+        Forget all counters and summaries.
+        '''
+        with self.lock:
+            self.counters.clear()
+            self.summaries.clear()
+
+
+    def render(self):
+        '''
+        :return: All metrics in Prometheus text exposition format.
+        '''
+        with self.lock:
+            counters = sorted(self.counters.items())
+            summaries = sorted(self.summaries.items())
+        lines = []
+        typed = None
+        for (name, labels), value in counters:
+            name = '{}{}_total'.format(self.prefix, name)
+            if name != typed:
+                lines.append('# TYPE {} counter'.format(name))
+                typed = name
+            lines.append('{}{} {}'.format(name, self.labels(labels), value))
+        for (name, labels), (count, seconds) in summaries:
+            name = '{}{}_seconds'.format(self.prefix, name)
+            if name != typed:
+                lines.append('# TYPE {} summary'.format(name))
+                typed = name
+            lines.append('{}_count{} {}'.format(name, self.labels(labels), count))
+            lines.append('{}_sum{} {:.6f}'.format(name, self.labels(labels), seconds))
+        return '\n'.join(lines) + '\n'
+
+
+    @staticmethod
+    def labels(labels):
+        ''':return: Labels as {name="value",...}, or nothing.'''
+        if not labels:
+            return ''
+        return '{{{}}}'.format(','.join(
+            '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+            for name, value in labels
+        ))
+
+
+    def write(self, path):
+        '''
+        Replace a file with all metrics atomically, like for a textfile collector.
+
+        :param path: The file to write.
+        '''
+        temporary = '{}.{}'.format(path, os.getpid())
+        with open(temporary, 'w') as metrics_file:
+            metrics_file.write(self.render())
+        os.replace(temporary, path)
+
+
+    def serve(self, port, host='127.0.0.1'):
+        '''
+        Serve all metrics on http://host:port/metrics in a background thread.
+
+        :param port: The port, 0 for a free one.
+        :param host: The address to listen on.
+        :return: The HTTP server, to shut down.
+        '''
+        # Imported here, as http.server takes longer to import than the robot needs:
+        # pylint: disable=import-outside-toplevel
+        from http.server import BaseHTTPRequestHandler, HTTPServer
+        from socketserver import ThreadingMixIn
+        metrics = self
+
+        class MetricsServer(ThreadingMixIn, HTTPServer):
+            '''Serve metrics, not blocking the process from exiting.'''
+            daemon_threads = True
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            '''Answer with the metrics.'''
+
+            def log_message(self, *_):
+                pass
+
+            def do_GET(self): # pylint: disable=invalid-name
+                '''Answer GET requests.'''
+                body = metrics.render().encode('utf-8')
+                self.send_response(200 if self.path == '/metrics' else 404)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        server = MetricsServer((host, port), MetricsHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.logger.info('Serving metrics on http://%s:%s/metrics', *server.server_address[:2])
+        return server
+
+
+# The metrics of the process:
+REGISTRY = Metrics()
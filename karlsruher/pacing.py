@@ -0,0 +1,137 @@
+'''
+Pace Twitter API calls by token buckets and rate-limit response headers
+'''
+
+import logging
+import threading
+import time
+
+from .metrics import REGISTRY
+
+
+class TokenBucket:
+    '''
+    Release up to capacity calls at once and refill at a steady rate.
+    Calls reserve their token, so a bucket may be in debt while callers wait.
+    '''
+
+    def __init__(self, capacity, window):
+        '''
+        :param capacity: The number of calls per window.
+        :param window: The window in seconds.
+        '''
+        self.capacity = capacity
+        self.rate = capacity / window
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def reserve(self, now):
+        '''
+        Take one token.
+
+        :param now: The current monotonic time.
+        :return: Seconds to wait until the token is available.
+        '''
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return max(0, -self.tokens / self.rate)
+
+
+class Pacer:
+    '''
+    Release API calls as fast as their budgets allow, per endpoint.
+
+    Every endpoint draws from a token bucket sized like Twitter's documented
+    limit, endpoints sharing a limit share a bucket. The x-rate-limit headers
+    of responses narrow the budget down and block an endpoint until its
+    window resets once it is exhausted.
+    '''
+
+    # Buckets of endpoints as name, calls and window in seconds:
+    endpoints = {
+        'me': ('account/verify_credentials', 75, 900),
+        'list_members': ('lists/members', 900, 900),
+        'followers_ids': ('followers/ids', 15, 900),
+        'friends_ids': ('friends/ids', 15, 900),
+        'mentions_timeline': ('statuses/mentions_timeline', 75, 900),
+        'user_timeline': ('statuses/user_timeline', 900, 900),
+        'retweet': ('statuses/update', 300, 10800),
+        'update_status': ('statuses/update', 300, 10800),
+        'destroy_status': ('statuses/destroy', 900, 900),
+    }
+
+    # Bucket of any other endpoint:
+    default = ('default', 900, 900)
+
+    # Seconds to back off after a rate-limit error without reset header:
+    backoff_seconds = 900
+
+    def __init__(self, sleep=time.sleep):
+        '''
+        :param sleep: For testing, a function to wait with.
+        '''
+        self.logger = logging.getLogger(__class__.__name__)
+        self.sleep = sleep
+        self.lock = threading.Lock()
+        self.buckets = {}
+        self.blocked = {}
+
+    def bucket(self, endpoint):
+        ''':return: The name and the TokenBucket of the endpoint.'''
+        name, capacity, window = self.endpoints.get(endpoint, self.default)
+        if name not in self.buckets:
+            self.buckets[name] = TokenBucket(capacity, window)
+        return name, self.buckets[name]
+
+    def reserve(self, endpoint):
+        '''
+        Reserve a call of the endpoint without waiting.
+
+        :param endpoint: The name of the API method.
+        :return: Seconds to wait until the endpoint may be called.
+        '''
+        with self.lock:
+            name, bucket = self.bucket(endpoint)
+            now = time.monotonic()
+            delay = max(bucket.reserve(now), self.blocked.get(name, now) - now)
+        if delay > 0:
+            self.logger.info('Pacing %s for %.1f seconds.', endpoint, delay)
+            REGISTRY.observe('pacing', delay, endpoint=endpoint)
+        return delay
+
+    def acquire(self, endpoint):
+        '''
+        Wait until the endpoint may be called.
+
+        :param endpoint: The name of the API method.
+        :return: Seconds waited.
+        '''
+        delay = self.reserve(endpoint)
+        if delay > 0:
+            self.sleep(delay)
+        return delay
+
+    def observe(self, endpoint, response):
+        '''
+        Narrow the budget of the endpoint by the rate-limit headers of a response.
+
+        :param endpoint: The name of the API method.
+        :param response: The response, may be None.
+        '''
+        headers = getattr(response, 'headers', None)
+        if headers is None:
+            return
+        try:
+            remaining = int(headers.get('x-rate-limit-remaining'))
+            reset = int(headers.get('x-rate-limit-reset'))
+        except (TypeError, ValueError):
+            remaining = reset = None
+        with self.lock:
+            name, bucket = self.bucket(endpoint)
+            if remaining is not None:
+                bucket.tokens = min(bucket.tokens, remaining)
+                if remaining < 1:
+                    self.blocked[name] = time.monotonic() + max(0, reset - time.time())
+            elif getattr(response, 'status_code', None) in (420, 429):
+                self.blocked[name] = time.monotonic() + self.backoff_seconds
@@ -0,0 +1,177 @@
+'''
+Process mentions page by page through pluggable filter and action stages
+'''
+
+import logging
+import time
+
+from .metrics import REGISTRY
+
+
+class Stage:
+    '''
+    Wrap a stage function, counting mentions in and out and time spent.
+
+    A stage function takes the Karlsruher instance and a page of mentions
+    and returns the mentions to pass on, so it may filter, act, or both.
+    Lookups in the brain are meant to be done once per page.
+    '''
+
+    def __init__(self, function, name=None):
+        '''
+        :param function: The stage function.
+        :param name: Optional name for metrics, the function name by default.
+        '''
+        self.function = function
+        self.name = name if name else function.__name__
+        self.pages = 0
+        self.count_in = 0
+        self.count_out = 0
+        self.seconds = 0.0
+
+    def __repr__(self):
+        ''':return: The metrics as string representation.'''
+        return '{}: {} pages, {} in, {} out, {:.3f}s'.format(
+            self.name, self.pages, self.count_in, self.count_out, self.seconds
+        )
+
+    def __call__(self, karlsruher, page):
+        '''
+        :param karlsruher: A Karlsruher instance.
+        :param page: A list of mentions.
+        :return: The list of mentions to pass on.
+        '''
+        started = time.perf_counter()
+        try:
+            passed = list(self.function(karlsruher, page))
+        finally:
+            seconds = time.perf_counter() - started
+            self.seconds += seconds
+            REGISTRY.observe('stage', seconds, stage=self.name)
+        self.pages += 1
+        self.count_in += len(page)
+        self.count_out += len(passed)
+        REGISTRY.count('mentions', len(passed), stage=self.name, outcome='passed')
+        REGISTRY.count('mentions', len(page) - len(passed), stage=self.name, outcome='dropped')
+        return passed
+
+
+class Pipeline:
+    '''
+    Stream pages of mentions through stages, one page at a time.
+    '''
+
+    def __init__(self, karlsruher, *stages):
+        '''
+        :param karlsruher: A Karlsruher instance, passed to every stage.
+        :param stages: Stage functions or Stage instances, in order.
+        '''
+        self.logger = logging.getLogger(__class__.__name__)
+        self.karlsruher = karlsruher
+        self.stages = [stage if isinstance(stage, Stage) else Stage(stage) for stage in stages]
+
+    def __repr__(self):
+        ''':return: The metrics of all stages as string representation.'''
+        return '\n'.join(repr(stage) for stage in self.stages)
+
+
+    def run(self, pages):
+        '''
+        Run every page through all stages, stop a page when it got empty.
+
+        :param pages: An iterable of lists of mentions, consumed lazily.
+        :return: A generator of the mentions passing all stages.
+        '''
+        for page in pages:
+            for stage in self.stages:
+                if not page:
+                    break
+                page = stage(self.karlsruher, page)
+            yield from page
+
+
+    def consume(self, pages):
+        '''
+        Run all pages through all stages and log the metrics.
+
+        :param pages: An iterable of lists of mentions.
+        :return: Number of mentions passing all stages.
+        '''
+        passed = sum(1 for _ in self.run(pages))
+        for stage in self.stages:
+            self.logger.info(stage)
+        return passed
+
+
+## Stages:
+
+def by_others(karlsruher, page):
+    '''Pass mentions not by myself.'''
+    screen_name = str(karlsruher.screen_name)
+    return [mention for mention in page if str(mention.user.screen_name) != screen_name]
+
+
+def unseen(karlsruher, page):
+    '''Pass mentions not read before, once.'''
+    seen = karlsruher.brain.has_many('tweet', [mention.id for mention in page])
+    passed = []
+    for mention in page:
+        if mention.id not in seen:
+            seen.add(mention.id)
+            passed.append(mention)
+    return passed
+
+
+def advises(karlsruher, page):
+    '''Follow advises, pass all other mentions.'''
+    return [mention for mention in page if not karlsruher.apply_advise(mention)]
+
+
+def remember(karlsruher, page):
+    '''Remember mentions as read, pass all.'''
+    karlsruher.brain.store_many('tweet', [mention.id for mention in page])
+    return page
+
+
+def read(karlsruher, page):
+    '''Log mentions to console, pass all.'''
+    for mention in page:
+        karlsruher.logger.info(
+            'Reading mention @%s %s:\n%s\n',
+            mention.user.screen_name,
+            mention.id,
+            mention.text
+        )
+    return page
+
+
+def no_replies(_, page):
+    '''Pass mentions that are not replies.'''
+    return [mention for mention in page if str(mention.in_reply_to_status_id) == 'None']
+
+
+def unprotected(_, page):
+    '''Pass mentions by non-protected users.'''
+    return [mention for mention in page if str(mention.user.protected) != 'True']
+
+
+def awake(karlsruher, page):
+    '''Pass mentions unless sleeping.'''
+    return [] if karlsruher.is_sleeping() else page
+
+
+def by_followers(karlsruher, page):
+    '''Pass mentions by followers.'''
+    followers = karlsruher.brain.has_many('follower', [mention.user.id for mention in page])
+    return [mention for mention in page if mention.user.id in followers]
+
+
+def retweet(karlsruher, page):
+    '''Queue retweets, pass all.'''
+    for mention in page:
+        karlsruher.retweet(mention)
+    return page
+
+
+# The stages of the latest mentions, to run further stages after:
+LATEST = (by_others, unseen, advises)
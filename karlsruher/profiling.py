@@ -0,0 +1,63 @@
+'''
+Profile CPU time and memory of commands, for diagnosing production runs
+'''
+
+import cProfile
+import io
+import logging
+import os
+import pstats
+import time
+import tracemalloc
+
+from contextlib import contextmanager
+
+
+# Number of functions and allocation sites to report:
+REPORT_LINES = 40
+
+
+@contextmanager
+def profiled(directory, name):
+    '''
+    Profile the with-block with cProfile and tracemalloc and write a sorted
+    report and a stats file, loadable with pstats or snakeviz, into directory.
+
+    Only the calling thread is profiled, so run the commands in it.
+
+    :param directory: The directory to write into, like the home directory.
+    :param name: The name of what is profiled, part of the file names.
+    '''
+    logger = logging.getLogger('Profile')
+    prefix = os.path.join(directory, 'profile-{}-{}'.format(
+        name, time.strftime('%Y%m%d-%H%M%S')
+    ))
+    tracemalloc.start()
+    profile = cProfile.Profile()
+    started = time.perf_counter()
+    profile.enable()
+    try:
+        yield
+    finally:
+        profile.disable()
+        seconds = time.perf_counter() - started
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        profile.dump_stats('{}.prof'.format(prefix))
+        report = io.StringIO()
+        report.write('Profile of {} in {:.3f}s, memory {} KiB, peak {} KiB.\n\n'.format(
+            name, seconds, current // 1024, peak // 1024
+        ))
+        pstats.Stats(profile, stream=report).strip_dirs() \
+            .sort_stats('cumulative').print_stats(REPORT_LINES)
+        report.write('Top allocations by line:\n\n')
+        for statistic in snapshot.filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        )).statistics('lineno')[:REPORT_LINES]:
+            report.write('{}\n'.format(statistic))
+        with open('{}.txt'.format(prefix), 'w') as report_file:
+            report_file.write(report.getvalue())
+        logger.info('Profiled %s in %.3fs, wrote %s.txt and %s.prof', name, seconds, prefix, prefix)
@@ -1,33 +1,365 @@
 '''See https://pegelonline.wsv.de/webservice/guideRestapi'''
 
 import json
+import logging
+import re
 import sys
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
 import requests
+from urllib3.util.retry import Retry
+
+from .metrics import REGISTRY
+from .timeseries import Rolling
+
+# Root URL of the pegelonline REST API:
+PEGELONLINE_URL = 'https://pegelonline.wsv.de/webservices/rest-api/v2'
 
-API_URL = 'https://pegelonline.wsv.de/webservices/rest-api/v2' \
-          + '/stations/b6c6d5c8-e2d5-4469-8dd8-fa972ef7eaea/{}/currentmeasurement.json'
+# Station Maxau:
+MAXAU = 'b6c6d5c8-e2d5-4469-8dd8-fa972ef7eaea'
+
+API_URL = PEGELONLINE_URL + '/stations/' + MAXAU + '/{}/currentmeasurement.json'
 
 TWEET = 'Der Rhein bei Maxau steht bei {0} cm ({1}) und fliesst mit {2} m^3/s ({3}) weiter.'
 
-def fetch(api_url):
-    '''Fetch requested value from webservice.'''
-    response = requests.get(api_url, headers={})
-    if response.status_code == 200:
-        data = json.loads(response.content.decode('utf-8'))
-        return int(data['value']) if 'value' in data else -1
-    return -1
+TREND = '{0} Tendenz {1}: {2:+.1f} cm/h, zwischen {3} und {4} cm in {5} Stunden.'
+
+# Seconds of the window of the trend of the pegel:
+TREND_WINDOW = 3 * 60 * 60
+
+# Change of the pegel in cm per hour to be no longer steady:
+TREND_THRESHOLD = 3
+
+# Seconds to keep every measurement, then their hourly averages:
+SERIES_RAW_AGE = 2 * 24 * 60 * 60
+SERIES_RETENTION = 365 * 24 * 60 * 60
+
+
+def measured(timestamp):
+    '''
+    :param timestamp: A pegelonline timestamp, like 2020-05-01T12:15:00+02:00.
+    :return: The timestamp as epoch.
+    '''
+    return datetime.strptime(
+        re.sub(r'([+-]\d\d):(\d\d)$', r'\1\2', timestamp), '%Y-%m-%dT%H:%M:%S%z'
+    ).timestamp()
+
+
+def value(measurement):
+    '''
+    :param measurement: A measurement, maybe None.
+    :return: The value of the measurement as int, -1 when missing.
+    '''
+    return int(measurement['value']) if measurement and 'value' in measurement else -1
+
+
+def trend(rolling, threshold=TREND_THRESHOLD):
+    '''
+    :param rolling: The Rolling statistics of a pegel.
+    :param threshold: The change in cm per hour to be no longer steady.
+    :return: The trend as word, None while less than half the window is covered.
+    '''
+    if rolling.span < rolling.window / 2:
+        return None
+    per_hour = rolling.rate * 60 * 60
+    if per_hour >= threshold:
+        return 'steigend'
+    if per_hour <= -threshold:
+        return 'fallend'
+    return 'gleichbleibend'
+
+
+class Pegelonline:
+    '''
+    Fetch current measurements of gauges concurrently, on a pooled keep-alive
+    HTTP session with timeouts and retries.
+
+    Measurements are cached in the brain with their timestamp. Until the next
+    measurement is due no request is sent, then a conditional one.
+    '''
+
+    # Seconds between two measurements of a gauge:
+    interval = 15 * 60
+
+    # Brain space of cached measurements:
+    space = 'pegelonline'
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, brain=None, base_url=None, timeout=10, retries=3, pool_size=4):
+        '''
+        :param brain: Optional Brain to cache measurements in.
+        :param base_url: The root URL of the API, for testing a local server.
+        :param timeout: The timeout of requests in seconds.
+        :param retries: The number of retries of failing requests.
+        :param pool_size: The number of concurrent requests and kept connections.
+        '''
+        self.logger = logging.getLogger(__class__.__name__)
+        self.brain = brain
+        self.base_url = (base_url if base_url else PEGELONLINE_URL).rstrip('/')
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=1, pool_maxsize=pool_size, max_retries=Retry(
+                total=retries, backoff_factor=0.5, status_forcelist=(500, 502, 503, 504)
+            )
+        )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.executor = ThreadPoolExecutor(max_workers=pool_size)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+    def close(self):
+        '''
+        Close the HTTP session and the thread pool.
+        '''
+        self.session.close()
+        self.executor.shutdown(wait=True)
+
+
+    def cached(self, station, timeseries):
+        '''
+        :param station: The station UUID.
+        :param timeseries: The timeseries, like W or Q.
+        :return: The cached measurement, None when there is none.
+        '''
+        if self.brain is None:
+            return None
+        data = self.brain.get(self.space, '{}/{}'.format(station, timeseries))
+        return json.loads(data) if data else None
+
+
+    def fresh(self, measurement, now):
+        '''
+        :param measurement: A measurement, maybe None.
+        :param now: The current epoch.
+        :return: True if the next measurement is not yet due.
+        '''
+        return bool(measurement) and now < measured(measurement['timestamp']) + self.interval
+
+
+    def request(self, station, timeseries, cached=None):
+        '''
+        Request the current measurement, conditionally when cached.
+        Runs on the thread pool, so it does not touch the brain.
+
+        :param station: The station UUID.
+        :param timeseries: The timeseries, like W or Q.
+        :param cached: The cached measurement, maybe None.
+        :return: The measurement, the cached one if not modified, None on failure.
+        '''
+        url = '{}/stations/{}/{}/currentmeasurement.json'.format(self.base_url, station, timeseries)
+        headers = {'Accept': 'application/json'}
+        if cached and 'etag' in cached:
+            headers['If-None-Match'] = cached['etag']
+        try:
+            with REGISTRY.timer('pegelonline', timeseries=timeseries):
+                response = self.session.get(url, headers=headers, timeout=self.timeout)
+        except requests.RequestException as request_error:
+            self.logger.error('Could not fetch %s: %s', url, request_error)
+            return None
+        if response.status_code == 304:
+            return cached
+        if response.status_code != 200:
+            self.logger.error('Could not fetch %s: HTTP %s', url, response.status_code)
+            return None
+        measurement = response.json()
+        if 'ETag' in response.headers:
+            measurement['etag'] = response.headers['ETag']
+        return measurement
+
+
+    def request_stations(self, stations, timeseries):
+        '''
+        Request the current measurements of many stations with one request.
+        Runs in the calling thread, it does not touch the brain either.
+
+        :param stations: The station UUIDs.
+        :param timeseries: The timeseries, like ('W', 'Q').
+        :return: Dict of tuples of station and timeseries to measurements, None on failure.
+        '''
+        url = '{}/stations.json'.format(self.base_url)
+        params = {
+            'ids': ','.join(stations),
+            'includeTimeseries': 'true',
+            'includeCurrentMeasurement': 'true',
+        }
+        try:
+            with REGISTRY.timer('pegelonline', timeseries='stations'):
+                response = self.session.get(
+                    url, params=params, headers={'Accept': 'application/json'}, timeout=self.timeout
+                )
+        except requests.RequestException as request_error:
+            self.logger.warning('Could not fetch %s: %s', url, request_error)
+            return None
+        if response.status_code != 200:
+            self.logger.warning('Could not fetch %s: HTTP %s', url, response.status_code)
+            return None
+        measurements = {}
+        for station in response.json():
+            for series in station.get('timeseries', ()):
+                if series['shortname'] in timeseries and 'currentMeasurement' in series:
+                    measurements[(station['uuid'], series['shortname'])] = dict(
+                        series['currentMeasurement'],
+                        station=station.get('shortname'), unit=series.get('unit')
+                    )
+        return measurements
+
+
+    def store(self, station, timeseries, measurement, cached):
+        '''
+        Cache a measurement unless it is the cached one or missing.
+
+        :param station: The station UUID.
+        :param timeseries: The timeseries, like W or Q.
+        :param measurement: The measurement, maybe None.
+        :param cached: The cached measurement, maybe None.
+        '''
+        if measurement and self.brain is not None and measurement is not cached:
+            self.brain.store(
+                self.space, '{}/{}'.format(station, timeseries), json.dumps(measurement)
+            )
+
+
+    def measurements(self, station, timeseries):
+        '''
+        Provide the current measurements of a station, requesting the ones
+        not cached or due concurrently.
+
+        :param station: The station UUID.
+        :param timeseries: The timeseries, like ('W', 'Q').
+        :return: List of measurements with timestamp and value, None where failing.
+        '''
+        timeseries = list(timeseries)
+        cached = [self.cached(station, name) for name in timeseries]
+        now = time.time()
+        due = [
+            index for index, measurement in enumerate(cached) if not self.fresh(measurement, now)
+        ]
+        REGISTRY.count('pegelonline_cache', len(timeseries) - len(due), outcome='hit')
+        REGISTRY.count('pegelonline_cache', len(due), outcome='miss')
+        current = list(cached)
+        for index, measurement in zip(due, self.executor.map(
+                lambda index: self.request(station, timeseries[index], cached[index]), due
+        )):
+            current[index] = measurement
+            self.store(station, timeseries[index], measurement, cached[index])
+        return current
+
+
+    def stations(self, stations, timeseries):
+        '''
+        Provide the current measurements of many stations, requesting the
+        ones not cached or due with one request, or concurrently one by one
+        if that fails.
+
+        :param stations: The station UUIDs.
+        :param timeseries: The timeseries, like ('W', 'Q').
+        :return: Dict of station UUIDs to lists of measurements, None where failing.
+        '''
+        timeseries = list(timeseries)
+        current = {
+            station: [self.cached(station, name) for name in timeseries] for station in stations
+        }
+        now = time.time()
+        due = [
+            (station, index) for station, cached in current.items()
+            for index, measurement in enumerate(cached) if not self.fresh(measurement, now)
+        ]
+        REGISTRY.count(
+            'pegelonline_cache', len(current) * len(timeseries) - len(due), outcome='hit'
+        )
+        REGISTRY.count('pegelonline_cache', len(due), outcome='miss')
+        if not due:
+            return current
+
+        fetched = self.request_stations(sorted(set(station for station, _ in due)), timeseries)
+        if fetched is None:
+            fetched = dict(zip(
+                ((station, timeseries[index]) for station, index in due),
+                self.executor.map(
+                    lambda due: self.request(
+                        due[0], timeseries[due[1]], current[due[0]][due[1]]
+                    ), due
+                )
+            ))
+        for station, index in due:
+            measurement = fetched.get((station, timeseries[index]))
+            self.store(station, timeseries[index], measurement, current[station][index])
+            current[station][index] = measurement
+        return current
+
 
 def rhein(karlsruher):
-    '''Tweet Rhine's current pegel and flow.'''
-    pegel = fetch(API_URL.format('W'))
-    fluss = fetch(API_URL.format('Q'))
-    old_pegel = karlsruher.brain.get('rhein', 'pegel')
-    old_fluss = karlsruher.brain.get('rhein', 'fluss')
-    karlsruher.brain.store('rhein', 'pegel', pegel)
-    karlsruher.brain.store('rhein', 'fluss', fluss)
-    pegel_diff = pegel - int(old_pegel) if old_pegel else 0
-    fluss_diff = fluss - int(old_fluss) if old_fluss else 0
-    tweet = TWEET.format(pegel, pegel_diff, fluss, fluss_diff).strip()
+    '''
+    Log Rhine's current pegel and flow, record the pegel as time series
+    and tweet when its trend changes.
+    '''
+    with Pegelonline(karlsruher.brain) as pegelonline:
+        measurements = pegelonline.measurements(MAXAU, ('W', 'Q'))
+    level, flow = (value(measurement) for measurement in measurements)
+    old_level = karlsruher.brain.get('rhein', 'pegel')
+    old_flow = karlsruher.brain.get('rhein', 'fluss')
+    karlsruher.brain.store('rhein', 'pegel', level)
+    karlsruher.brain.store('rhein', 'fluss', flow)
+    level_diff = level - int(old_level) if old_level else 0
+    flow_diff = flow - int(old_flow) if old_flow else 0
+    tweet = TWEET.format(level, level_diff, flow, flow_diff).strip()
+    karlsruher.logger.info(tweet)
+    if not measurements[0]:
+        return
+
+    # Repeated polls of one measurement record the same value:
+    series = '{}/W'.format(MAXAU)
+    karlsruher.brain.record(series, measured(measurements[0]['timestamp']), level)
+    karlsruher.brain.downsample(series, SERIES_RAW_AGE, 60 * 60, SERIES_RETENTION)
+    rolling = Rolling(TREND_WINDOW, karlsruher.brain.series(series, time.time() - TREND_WINDOW))
+    karlsruher.logger.info('Pegel of the last %s hours: %s', TREND_WINDOW // 3600, rolling)
+
+    current = trend(rolling)
+    if current is None or current == karlsruher.brain.get('rhein', 'trend'):
+        return
+    karlsruher.brain.store('rhein', 'trend', current)
+    tweet = TREND.format(
+        tweet, current, rolling.rate * 60 * 60,
+        int(rolling.minimum), int(rolling.maximum), TREND_WINDOW // 3600
+    )
     karlsruher.logger.info(tweet)
     if '--tweet' in sys.argv:
-        karlsruher.tweet(tweet)
+        karlsruher.queue.enqueue('update_status', status=tweet)
+
+
+def pegel(karlsruher):
+    '''
+    Fetch the current measurements of the given stations in bulk,
+    record them as time series per station and log them.
+    '''
+    if not karlsruher.stations:
+        karlsruher.logger.warning('No stations given, use --stations=UUID,...')
+        return
+    with Pegelonline(karlsruher.brain) as pegelonline:
+        current = pegelonline.stations(karlsruher.stations, karlsruher.timeseries)
+    for station, measurements in current.items():
+        values = []
+        name = station
+        for timeseries, measurement in zip(karlsruher.timeseries, measurements):
+            if not measurement:
+                continue
+            name = measurement.get('station') or station
+            series = '{}/{}'.format(station, timeseries)
+            karlsruher.brain.record(
+                series, measured(measurement['timestamp']), measurement['value']
+            )
+            karlsruher.brain.downsample(series, SERIES_RAW_AGE, 60 * 60, SERIES_RETENTION)
+            values.append('{} {} {}'.format(
+                timeseries, measurement['value'], measurement.get('unit') or ''
+            ).strip())
+        karlsruher.logger.info('%s: %s', name, ', '.join(values) if values else 'no measurements')
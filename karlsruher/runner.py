@@ -0,0 +1,117 @@
+'''
+Drive several Karlsruher instances from one single process
+'''
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from .karlsruher import Karlsruher
+from .metrics import REGISTRY
+
+
+class Runner:
+    '''
+    Run commands for several accounts on one shared worker pool.
+
+    Every account keeps its own home, brain, lock and pacer, so rate
+    limits stay isolated per account. Commands of one account never
+    overlap, a command due while its account is busy is skipped.
+    '''
+
+    def __init__(self, homes, workers=4, factory=Karlsruher):
+        '''
+        :param homes: The home directories of the accounts.
+        :param workers: The number of accounts to run commands for at once.
+        :param factory: For testing, a function creating Karlsruher instances.
+        '''
+        self.logger = logging.getLogger(__class__.__name__)
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        pool_size = workers * 4
+        self.requests = ThreadPoolExecutor(max_workers=pool_size)
+        self.accounts = []
+        self.locks = {}
+        try:
+            for home in homes:
+                karlsruher = factory(home=home, executor=self.requests, pool_size=pool_size)
+                self.accounts.append(karlsruher)
+                self.locks[karlsruher] = threading.Lock()
+        except Exception:
+            self.close()
+            raise
+
+    def __repr__(self):
+        ''':return: The accounts as string representation.'''
+        return 'Running {} accounts: {}.'.format(
+            len(self.accounts), ', '.join(karlsruher.home for karlsruher in self.accounts)
+        )
+
+
+    def close(self):
+        '''
+        Shut the worker pools down and unlock all accounts.
+        '''
+        self.executor.shutdown(wait=True)
+        for karlsruher in self.accounts:
+            karlsruher.aio.close()
+            karlsruher.unlock()
+        self.requests.shutdown(wait=True)
+
+
+    def execute(self, karlsruher, commands):
+        '''
+        Run commands for one account, unless it is busy.
+
+        :param karlsruher: The Karlsruher instance of the account.
+        :param commands: The functions to call with the instance, in order.
+        :return: True if all commands succeeded, False if any failed or when skipped.
+        '''
+        lock = self.locks[karlsruher]
+        if not lock.acquire(blocking=False):
+            self.logger.warning('Skipping, %s is busy.', karlsruher.home)
+            return False
+        succeeded = True
+        try:
+            for command in commands:
+                self.logger.info('Running %s for %s', command.__name__, karlsruher.home)
+                started = time.perf_counter()
+                try:
+                    command(karlsruher)
+                except Exception as error: # pylint: disable=broad-except
+                    succeeded = False
+                    REGISTRY.count(
+                        'command_failures', command=command.__name__, home=karlsruher.home
+                    )
+                    self.logger.exception(
+                        'Command %s failed for %s: %s', command.__name__, karlsruher.home, error
+                    )
+                REGISTRY.observe(
+                    'command', time.perf_counter() - started,
+                    command=command.__name__, home=karlsruher.home
+                )
+        finally:
+            lock.release()
+        return succeeded
+
+
+    def submit(self, commands):
+        '''
+        Run commands for all accounts on the worker pool, without waiting.
+
+        :param commands: The functions to call with each instance, in order.
+        :return: The futures, one per account.
+        '''
+        return [
+            self.executor.submit(self.execute, karlsruher, commands)
+            for karlsruher in self.accounts
+        ]
+
+
+    def run(self, commands):
+        '''
+        Run commands for all accounts on the worker pool and wait for them.
+
+        :param commands: The functions to call with each instance, in order.
+        '''
+        wait(self.submit(commands))
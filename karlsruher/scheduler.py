@@ -0,0 +1,84 @@
+'''
+Run commands repeatedly at their intervals within one single loop
+'''
+
+import logging
+import threading
+import time
+
+
+class Scheduler:
+    '''
+    Provide a simple interval scheduler for long-running processes.
+    '''
+
+    # Seconds between the first runs of the jobs, in order of scheduling:
+    stagger = 10
+
+    def __init__(self):
+        self.logger = logging.getLogger(__class__.__name__)
+        self.jobs = []
+        self.stopping = threading.Event()
+
+    def __repr__(self):
+        ''':return: The scheduled jobs as string representation.'''
+        return 'Scheduling {}.'.format(
+            ', '.join('{} every {}s'.format(job['name'], job['interval']) for job in self.jobs)
+        )
+
+
+    def every(self, interval, name, function, *args):
+        '''
+        Schedule a job. Its first run is staggered behind the jobs scheduled
+        before, but not later than its interval, so the first jobs do not all
+        fall due at once.
+
+        :param interval: The interval in seconds.
+        :param name: The name of the job, for logging.
+        :param function: The function to call.
+        :param args: The arguments to call the function with.
+        '''
+        self.jobs.append({
+            'name': name, 'interval': interval,
+            'due': time.monotonic() + min(len(self.jobs) * self.stagger, interval),
+            'function': function, 'args': args
+        })
+
+
+    def stop(self, *_):
+        '''
+        Stop the loop after the running job, usable as signal handler.
+        '''
+        self.logger.info('Stopping...')
+        self.stopping.set()
+
+
+    def run_pending(self):
+        '''
+        Run all jobs that are due, failing jobs are logged and rescheduled.
+
+        :return: Seconds until the next job is due.
+        '''
+        for job in self.jobs:
+            if self.stopping.is_set():
+                break
+            if job['due'] > time.monotonic():
+                continue
+            try:
+                job['function'](*job['args'])
+            except Exception as error: # pylint: disable=broad-except
+                self.logger.exception('Job %s failed: %s', job['name'], error)
+            job['due'] = max(job['due'] + job['interval'], time.monotonic())
+        if not self.jobs:
+            return None
+        return max(0, min(job['due'] for job in self.jobs) - time.monotonic())
+
+
+    def run(self):
+        '''
+        Run jobs until stopped.
+        '''
+        self.logger.info(self)
+        while not self.stopping.is_set():
+            self.stopping.wait(self.run_pending())
+        self.logger.info('Stopped.')
@@ -0,0 +1,94 @@
+'''
+Rolling statistics of time series, updated value by value
+'''
+
+from collections import deque
+
+
+class Rolling:
+    '''
+    Keep the average, minimum, maximum and rate of change of the values
+    within a time window.
+
+    Every value is added and evicted once: the sum is kept running and
+    minimum and maximum are kept in monotonic queues, so adding a value
+    takes constant time on average, however long the window is.
+    '''
+
+    def __init__(self, window, values=()):
+        '''
+        :param window: The window in seconds.
+        :param values: Optional tuples of timestamp and value to add, oldest first.
+        '''
+        self.window = window
+        self.values = deque()
+        self.total = 0.0
+        self.minima = deque()
+        self.maxima = deque()
+        for timestamp, value in values:
+            self.add(timestamp, value)
+
+    def __len__(self):
+        ''':return: Number of values within the window.'''
+        return len(self.values)
+
+    def __repr__(self):
+        ''':return: The statistics as string representation.'''
+        if not self.values:
+            return 'No values'
+        return '{} values, average {:.1f}, min {}, max {}, {:+.1f} per hour'.format(
+            len(self), self.average, self.minimum, self.maximum, self.rate * 3600
+        )
+
+
+    def add(self, timestamp, value):
+        '''
+        Add a value and evict the values that left the window.
+
+        :param timestamp: The epoch of the value, not older than the last one.
+        :param value: The value.
+        '''
+        self.values.append((timestamp, value))
+        self.total += value
+        while self.minima and self.minima[-1][1] >= value:
+            self.minima.pop()
+        self.minima.append((timestamp, value))
+        while self.maxima and self.maxima[-1][1] <= value:
+            self.maxima.pop()
+        self.maxima.append((timestamp, value))
+
+        deadline = timestamp - self.window
+        while self.values[0][0] < deadline:
+            self.total -= self.values.popleft()[1]
+        while self.minima[0][0] < deadline:
+            self.minima.popleft()
+        while self.maxima[0][0] < deadline:
+            self.maxima.popleft()
+
+
+    @property
+    def average(self):
+        ''':return: The average of the values, None without values.'''
+        return self.total / len(self.values) if self.values else None
+
+    @property
+    def minimum(self):
+        ''':return: The minimum of the values, None without values.'''
+        return self.minima[0][1] if self.minima else None
+
+    @property
+    def maximum(self):
+        ''':return: The maximum of the values, None without values.'''
+        return self.maxima[0][1] if self.maxima else None
+
+    @property
+    def span(self):
+        ''':return: Seconds between the oldest and the latest value.'''
+        return self.values[-1][0] - self.values[0][0] if self.values else 0
+
+    @property
+    def rate(self):
+        ''':return: The change per second from the oldest to the latest value, 0 without span.'''
+        if not self.span:
+            return 0.0
+        return (self.values[-1][1] - self.values[0][1]) / self.span
@@ -29,8 +29,12 @@ twitter:
 
 
     @staticmethod
-    def API(auth_yaml, create_on_demand=False):
-        ''':return: The authenticated api.API instance'''
+    def API(auth_yaml, create_on_demand=False, base_url=None):
+        '''
+        :param base_url: Optional root URL of another API, like a local fake
+                    server, taken from "twitter: url:" in the YAML file else.
+        :return: The authenticated api.API instance
+        '''
 
         if create_on_demand:
             tweepyx.create_auth_yaml_on_demand(auth_yaml)
@@ -51,6 +55,7 @@ twitter:
                     read_yaml['twitter']['access']['key'],
                     read_yaml['twitter']['access']['secret']
                 )
+                base_url = base_url or read_yaml['twitter'].get('url')
             except:
                 # pylint: disable=raise-missing-from
                 raise tweepy.TweepError(
@@ -63,12 +68,15 @@ twitter:
         oauth_handler = tweepy.OAuthHandler(consumer_key, consumer_secret)
         oauth_handler.set_access_token(access_key, access_secret)
 
-        return tweepy.API(
+        api = tweepy.API(
             auth_handler=oauth_handler,
             compression=True,
             wait_on_rate_limit=True,
             wait_on_rate_limit_notify=True
         )
+        # Tweepy always requests https://host, the robot requests base_url:
+        api.base_url = base_url
+        return api
 
     @staticmethod
     def ask():
@@ -1,55 +1,173 @@
 '''
     Delete all tweets that are older than a given age
 '''
+
+import calendar
+import time
+
 from datetime import datetime
-from time import sleep
 
-def delete_aged_tweets(karlsruher, max_age_days=7):
+from .metrics import REGISTRY
+
+
+# Brain space indexing own tweets by id, timestamped with their creation:
+SPACE = 'own'
+
+# Brain space of the state of deleting:
+STATE = 'vergisses'
+
+# Twitter error code of a status that does not exist (anymore):
+NOT_FOUND = 144
+
+
+def created(tweet):
+    '''
+    :param tweet: A tweet.
+    :return: The creation of the tweet as epoch, now when unknown.
+    '''
+    created_at = getattr(tweet, 'created_at', None)
+    if isinstance(created_at, datetime):
+        # Tweepy parses created_at as naive datetime in UTC:
+        return calendar.timegm(created_at.timetuple())
+    return int(time.time())
+
+
+def index_tweets(brain, tweets):
+    '''
+    Index own tweets, like the responses of tweeting and retweeting.
+
+    :param brain: The Brain.
+    :param tweets: An iterable of own tweets.
+    :return: Number of affected rows in database.
+    '''
+    return brain.store_dated(SPACE, ((tweet.id, created(tweet)) for tweet in tweets))
+
+
+def backfill(karlsruher):
+    '''
+    Index the own timeline once, paging backwards from where it stopped.
+
+    :param karlsruher: A Karlsruher instance.
+    '''
+    if karlsruher.brain.has(STATE, 'backfilled'):
+        return
+    karlsruher.logger.info('Indexing own tweets...')
+    max_id = karlsruher.brain.get(STATE, 'backfill_max_id')
+    while True:
+        tweets = karlsruher.call('user_timeline', count=200, max_id=max_id, trim_user=True)
+        if not tweets:
+            break
+        index_tweets(karlsruher.brain, tweets)
+        if not karlsruher.brain.has(STATE, 'since_id'):
+            # The first page is the newest, later ones are topped up from here:
+            karlsruher.brain.store(STATE, 'since_id', max(tweet.id for tweet in tweets))
+        max_id = min(tweet.id for tweet in tweets) - 1
+        karlsruher.brain.store(STATE, 'backfill_max_id', max_id)
+    karlsruher.brain.store(STATE, 'backfilled')
+    karlsruher.brain.forget(STATE, 'backfill_max_id')
+    karlsruher.logger.info('Indexing own tweets done.')
+
+
+def top_up(karlsruher):
     '''
+    Index the own tweets posted since the last indexing, also the ones
+    not tweeted by the robot, like from the web or apps.
+
+    :param karlsruher: A Karlsruher instance.
+    '''
+    since_id = karlsruher.brain.get(STATE, 'since_id')
+    if since_id is None:
+        # Indexed before the timeline was topped up:
+        since_id = max(karlsruher.brain.entries(SPACE), default=None)
+    since_id = int(since_id) if since_id is not None else None
+    newest = None
+    max_id = None
+    while True:
+        tweets = karlsruher.call(
+            'user_timeline', count=200, since_id=since_id, max_id=max_id, trim_user=True
+        )
+        if not tweets:
+            break
+        index_tweets(karlsruher.brain, tweets)
+        newest = max([tweet.id for tweet in tweets] + ([newest] if newest else []))
+        max_id = min(tweet.id for tweet in tweets) - 1
+    if newest:
+        karlsruher.brain.store(STATE, 'since_id', newest)
+        karlsruher.logger.info('Indexed own tweets up to %s.', newest)
+
+
+def delete_aged_tweets(karlsruher, max_age_days=7, batch_size=None):
+    '''
+    Delete the indexed own tweets that are older than max_age_days,
+    without scanning the timeline again.
+
+    Batches of tweets are deleted concurrently, as fast as the rate limit
+    of destroy_status allows. Deleted tweets are forgotten batch by batch,
+    so an interrupted run resumes where it stopped. Tweets failing to delete
+    are skipped until the next run.
 
-    :param karlsruher:
-    :param max_age_days:
+    :param karlsruher: A Karlsruher instance.
+    :param max_age_days: The age of tweets to delete.
+    :param batch_size: Number of tweets to delete concurrently, bulk by default.
     '''
 
+    batch_size = batch_size if batch_size else karlsruher.bulk
+
     karlsruher.logger.info('Deleting tweets older than %s days...', max_age_days)
 
+    backfill(karlsruher)
+    top_up(karlsruher)
+
     delete_count = 0
-    oldest_id = None
-    now = datetime.now()
+    failed_ids = set()
+    started = time.perf_counter()
 
     try:
         while True:
 
-            tweets = karlsruher.api.user_timeline(count=200, max_id=oldest_id, trim_user=True)
+            aged_ids = [
+                tweet_id for tweet_id in karlsruher.brain.aged(
+                    SPACE, max_age_days * 24 * 60 * 60, batch_size + len(failed_ids)
+                ) if tweet_id not in failed_ids
+            ]
 
-            if not tweets:
-                karlsruher.logger.info('No tweets to delete, cheers!')
+            if not aged_ids:
                 break
 
-            for tweet in tweets:
-
-                oldest_id = tweet.id
-
-                ## baby maybe one day?
-                #if tweet.favorite_count > 0:
-                #    karlsruher.logger.info('Tweet is a favorite, now what?')
-                #if tweet.retweet_count > 0:
-                #    karlsruher.logger.info('Tweet is retweeted, now what?')
-
-                tweet_age = now - tweet.created_at
-                if tweet_age.days < max_age_days:
-                    karlsruher.logger.info('Keeping tweet: %s' , tweet.id)
+            gone_ids = []
+            for tweet_id, deleted in zip(aged_ids, karlsruher.aio.gather(
+                    *(karlsruher.aio.request('destroy_status', tweet_id) for tweet_id in aged_ids)
+            )):
+                if not isinstance(deleted, Exception):
+                    karlsruher.logger.debug('Deleted tweet: %s', tweet_id)
+                    delete_count += 1
+                elif getattr(deleted, 'api_code', None) == NOT_FOUND:
+                    karlsruher.logger.info('Tweet already deleted: %s', tweet_id)
+                else:
+                    karlsruher.logger.error('Could not delete tweet %s: %s', tweet_id, deleted)
+                    failed_ids.add(tweet_id)
                     continue
+                gone_ids.append(tweet_id)
 
-                karlsruher.logger.info('Deleting tweet: %s',tweet.id)
-                karlsruher.api.destroy_status(tweet.id)
-                delete_count += 1
-
-                sleep(0.25)
+            # Checkpoint, the remaining index is where to resume:
+            karlsruher.brain.forget_many(SPACE, gone_ids)
+            karlsruher.brain.store(
+                STATE, 'deleted', int(karlsruher.brain.get(STATE, 'deleted', 0)) + len(gone_ids)
+            )
+            REGISTRY.count('tweets_deleted', len(gone_ids))
+            REGISTRY.count('tweets_failed', len(aged_ids) - len(gone_ids))
 
-            karlsruher.logger.info('Number of tweets deleted: %s', delete_count)
-
-            sleep(1)
+            karlsruher.logger.info(
+                'Deleted %s tweets, %.1f per second...',
+                delete_count, delete_count / (time.perf_counter() - started)
+            )
 
     except KeyboardInterrupt:
         karlsruher.logger.info('Aborted! Number of tweets deleted: %s', delete_count)
+        return
+
+    karlsruher.logger.info(
+        'Number of tweets deleted: %s, failed: %s, in %.1fs, %s in total.',
+        delete_count, len(failed_ids), time.perf_counter() - started,
+        karlsruher.brain.get(STATE, 'deleted', 0)
+    )
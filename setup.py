@@ -21,10 +21,11 @@ setup(
         'Environment :: Console',
         'Intended Audience :: Developers',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.4',
         'Programming Language :: Python :: 3.5',
+        'Programming Language :: Python :: 3.6',
         'Programming Language :: Python :: 3.7',
         'Programming Language :: Python :: 3.8',
+        'Programming Language :: Python :: 3.9',
         'License :: Public Domain',
         'Topic :: Artistic Software',
         'Topic :: Internet',
@@ -35,7 +36,7 @@ setup(
     zip_safe=True,
     keywords='twitter robot bot retweet cronjob',
     packages=find_packages(),
-    python_requires='>=3.4, <4',
+    python_requires='>=3.5, <4',
     install_requires=['pyaml>=5.1', 'tweepy==3.10'],
     extras_require={
         'dev': ['check-manifest'],
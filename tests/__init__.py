@@ -2,6 +2,19 @@
 Karlsruher tests
 '''
 
+from .actions_test import ActionQueueTest
+from .asyncapi_test import AsyncAPITest
 from .brain_test import BrainTest
+from .commands_test import CommandsTest
+from .fakeapi_test import FakeTwitterTest
 from .tweepyx_test import TweepyXTest
+from .vergisses_test import VergissesTest
 from .karlsruher_test import KarlsruherTest
+from .metrics_test import MetricsTest
+from .pacing_test import PacerTest
+from .pipeline_test import PipelineTest
+from .profiling_test import ProfilingTest
+from .rheinpegel_test import PegelonlineTest, RheinpegelTest
+from .runner_test import RunnerTest
+from .scheduler_test import SchedulerTest
+from .timeseries_test import RollingTest
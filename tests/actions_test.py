@@ -0,0 +1,102 @@
+'''
+ActionQueueTest
+'''
+
+from unittest import TestCase, mock
+
+from tweepy.error import TweepError
+
+from karlsruher.actions import ActionQueue
+from karlsruher.asyncapi import AsyncAPI
+from karlsruher.brain import Brain
+
+
+def own_tweet(tweet_id):
+    ''':return: A tweet as the API returns for a tweet or retweet.'''
+    return mock.Mock(id=tweet_id, created_at=None)
+
+
+def twitter_error(code):
+    ''':return: A TweepError with the given Twitter error code.'''
+    return TweepError('failing', api_code=code)
+
+
+class ActionQueueTest(TestCase):
+    '''
+    Test the ActionQueue
+    '''
+
+    def setUp(self):
+        self.api = mock.Mock(
+            retweet=mock.Mock(return_value=own_tweet(2)),
+            update_status=mock.Mock(return_value=own_tweet(3)),
+        )
+        self.brain = Brain()
+        self.aio = AsyncAPI(api=self.api, pool_size=2)
+        self.queue = ActionQueue(self.brain, self.aio)
+
+    def tearDown(self):
+        self.aio.close()
+
+    def test_enqueues_once_per_key(self):
+        '''Queue must keep one action per idempotency key'''
+        self.assertTrue(self.queue.enqueue('retweet', 'retweet:1', id=1))
+        self.assertFalse(self.queue.enqueue('retweet', 'retweet:1', id=1))
+        self.assertTrue(self.queue.enqueue('update_status', status='Hello'))
+        self.assertFalse(self.queue.enqueue('update_status', status='Hello'))
+        self.assertEqual(2, len(self.queue))
+
+    def test_can_drain(self):
+        '''Queue must send and forget actions'''
+        self.queue.batch_size = 2
+        for tweet_id in range(5):
+            self.queue.enqueue('retweet', id=tweet_id)
+        self.assertEqual(5, self.queue.drain())
+        self.assertEqual(5, self.api.retweet.call_count)
+        self.assertEqual(0, len(self.queue))
+
+    def test_survives_restart(self):
+        '''Queue must keep actions in the brain'''
+        self.queue.enqueue('retweet', id=1)
+        queue = ActionQueue(self.brain, self.aio)
+        self.assertEqual(1, queue.drain())
+        self.api.retweet.assert_called_once_with(id=1)
+
+    def test_retries_with_backoff(self):
+        '''Queue must retry failed actions later'''
+        self.api.retweet = mock.Mock(side_effect=[TweepError('failing'), own_tweet(2)])
+        self.queue.enqueue('retweet', id=1)
+        with self.assertLogs('ActionQueue', 'WARNING'):
+            self.assertEqual(0, self.queue.drain())
+        self.assertEqual(1, len(self.queue))
+        self.assertEqual([], self.queue.due())
+        with mock.patch('time.time', return_value=10 ** 12):
+            self.assertEqual(1, self.queue.drain())
+        self.assertEqual(2, self.api.retweet.call_count)
+
+    def test_drops_after_max_attempts(self):
+        '''Queue must give up eventually'''
+        self.api.retweet = mock.Mock(side_effect=TweepError('failing'))
+        self.queue.max_attempts = 2
+        self.queue.backoff = 0
+        self.queue.enqueue('retweet', id=1)
+        with self.assertLogs('ActionQueue', 'ERROR'):
+            self.assertEqual(0, self.queue.drain())
+        self.assertEqual(2, self.api.retweet.call_count)
+        self.assertEqual(0, len(self.queue))
+
+    def test_drops_permanent_errors(self):
+        '''Queue must not retry what will never succeed'''
+        self.api.retweet = mock.Mock(side_effect=twitter_error(144))
+        self.queue.enqueue('retweet', id=1)
+        with self.assertLogs('ActionQueue', 'ERROR'):
+            self.assertEqual(0, self.queue.drain())
+        self.assertEqual(1, self.api.retweet.call_count)
+        self.assertEqual(0, len(self.queue))
+
+    def test_accepts_duplicates(self):
+        '''Queue must count actions already done, like after a crash'''
+        self.api.retweet = mock.Mock(side_effect=twitter_error(327))
+        self.queue.enqueue('retweet', id=1)
+        self.assertEqual(1, self.queue.drain())
+        self.assertEqual(0, len(self.queue))
@@ -0,0 +1,101 @@
+'''
+AsyncAPITest
+'''
+
+import socket
+
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+from unittest import TestCase
+
+from tweepy.error import TweepError
+
+from karlsruher.asyncapi import AsyncAPI
+from karlsruher.fakeapi import FakeTwitter
+from karlsruher.pacing import Pacer
+
+
+class AsyncAPITest(TestCase):
+    '''
+    Test the AsyncAPI against a local FakeTwitter
+    '''
+
+    def setUp(self):
+        self.server = FakeTwitter(latency=0.05, rate_limit=10, followers=3).start()
+        self.pacer = Pacer(sleep=mock.Mock())
+        self.api = AsyncAPI(
+            base_url=self.server.base_url, pool_size=4, timeout=5, pacer=self.pacer
+        )
+
+    def tearDown(self):
+        self.api.close()
+        self.server.stop()
+
+    def test_can_request(self):
+        '''Must parse responses into models'''
+        me = self.api.run(self.api.request('me'))
+        self.assertEqual('FakeRobot', me.screen_name)
+
+    def test_can_request_cursors(self):
+        '''Must return cursors when given a cursor'''
+        ids, cursors = self.api.run(self.api.request('followers_ids', cursor=-1, count=2))
+        self.assertEqual([1000000, 1000001], ids)
+        self.assertEqual((0, 2), cursors)
+
+    def test_can_fail(self):
+        '''Must raise TweepError on error responses'''
+        with self.assertRaises(TweepError) as context:
+            self.api.run(self.api.request('destroy_status', 123))
+        self.assertEqual(144, context.exception.api_code)
+
+    def test_can_request_concurrently(self):
+        '''Must run requests concurrently on pooled connections'''
+        retweets = self.api.gather(*(self.api.request('retweet', id) for id in range(8)))
+        self.assertEqual(['RT {}'.format(id) for id in range(8)], [r.text for r in retweets])
+        self.assertEqual(1, self.server.requests['/1.1/statuses/retweet/7.json'])
+        self.assertLess(1, self.server.overlap)
+        self.assertGreaterEqual(4, self.server.overlap)
+        self.assertGreaterEqual(4, self.server.connections)
+
+    def test_can_fail_unreachable(self):
+        '''Must raise TweepError when the request cannot be sent'''
+        with socket.socket() as closed:
+            closed.bind(('127.0.0.1', 0))
+            port = closed.getsockname()[1]
+        unreachable = AsyncAPI(base_url='http://127.0.0.1:{}/1.1'.format(port), timeout=5)
+        with self.assertRaises(TweepError) as context:
+            unreachable.run(unreachable.request('me'))
+        self.assertIn('Failed to send request', str(context.exception))
+        unreachable.close()
+
+    def test_can_observe_rate_limits(self):
+        '''Must narrow the budget by response headers'''
+        self.api.run(self.api.request('me'))
+        self.assertEqual(9, self.pacer.buckets['account/verify_credentials'].tokens)
+
+    def test_can_gather_failures(self):
+        '''Must return exceptions of failing requests'''
+        results = self.api.gather(self.api.request('me'), self.api.request('destroy_status', 123))
+        self.assertEqual('FakeRobot', results[0].screen_name)
+        self.assertIsInstance(results[1], TweepError)
+
+    def test_can_delegate(self):
+        '''Must delegate to a synchronous api'''
+        api = mock.Mock(retweet=mock.Mock(return_value='retweeted'))
+        delegating = AsyncAPI(api=api, pacer=self.pacer)
+        self.assertEqual('retweeted', delegating.run(delegating.request('retweet', 1)))
+        api.retweet.assert_called_once_with(1)
+        delegating.close()
+
+    def test_can_share_executor(self):
+        '''Must keep a connection per thread of a shared pool of the given size'''
+        executor = ThreadPoolExecutor(max_workers=8)
+        shared = AsyncAPI(base_url=self.server.base_url, pool_size=8, timeout=5, executor=executor)
+        shared.gather(*(shared.request('retweet', id) for id in range(8)))
+        shared.gather(*(shared.request('retweet', id) for id in range(8, 16)))
+        self.assertEqual(16, sum(self.server.requests.values()))
+        self.assertGreaterEqual(8, self.server.overlap)
+        self.assertGreaterEqual(8, self.server.connections)
+        shared.close()
+        self.assertTrue(executor.submit(int).result() == 0)
+        executor.shutdown()
@@ -2,6 +2,11 @@
 BrainTest
 '''
 
+import os
+import sqlite3
+import tempfile
+import time
+
 from unittest import TestCase
 from karlsruher.brain import Brain
 
@@ -31,6 +36,72 @@ class BrainTest(TestCase):
         self.assertEqual(None, self.brain.get('test', 1))
         self.assertEqual('data', self.brain.get('test', 2))
 
+    def test_can_list_items(self):
+        '''Brain must list entries with data, oldest first'''
+        self.brain.store('test', 'b', 'second')
+        self.brain.store('test', 'a', 'first')
+        self.brain.connection.execute('UPDATE memory SET timestamp = 0 WHERE entry=?', ('a',))
+        self.assertEqual([('a', 'first'), ('b', 'second')], list(self.brain.items('test')))
+        self.assertEqual([], list(self.brain.items('void')))
+
+    def test_can_list_aged(self):
+        '''Brain must list entries stored dated by age, oldest first'''
+        self.assertEqual(3, self.brain.store_dated('test', [(2, 200), (1, 100), (3, 2 ** 40)]))
+        self.assertEqual([1, 2], self.brain.aged('test', 60))
+        self.assertEqual([1], self.brain.aged('test', 60, 1))
+        self.assertEqual([], self.brain.aged('void', 60))
+
+    def test_can_list_due(self):
+        '''Brain must list entries with data whose timestamp has come, oldest first'''
+        self.brain.store('test', 'b', 'second', 200)
+        self.brain.store('test', 'a', 'first', 100)
+        self.brain.store('test', 'c', 'later', 2 ** 40)
+        self.assertEqual([('a', 'first'), ('b', 'second')], self.brain.due('test'))
+        self.assertEqual([('a', 'first')], self.brain.due('test', 1))
+        self.assertEqual([], self.brain.due('void'))
+
+    def test_can_count(self):
+        '''Brain must count the entries of a space'''
+        self.assertEqual(0, self.brain.count('test'))
+        self.brain.store_many('test', ['a', 'b', 'c'])
+        self.assertEqual(3, self.brain.count('test'))
+        self.assertEqual(0, self.brain.count('void'))
+
+    def test_can_record_series(self):
+        '''Brain must record time series, replacing values of the same timestamp'''
+        self.assertEqual(1, self.brain.record('series', 200, 2.0))
+        self.assertEqual(1, self.brain.record('series', 100, 1.0))
+        self.assertEqual(1, self.brain.record('series', 200, 3.0))
+        self.assertEqual([(100, 1.0), (200, 3.0)], self.brain.series('series'))
+        self.assertEqual([(200, 3.0)], self.brain.series('series', 150))
+        self.assertEqual([], self.brain.series('void'))
+
+    def test_can_downsample_series(self):
+        '''Brain must average old values per step and forget the oldest'''
+        now = int(time.time()) // 3600 * 3600
+        for minutes in range(0, 4 * 60, 15):
+            self.brain.record('series', now - 3 * 3600 + minutes * 60, minutes)
+        self.brain.record('series', now - 10 * 3600, 1000)
+        self.assertEqual(11, self.brain.downsample('series', 3600, 3600))
+        self.assertEqual(10, self.brain.downsample('series', 7200, 3600, 9 * 3600))
+        self.assertEqual(10, self.brain.downsample('series', 7200, 3600, 9 * 3600))
+        self.assertEqual(
+            [(now - 3 * 3600, 22.5), (now - 2 * 3600, 82.5)], self.brain.series('series')[:2]
+        )
+
+    def test_downsamples_expired_values_only(self):
+        '''Brain must not average downsampled values again'''
+        now = int(time.time()) // 3600 * 3600
+        for hours in range(1, 100):
+            self.brain.record('series', now - hours * 3600, hours)
+        self.brain.record('series', now - 3600 - 60, 0)
+        self.assertEqual(99, self.brain.downsample('series', 3600, 3600))
+        self.assertEqual((now - 2 * 3600, 1.0), self.brain.series('series')[-2])
+        changes = self.brain.connection.total_changes
+        self.assertEqual(99, self.brain.downsample('series', 3600, 3600))
+        self.assertEqual(changes, self.brain.connection.total_changes)
+        self.assertEqual(0, self.brain.downsample('void', 3600, 3600))
+
     def test_can_forget(self):
         '''Brain must forget one'''
         self.assertEqual(1, self.brain.store('test', 1))
@@ -40,3 +111,202 @@ class BrainTest(TestCase):
         self.assertEqual(1, self.brain.forget('test', 3))
         self.assertFalse(self.brain.has('test', 3))
         self.assertEqual(3, self.brain.forget('test'))
+
+    def test_can_store_many(self):
+        '''Brain must store many entries at once'''
+        self.assertEqual(3, self.brain.store_many('test', iter([1, 2, 3])))
+        self.assertTrue(self.brain.has('test', 1))
+        self.assertTrue(self.brain.has('test', 3))
+        self.assertEqual(1, self.brain.store_many('test', [4], 'data'))
+        self.assertEqual('data', self.brain.get('test', 4))
+        self.assertEqual(0, self.brain.store_many('test', []))
+
+    def test_can_forget_many(self):
+        '''Brain must forget many entries at once'''
+        self.brain.store_many('test', [1, 2, 3, 4])
+        self.assertEqual(2, self.brain.forget_many('test', iter([2, 3, 5])))
+        self.assertTrue(self.brain.has('test', 1))
+        self.assertFalse(self.brain.has('test', 2))
+        self.assertFalse(self.brain.has('test', 3))
+        self.assertTrue(self.brain.has('test', 4))
+
+    def test_store_many_is_one_transaction(self):
+        '''Brain must store nothing when the entries fail halfway'''
+        def failing():
+            yield 1
+            raise RuntimeError('failing')
+        self.assertRaises(RuntimeError, self.brain.store_many, 'test', failing())
+        self.assertFalse(self.brain.has('test', 1))
+
+    def test_can_replace(self):
+        '''Brain must replace a space by its delta'''
+        self.brain.store_many('test', [1, 2, 3])
+        self.brain.store('other', 1)
+        self.assertEqual((2, 1), self.brain.replace('test', iter([2, 3, 4, 5, 5])))
+        self.assertFalse(self.brain.has('test', 1))
+        self.assertTrue(self.brain.has('test', 2))
+        self.assertTrue(self.brain.has('test', 5))
+        self.assertTrue(self.brain.has('other', 1))
+        self.assertEqual((0, 0), self.brain.replace('test', [2, 3, 4, 5]))
+        self.assertEqual((0, 4), self.brain.replace('test', []))
+
+    def test_replace_is_atomic(self):
+        '''Brain must keep a space when the entries fail halfway'''
+        def failing():
+            yield 2
+            raise RuntimeError('failing')
+        self.brain.store_many('test', [1, 2, 3])
+        self.assertRaises(RuntimeError, self.brain.replace, 'test', failing())
+        self.assertTrue(self.brain.has('test', 1))
+        self.assertTrue(self.brain.has('test', 3))
+        self.assertEqual((0, 2), self.brain.replace('test', [2]))
+
+    def test_can_cache(self):
+        '''Brain must cache spaces coherently'''
+        brain = Brain(cache=['test'])
+        brain.store_many('test', [1, 2])
+        self.assertTrue(brain.has('test', 1))
+        self.assertTrue(brain.space_cache('test').complete)
+        self.assertIsNone(brain.space_cache('other'))
+        brain.store('test', 3)
+        self.assertTrue(brain.has('test', 3))
+        brain.forget('test', 1)
+        self.assertFalse(brain.has('test', 1))
+        brain.store_many('test', [4])
+        self.assertTrue(brain.has('test', 4))
+        brain.replace('test', [5])
+        self.assertFalse(brain.has('test', 4))
+        self.assertTrue(brain.has('test', 5))
+        brain.forget_many('test', [5])
+        self.assertFalse(brain.has('test', 5))
+        brain.store('test', 6)
+        brain.forget('test')
+        self.assertFalse(brain.has('test', 6))
+
+    def test_keeps_cache_on_writes(self):
+        '''Brain must update a loaded cache by the entries written'''
+        brain = Brain(cache=['test'])
+        brain.store_many('test', [1, 2])
+        space_cache = brain.space_cache('test')
+        brain.store_many('test', iter([3]))
+        brain.store_dated('test', iter([(4, 0)]))
+        brain.forget_many('test', iter([1]))
+        self.assertIs(space_cache, brain.space_cache('test'))
+        self.assertEqual({'2': True, '3': True, '4': True}, dict(space_cache.members))
+        self.assertEqual(1, brain.prune('test', 60))
+        self.assertIs(space_cache, brain.space_cache('test'))
+        self.assertFalse(brain.has('test', 4))
+        self.assertTrue(space_cache.complete)
+
+    def test_starts_large_cache_empty(self):
+        '''Brain must not load a space beyond the size limit'''
+        brain = Brain(cache=['test'], cache_size=2)
+        brain.store_many('test', [1, 2, 3])
+        self.assertEqual({}, dict(brain.space_cache('test').members))
+        self.assertEqual({1, 3}, brain.has_many('test', [1, 3, 5]))
+        self.assertEqual(['3', '5'], list(brain.space_cache('test').members))
+        brain.replace('test', [7])
+        self.assertTrue(brain.space_cache('test').complete)
+        self.assertFalse(brain.has('test', 3))
+
+    def test_can_cache_with_size_limit(self):
+        '''Brain must evict cached entries beyond the size limit'''
+        self.brain = Brain(cache=['test'], cache_size=2)
+        self.brain.store_many('test', [1, 2, 3])
+        self.assertTrue(self.brain.has('test', 1))
+        self.assertFalse(self.brain.space_cache('test').complete)
+        self.assertFalse(self.brain.has('test', 4))
+        self.assertTrue(self.brain.has('test', 2))
+        self.assertEqual(2, len(self.brain.space_cache('test').members))
+        self.assertIsNone(self.brain.space_cache('test').lookup('1'))
+        self.assertTrue(self.brain.has('test', 3))
+        self.brain.forget('test', 3)
+        self.assertFalse(self.brain.has('test', 3))
+
+    def test_can_have_many(self):
+        '''Brain must answer membership for many entries at once'''
+        self.brain.chunk_size = 2
+        self.brain.store_many('test', [1, 2, 3, 4, 5])
+        self.assertEqual({1, 3, 5}, self.brain.has_many('test', [1, 3, 5, 7, 9]))
+        self.assertEqual({'2'}, self.brain.has_many('test', iter(['2', '6'])))
+        self.assertEqual(set(), self.brain.has_many('test', []))
+        brain = Brain(cache=['test'])
+        brain.store_many('test', [1, 2])
+        self.assertEqual({2}, brain.has_many('test', [2, 3]))
+
+    def test_can_key(self):
+        '''Brain must store integers as integers'''
+        self.assertEqual(1234567890123456789, Brain.key('1234567890123456789'))
+        self.assertEqual(0, Brain.key(0))
+        self.assertEqual('007', Brain.key('007'))
+        self.assertEqual('-1', Brain.key(-1))
+        self.assertEqual('True', Brain.key(True))
+        self.assertEqual('99999999999999999999', Brain.key(99999999999999999999))
+        self.assertEqual('sleep', Brain.key('sleep'))
+        self.assertEqual('\u00b2', Brain.key('\u00b2'))
+        self.assertEqual('', Brain.key(''))
+        self.brain.store('test', '1')
+        self.assertTrue(self.brain.has('test', 1))
+        self.assertEqual(1, self.brain.forget('test', 1))
+
+    def test_can_migrate_version_0(self):
+        '''Brain must migrate the legacy brain table'''
+        with tempfile.TemporaryDirectory() as home:
+            database = os.path.join(home, 'brain')
+            connection = sqlite3.connect(database)
+            connection.executescript('''
+                CREATE TABLE brain (
+                    space VARCHAR NOT NULL,
+                    entry VARCHAR NOT NULL,
+                    data TEXT,
+                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (space, entry)
+                );
+                INSERT INTO brain (space, entry) VALUES ('tweet', '1234567890');
+                INSERT INTO brain (space, entry) VALUES ('follower', '101');
+                INSERT INTO brain (space, entry, data) VALUES ('sleep', 'sleep', 'reason');
+            ''')
+            connection.close()
+            brain = Brain(database)
+            self.assertEqual(
+                Brain.schema_version,
+                brain.connection.execute('PRAGMA user_version').fetchone()[0]
+            )
+            self.assertTrue(brain.has('tweet', 1234567890))
+            self.assertTrue(brain.has('follower', '101'))
+            self.assertEqual('reason', brain.get('sleep', 'sleep'))
+            self.assertEqual(
+                int, type(brain.connection.execute('SELECT entry FROM memory WHERE data IS NULL').fetchone()[0])
+            )
+            brain.connection.close()
+            brain = Brain(database)
+            self.assertEqual('Having 1 followers, 1 sleeps, 1 tweets.', str(brain))
+            brain.connection.close()
+
+    def test_can_prune(self):
+        '''Brain must forget entries older than a given age'''
+        self.brain = Brain(cache=['test'])
+        self.brain.store_many('test', range(10))
+        self.brain.store('other', 1)
+        self.assertTrue(self.brain.has('test', 1))
+        self.brain.connection.execute(
+            'UPDATE memory SET timestamp = timestamp - 100 WHERE entry < 7'
+        )
+        self.assertEqual(0, self.brain.prune('test', 1000))
+        self.assertEqual(7, self.brain.prune('test', 50, batch_size=2))
+        self.assertFalse(self.brain.has('test', 1))
+        self.assertTrue(self.brain.has('test', 7))
+        self.assertTrue(self.brain.has('other', 1))
+        self.assertEqual(0, self.brain.prune('void', 50))
+
+    def test_can_age(self):
+        '''Brain must provide the age of entries'''
+        self.assertIsNone(self.brain.age('test', 1))
+        self.brain.store('test', 1)
+        self.assertIn(self.brain.age('test', 1), (0, 1))
+
+    def test_can_provide_entries(self):
+        '''Brain must provide all entries of a space'''
+        self.brain.store_many('test', [1, 'two'])
+        self.assertEqual({1, 'two'}, set(self.brain.entries('test')))
+        self.assertEqual([], list(self.brain.entries('void')))
@@ -0,0 +1,102 @@
+'''
+CommandsTest
+'''
+
+import json
+import os
+import re
+import subprocess
+import sys
+
+from unittest import TestCase, mock
+
+from karlsruher import commands
+from karlsruher.commands import Command, selected
+
+
+# Budget of importing the console in microseconds, it was 190000 when eager:
+IMPORT_BUDGET = 100000
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def imported(code):
+    ''':return: The stderr of running code with -X importtime.'''
+    return subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        universal_newlines=True, check=True
+    ).stderr
+
+
+class CommandsTest(TestCase):
+    '''
+    Test the command registry and lazy imports
+    '''
+
+    def test_console_imports_within_budget(self):
+        '''Console must start without importing the robot'''
+        timings = imported('import karlsruher.__main__')
+        for heavy in ('tweepy', 'yaml', 'requests', 'sqlite3', 'karlsruher.karlsruher'):
+            self.assertNotRegex(timings, r'\| +{}\n'.format(re.escape(heavy)))
+        cumulative = int(re.search(r'\| +(\d+) \| karlsruher.__main__\n', timings).group(1))
+        self.assertLess(cumulative, IMPORT_BUDGET)
+
+    def test_package_exports_lazily(self):
+        '''Package must import public names on first access'''
+        output = subprocess.run(
+            [sys.executable, '-c', 'import sys, karlsruher; karlsruher.Brain; print(sorted(sys.modules))'],
+            cwd=ROOT, stdout=subprocess.PIPE, universal_newlines=True, check=True
+        ).stdout
+        self.assertIn("'karlsruher.brain'", output)
+        self.assertNotIn("'tweepy'", output)
+
+    def test_loads_function_on_first_use(self):
+        '''Command must import its function once'''
+        command = Command('dump', 'json:dumps')
+        self.assertIsNone(command.loaded)
+        self.assertIs(json.dumps, command.function)
+        self.assertIsNone(command.interval)
+        self.assertEqual('-dump json:dumps', repr(command))
+
+    def test_takes_interval_from_function(self):
+        '''Command must default to the interval of its function'''
+        command = Command('plugin', 'tests.commands_test:plugin')
+        self.assertEqual(60, command.function and command.interval)
+
+    def test_selects_given_commands_in_order(self):
+        '''Commands must be selected in order of execution'''
+        with mock.patch('karlsruher.commands.plugins') as plugins:
+            given = selected(['karlsruher', '-retweet', '--home=x', '-daemon', '-housekeeping'])
+        self.assertEqual(['housekeeping', 'retweet'], [command.name for command in given])
+        plugins.assert_not_called()
+
+    def test_selects_plugins_for_unknown_commands(self):
+        '''Plugins must be looked up for unknown commands only'''
+        plugin_command = Command('plugin', 'tests.commands_test:plugin')
+        with mock.patch('karlsruher.commands.plugins', return_value=(plugin_command,)):
+            with self.assertLogs('Commands', 'WARNING') as logs:
+                given = selected(['karlsruher', '-plugin', '-drain', '-unknown'])
+        self.assertEqual([commands.COMMANDS[-1], plugin_command], given)
+        self.assertEqual(['WARNING:Commands:Unknown command -unknown'], logs.output)
+
+    def test_finds_entry_points(self):
+        '''Plugins must be found as entry points'''
+        self.assertIsInstance(commands.plugins(), tuple)
+
+    def test_configures_accounts(self):
+        '''Account options must be applied to every account'''
+        from karlsruher.__main__ import configure # pylint: disable=import-outside-toplevel
+        accounts = [mock.Mock(budget=None), mock.Mock(budget=None)]
+        with mock.patch('sys.argv', ['karlsruher', '--budget=3', '--stations=a,b']):
+            configure(mock.Mock(accounts=accounts))
+        self.assertEqual([3, 3], [account.budget for account in accounts])
+        self.assertEqual(('a', 'b'), accounts[1].stations)
+
+
+def plugin(karlsruher):
+    ''':param karlsruher: A Karlsruher instance.'''
+    karlsruher.plugin()
+
+plugin.interval = 60
+
@@ -0,0 +1,89 @@
+'''
+FakeTwitterTest
+'''
+
+import os
+import tempfile
+
+from unittest import TestCase
+
+from tweepy.error import TweepError
+
+from karlsruher.asyncapi import AsyncAPI
+from karlsruher.fakeapi import FakeTwitter
+from karlsruher.karlsruher import Karlsruher, retweet_mentions
+from karlsruher.tweepyx import tweepyx
+
+
+class FakeTwitterTest(TestCase):
+    '''
+    Test the robot end-to-end against the local fake Twitter API
+    '''
+
+    def setUp(self):
+        self.server = FakeTwitter(followers=7000, friends=10, mentions=300, timeline=5).start()
+        self.home = tempfile.TemporaryDirectory()
+        with open(os.path.join(self.home.name, 'auth.yaml'), 'w') as yaml_file:
+            yaml_file.write(tweepyx.YAML_TEMPLATE.format('A', 'B', 'C', 'D'))
+            yaml_file.write("\n    url: '{}'\n".format(self.server.base_url))
+        self.bot = None
+
+    def tearDown(self):
+        if self.bot:
+            self.bot.aio.close()
+            self.bot.unlock()
+            self.bot.brain.connection.close()
+        self.home.cleanup()
+        self.server.stop()
+
+    def test_points_tweepyx_at_server(self):
+        '''API must take the root URL from auth.yaml, or as argument'''
+        auth_yaml = os.path.join(self.home.name, 'auth.yaml')
+        self.assertEqual(self.server.base_url, tweepyx.API(auth_yaml).base_url)
+        self.assertEqual('http://other/1.1', tweepyx.API(auth_yaml, base_url='http://other/1.1').base_url)
+
+    def test_runs_robot(self):
+        '''Robot must work with the fake server end-to-end'''
+        self.bot = Karlsruher(self.home.name)
+        self.assertEqual('FakeRobot', self.bot.screen_name)
+        self.bot.housekeeping()
+        self.assertEqual(7000, sum(1 for _ in self.bot.brain.entries('follower')))
+        self.assertEqual(2, self.server.requests['/1.1/followers/ids.json'])
+        retweet_mentions(self.bot)
+        self.assertEqual(1, self.server.requests['/1.1/statuses/mentions_timeline.json'])
+        queued = len(self.bot.queue)
+        self.assertTrue(queued > 0)
+        self.bot.drain()
+        self.assertEqual(queued, len(self.server.retweeted))
+
+    def test_keeps_state(self):
+        '''Server must fail repeated actions like Twitter'''
+        api = AsyncAPI(base_url=self.server.base_url, pool_size=2)
+        try:
+            api.execute('retweet', id=7)
+            with self.assertRaises(TweepError) as context:
+                api.execute('retweet', id=7)
+            self.assertEqual(327, context.exception.api_code)
+            tweet = api.execute('update_status', status='Hello')
+            self.assertEqual('Hello', api.execute('user_timeline', count=1)[0].text)
+            api.execute('destroy_status', id=tweet.id)
+            with self.assertRaises(TweepError) as context:
+                api.execute('destroy_status', id=tweet.id)
+            self.assertEqual(144, context.exception.api_code)
+        finally:
+            api.close()
+
+    def test_limits_rate(self):
+        '''Server must answer 429 beyond the rate limit'''
+        self.server.rate_limit = 2
+        api = AsyncAPI(base_url=self.server.base_url, pool_size=2)
+        try:
+            api.execute('me')
+            api.execute('me')
+            with self.assertRaises(TweepError) as context:
+                api.execute('me')
+            self.assertEqual(88, context.exception.api_code)
+            self.assertEqual('0', api.session.get(self.server.base_url + '/account/verify_credentials.json')
+                             .headers['x-rate-limit-remaining'])
+        finally:
+            api.close()
@@ -4,13 +4,16 @@ RobotTestCaste RobotTest
 
 import os
 import tempfile
+import time
 
 from unittest import mock
 from unittest import TestCase
 from unittest.mock import patch
 
+from tweepy.error import TweepError
+
 from karlsruher.brain import Brain
-from karlsruher.karlsruher import Karlsruher, read_mentions, retweet_mentions
+from karlsruher.karlsruher import Karlsruher, mention_pages, read_mentions, retweet_mentions
 
 
 ## Static test data:
@@ -54,6 +57,11 @@ tweets = [
     tweet_reply_by_follower
 ]
 
+
+def fetched(karlsruher, count=200):
+    ''':return: All mentions of the pages, newest first.'''
+    return [mention for page in mention_pages(karlsruher, count) for mention in page]
+
 ##
 
 
@@ -64,15 +72,14 @@ class KarlsruherTest(TestCase):
         self.api_mock = mock.Mock(
             me=mock.MagicMock(return_value=user_me),
             list_members=mock.MagicMock(return_value=advisors),
-            follower_ids=mock.MagicMock(return_value=follower_ids),
-            friend_ids=mock.MagicMock(return_value=friend_ids),
-            update_status=mock.Mock(),
-            retweet=mock.Mock(),
+            followers_ids=mock.MagicMock(return_value=(follower_ids, (0, 0))),
+            friends_ids=mock.MagicMock(return_value=(friend_ids, (0, 0))),
+            update_status=mock.Mock(return_value=mock.Mock(id=9001, created_at=None)),
+            retweet=mock.Mock(return_value=mock.Mock(id=9002, created_at=None)),
             mentions_timeline=mock.MagicMock(return_value=tweets),
         )
 
         self.bot = Karlsruher(test_home, Brain(), self.api_mock)
-        self.bot.delay = 0
 
     def tearDown(self):
         if self.bot and os.path.isfile(self.bot.lockfile):
@@ -106,9 +113,49 @@ class KarlsruherTest(TestCase):
     def test_can_repr(self):
         self.assertIn('Hello', str(self.bot))
 
+    def test_can_fetch_identity_lazily(self):
+        self.assertEqual(0, self.api_mock.me.call_count)
+        self.assertEqual(0, self.api_mock.list_members.call_count)
+        self.assertEqual(user_me.screen_name, self.bot.screen_name)
+        self.assertEqual(user_me.screen_name, self.bot.screen_name)
+        self.assertEqual(1, self.api_mock.me.call_count)
+
     def test_can_fetch_advisors(self):
-        self.assertTrue(self.bot.brain.has('advisor', advisor_1.id))
-        self.assertTrue(self.bot.brain.has('advisor', advisor_2.id))
+        self.assertTrue(self.bot.is_advisor(advisor_1.id))
+        self.assertTrue(self.bot.is_advisor(advisor_2.id))
+        self.assertFalse(self.bot.is_advisor(user_unknown.id))
+        self.assertEqual(1, self.api_mock.list_members.call_count)
+
+    def test_retries_failed_advisors(self):
+        self.api_mock.list_members = mock.MagicMock(
+            side_effect=[TweepError('failing'), [advisor_1]]
+        )
+        with self.assertLogs('Karlsruher', 'ERROR'):
+            for _ in range(50):
+                self.assertFalse(self.bot.is_advisor(advisor_1.id))
+        self.assertEqual(1, self.api_mock.list_members.call_count)
+        self.assertIsNone(self.bot.brain.age('me', 'advisors'))
+        with patch('time.time', return_value=time.time() + self.bot.retry_ttl + 1):
+            self.assertTrue(self.bot.is_advisor(advisor_1.id))
+        self.assertEqual(2, self.api_mock.list_members.call_count)
+
+    def test_can_cache_identity_in_brain(self):
+        self.bot.is_advisor(advisor_1.id)
+        self.bot.unlock()
+        self.bot = Karlsruher(test_home, self.bot.brain, self.api_mock)
+        self.assertIn('@' + user_me.screen_name, str(self.bot))
+        self.assertTrue(self.bot.is_advisor(advisor_1.id))
+        self.assertEqual(1, self.api_mock.me.call_count)
+        self.assertEqual(1, self.api_mock.list_members.call_count)
+        self.bot.identity_ttl = -1
+        self.assertTrue(self.bot.is_advisor(advisor_1.id))
+        self.assertEqual(2, self.api_mock.list_members.call_count)
+
+    def test_can_refresh_identity(self):
+        self.bot.refresh()
+        self.bot.refresh()
+        self.assertEqual(2, self.api_mock.me.call_count)
+        self.assertEqual(2, self.api_mock.list_members.call_count)
 
     def test_can_apply_advises(self):
         self.assertFalse(self.bot.apply_advise(tweet_advise_unknown))
@@ -118,9 +165,10 @@ class KarlsruherTest(TestCase):
         self.assertTrue(self.bot.is_sleeping())
         self.assertTrue(self.bot.apply_advise(tweet_advise_start))
         self.assertFalse(self.bot.is_sleeping())
-        self.assertEqual(3, self.bot.api.update_status.call_count)
+        self.assertEqual(0, self.bot.api.update_status.call_count)
+        self.bot.drain()
+        self.assertEqual(2, self.bot.api.update_status.call_count)
 
-    @patch('tweepy.Cursor.items', mock.Mock(side_effect=[follower_ids, friend_ids]))
     def test_can_do_housekeeping(self):
         self.bot.housekeeping()
         self.assertTrue(self.bot.brain.has('follower', follower_1.id))
@@ -129,8 +177,6 @@ class KarlsruherTest(TestCase):
         self.assertTrue(self.bot.brain.has('friend', friend_1.id))
         self.assertTrue(self.bot.brain.has('friend', friend_2.id))
 
-    @patch('tweepy.Cursor.items', mock.Mock(side_effect=[follower_ids, friend_ids]))
-    #@patch('tweepy.API.mentions_timeline', mock.Mock(side_effect=tweets))
     def test_can_read_latest_mentions(self):
         '''Retweet mention by non-protected followers, when mention is not a reply'''
         latest_mentions = self.bot.latest_mentions()
@@ -145,7 +191,6 @@ class KarlsruherTest(TestCase):
         self.assertIn(tweet_reply_by_follower, latest_mentions)
         self.assertIn(tweet_advise_unknown, latest_mentions)
 
-    @patch('tweepy.Cursor.items', mock.Mock(side_effect=[follower_ids, friend_ids]))
     def test_can_read_mentions(self):
         '''Must retweet mentions'''
         self.bot.housekeeping()
@@ -153,16 +198,16 @@ class KarlsruherTest(TestCase):
         read_mentions(self.bot)
         self.assertEqual(0, len(self.bot.latest_mentions()))
 
-    @patch('tweepy.Cursor.items', mock.Mock(side_effect=[follower_ids, friend_ids]))
     def test_can_retweet_mentions(self):
         '''Must retweet mentions'''
         self.bot.housekeeping()
         self.assertEqual(0, self.bot.api.retweet.call_count)
         retweet_mentions(self.bot)
+        self.assertEqual(0, self.bot.api.retweet.call_count)
+        self.bot.drain()
         self.assertEqual(2, self.bot.api.retweet.call_count)
         self.assertEqual(0, len(self.bot.latest_mentions()))
 
-    @patch('tweepy.Cursor.items', mock.Mock(side_effect=[follower_ids, friend_ids]))
     def test_can_retweet_mentions_sleeping(self):
         '''Must retweet mentions'''
         self.bot.housekeeping()
@@ -173,3 +218,122 @@ class KarlsruherTest(TestCase):
         retweet_mentions(self.bot)
         self.assertEqual(0, self.bot.api.retweet.call_count)
         self.assertEqual(0, len(self.bot.latest_mentions()))
+
+    def test_can_do_housekeeping_by_delta(self):
+        self.bot.housekeeping()
+        self.api_mock.followers_ids.return_value = (follower_ids[1:], (0, 0))
+        self.bot.housekeeping()
+        self.assertFalse(self.bot.brain.has('follower', follower_1.id))
+        self.assertTrue(self.bot.brain.has('follower', follower_2.id))
+        self.assertTrue(self.bot.brain.has('friend', friend_1.id))
+
+    def test_can_prune(self):
+        self.bot.brain.store('tweet', tweet_by_follower_1.id)
+        self.bot.brain.store('tweet', tweet_by_follower_2.id)
+        self.bot.brain.connection.execute(
+            'UPDATE memory SET timestamp = 0 WHERE entry=?', (tweet_by_follower_1.id,)
+        )
+        self.bot.prune()
+        self.assertFalse(self.bot.brain.has('tweet', tweet_by_follower_1.id))
+        self.assertTrue(self.bot.brain.has('tweet', tweet_by_follower_2.id))
+
+    def test_can_fetch_mentions_since_id(self):
+        self.assertEqual(10, len(fetched(self.bot)))
+        self.bot.api.mentions_timeline.assert_called_with(count=200, since_id=None)
+        since_id = str(max(tweet.id for tweet in tweets))
+        self.assertEqual(since_id, self.bot.brain.get('mention', 'since_id'))
+        self.bot.api.mentions_timeline = mock.MagicMock(return_value=[])
+        self.assertEqual(0, len(fetched(self.bot)))
+        self.bot.api.mentions_timeline.assert_called_with(count=200, since_id=since_id)
+        self.assertEqual(since_id, self.bot.brain.get('mention', 'since_id'))
+
+    def test_can_fetch_mentions_by_pages(self):
+        self.bot.brain.store('mention', 'since_id', 1000)
+        self.bot.api.mentions_timeline = mock.MagicMock(side_effect=[
+            [mock.Mock(id=1004), mock.Mock(id=1003)],
+            [mock.Mock(id=1002), mock.Mock(id=1001)],
+            [],
+        ])
+        self.assertEqual([1004, 1003, 1002, 1001], [m.id for m in fetched(self.bot, count=2)])
+        self.bot.api.mentions_timeline.assert_called_with(count=2, since_id='1000', max_id=1000)
+        self.assertEqual('1004', self.bot.brain.get('mention', 'since_id'))
+
+    def test_can_take_over_stale_lock(self):
+        self.bot.unlock()
+        with open(self.bot.lockfile, 'w') as lockfile:
+            lockfile.write('999999999')
+        self.bot = Karlsruher(test_home, Brain(), self.api_mock)
+        with open(self.bot.lockfile, 'r') as lockfile:
+            self.assertEqual(str(os.getpid()), lockfile.read())
+
+    def test_can_do_housekeeping_by_pages(self):
+        self.api_mock.followers_ids = mock.MagicMock(side_effect=[
+            (follower_ids[:1], (0, 1)), (follower_ids[1:], (1, 0))
+        ])
+        self.bot.housekeeping()
+        self.api_mock.followers_ids.assert_called_with(cursor=1)
+        self.assertIsNone(self.bot.brain.space_id('staging:follower'))
+        self.assertIsNone(self.bot.brain.space_id('cursor'))
+        self.assertTrue(self.bot.brain.has('follower', follower_1.id))
+        self.assertTrue(self.bot.brain.has('follower', follower_3.id))
+        self.assertTrue(self.bot.brain.has('friend', friend_2.id))
+
+    def test_can_keep_spaces_on_housekeeping_errors(self):
+        self.bot.housekeeping()
+        self.api_mock.followers_ids = mock.MagicMock(side_effect=TweepError('failing'))
+        self.api_mock.friends_ids.return_value = (friend_ids[1:], (0, 0))
+        with self.assertLogs('Karlsruher', 'ERROR'):
+            self.bot.housekeeping()
+        self.assertTrue(self.bot.brain.has('follower', follower_1.id))
+        self.assertFalse(self.bot.brain.has('friend', friend_1.id))
+
+    def test_can_queue_tweets(self):
+        self.assertTrue(self.bot.retweet(tweet_by_follower_1))
+        self.assertFalse(self.bot.retweet(tweet_by_follower_1))
+        self.assertTrue(self.bot.tweet('Hello'))
+        self.assertEqual(0, self.api_mock.retweet.call_count)
+        self.bot.drain()
+        self.api_mock.retweet.assert_called_once_with(id=tweet_by_follower_1.id)
+        self.api_mock.update_status.assert_called_once_with(status='Hello')
+        self.assertEqual(0, len(self.bot.queue))
+
+    def test_can_drain_queued_actions(self):
+        self.api_mock.retweet = mock.Mock(side_effect=[
+            mock.Mock(id=9001, created_at=None), TweepError('failing'),
+            mock.Mock(id=9003, created_at=None)
+        ])
+        self.bot.queue.enqueue('retweet', 'retweet:1', id=1)
+        self.bot.queue.enqueue('retweet', 'retweet:2', id=2)
+        self.bot.queue.enqueue('retweet', 'retweet:3', id=3)
+        with self.assertLogs('ActionQueue', 'WARNING'):
+            self.bot.drain()
+        self.assertEqual(3, self.api_mock.retweet.call_count)
+        self.assertEqual(1, len(self.bot.queue))
+
+    def test_can_resume_housekeeping_within_budget(self):
+        self.api_mock.followers_ids = mock.MagicMock(side_effect=[
+            (follower_ids[:1], (0, 1)), (follower_ids[1:2], (1, 2)), (follower_ids[2:], (2, 0))
+        ])
+        self.bot.budget = 2
+        self.bot.housekeeping()
+        self.assertFalse(self.bot.brain.has('follower', follower_1.id))
+        self.assertTrue(self.bot.brain.has('friend', friend_1.id))
+        self.assertEqual('2', self.bot.brain.get('cursor', 'follower'))
+        self.bot.housekeeping()
+        self.api_mock.followers_ids.assert_called_with(cursor=2)
+        self.assertTrue(self.bot.brain.has('follower', follower_1.id))
+        self.assertTrue(self.bot.brain.has('follower', follower_3.id))
+        self.assertIsNone(self.bot.brain.age('cursor', 'follower'))
+        self.assertEqual([], list(self.bot.brain.entries('staging:follower')))
+
+    def test_can_resume_housekeeping_after_errors(self):
+        self.api_mock.followers_ids = mock.MagicMock(side_effect=[
+            (follower_ids[:1], (0, 1)), TweepError('failing'), (follower_ids[1:], (1, 0))
+        ])
+        with self.assertLogs('Karlsruher', 'ERROR'):
+            self.bot.housekeeping()
+        self.assertFalse(self.bot.brain.has('follower', follower_1.id))
+        self.bot.housekeeping()
+        self.assertTrue(self.bot.brain.has('follower', follower_1.id))
+        self.assertTrue(self.bot.brain.has('follower', follower_3.id))
+        self.assertEqual(3, self.api_mock.followers_ids.call_count)
@@ -0,0 +1,94 @@
+'''
+MetricsTest
+'''
+
+import os
+import tempfile
+
+from unittest import TestCase, mock
+
+import requests
+from tweepy.error import TweepError
+
+from karlsruher.asyncapi import AsyncAPI
+from karlsruher.brain import Brain
+from karlsruher.metrics import Metrics, REGISTRY
+
+
+class MetricsTest(TestCase):
+    '''
+    Test the Metrics
+    '''
+
+    def setUp(self):
+        self.metrics = Metrics()
+
+    def test_renders_prometheus_text(self):
+        '''Metrics must render counters and summaries'''
+        self.metrics.count('mentions', 3, stage='unseen', outcome='passed')
+        self.metrics.count('mentions', stage='unseen', outcome='passed')
+        self.metrics.observe('api_call', 0.25, endpoint='retweet')
+        self.metrics.observe('api_call', 0.5, endpoint='retweet')
+        self.assertEqual(
+            '# TYPE karlsruher_mentions_total counter\n'
+            'karlsruher_mentions_total{outcome="passed",stage="unseen"} 4\n'
+            '# TYPE karlsruher_api_call_seconds summary\n'
+            'karlsruher_api_call_seconds_count{endpoint="retweet"} 2\n'
+            'karlsruher_api_call_seconds_sum{endpoint="retweet"} 0.750000\n',
+            self.metrics.render()
+        )
+
+    def test_escapes_labels(self):
+        '''Metrics must escape label values'''
+        self.metrics.count('command_failures', home='/a "b"')
+        self.assertIn('{home="/a \\"b\\""} 1', self.metrics.render())
+
+    def test_times(self):
+        '''Metrics must time functions and blocks, also failing ones'''
+        @self.metrics.timed('brain', operation='fail')
+        def failing():
+            raise ValueError()
+        self.assertRaises(ValueError, failing)
+        with self.metrics.timer('block'):
+            pass
+        self.assertEqual(1, self.metrics.summaries[('brain', (('operation', 'fail'),))][0])
+        self.assertEqual(1, self.metrics.summaries[('block', ())][0])
+        self.metrics.clear()
+        self.assertEqual('\n', self.metrics.render())
+
+    def test_writes_file(self):
+        '''Metrics must replace a file'''
+        self.metrics.count('test')
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'karlsruher.prom')
+            self.metrics.write(path)
+            with open(path) as metrics_file:
+                self.assertIn('karlsruher_test_total 1', metrics_file.read())
+            self.assertEqual(['karlsruher.prom'], os.listdir(directory))
+
+    def test_serves_http(self):
+        '''Metrics must be served on /metrics'''
+        self.metrics.count('test')
+        server = self.metrics.serve(0)
+        try:
+            url = 'http://127.0.0.1:{}'.format(server.server_port)
+            self.assertIn('karlsruher_test_total 1', requests.get(url + '/metrics').text)
+            self.assertEqual(404, requests.get(url + '/other').status_code)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_instruments_api_and_brain(self):
+        '''API calls and Brain operations must be recorded'''
+        REGISTRY.clear()
+        api = AsyncAPI(api=mock.Mock(retweet=mock.Mock(side_effect=TweepError('no', api_code=327))))
+        try:
+            api.perform('me')
+            self.assertRaises(TweepError, api.perform, 'retweet', 1)
+        finally:
+            api.close()
+        Brain().has('test', 1)
+        rendered = REGISTRY.render()
+        self.assertIn('karlsruher_api_errors_total{code="327",endpoint="retweet"} 1', rendered)
+        self.assertIn('karlsruher_api_call_seconds_count{endpoint="me"} 1', rendered)
+        self.assertIn('karlsruher_brain_seconds_count{operation="has"} 1', rendered)
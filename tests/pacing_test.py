@@ -0,0 +1,68 @@
+'''
+PacerTest
+'''
+
+import time
+
+from unittest import mock
+from unittest import TestCase
+
+from karlsruher.pacing import Pacer, TokenBucket
+
+
+class PacerTest(TestCase):
+    '''
+    Test the Pacer
+    '''
+
+    def setUp(self):
+        self.sleep = mock.Mock()
+        self.pacer = Pacer(sleep=self.sleep)
+
+    def test_bucket_reserves_tokens(self):
+        '''Must release a burst and then pace at the refill rate'''
+        bucket = TokenBucket(2, 10)
+        now = bucket.updated
+        self.assertEqual(0, bucket.reserve(now))
+        self.assertEqual(0, bucket.reserve(now))
+        self.assertAlmostEqual(5, bucket.reserve(now))
+        self.assertAlmostEqual(10, bucket.reserve(now))
+        self.assertAlmostEqual(5, bucket.reserve(now + 10))
+
+    def test_can_release_burst(self):
+        '''Must not wait within the budget'''
+        for _ in range(50):
+            self.pacer.acquire('retweet')
+        self.assertEqual(0, self.sleep.call_count)
+
+    def test_can_share_buckets(self):
+        '''Must pace endpoints sharing a limit together'''
+        for _ in range(150):
+            self.pacer.acquire('retweet')
+            self.pacer.acquire('update_status')
+        self.assertEqual(0, self.sleep.call_count)
+        self.assertLess(30, self.pacer.acquire('retweet'))
+        self.assertEqual(0, self.pacer.acquire('destroy_status'))
+
+    def test_can_observe_headers(self):
+        '''Must block exhausted endpoints until reset'''
+        response = mock.Mock(headers={
+            'x-rate-limit-remaining': '0',
+            'x-rate-limit-reset': str(int(time.time()) + 60)
+        })
+        self.pacer.observe('mentions_timeline', response)
+        self.assertLess(50, self.pacer.acquire('mentions_timeline'))
+        self.sleep.assert_called_once()
+        self.assertEqual(0, self.pacer.acquire('user_timeline'))
+
+    def test_can_back_off(self):
+        '''Must back off after rate-limit errors without headers'''
+        self.pacer.observe('retweet', mock.Mock(headers={}, status_code=429))
+        self.assertLess(800, self.pacer.acquire('update_status'))
+
+    def test_ignores_unknown_responses(self):
+        '''Must ignore missing or broken responses'''
+        self.pacer.observe('retweet', None)
+        self.pacer.observe('retweet', mock.Mock())
+        self.pacer.observe('unknown', mock.Mock(headers={'x-rate-limit-remaining': '5'}))
+        self.assertEqual(0, self.pacer.acquire('retweet'))
@@ -0,0 +1,73 @@
+'''
+PipelineTest
+'''
+
+from unittest import TestCase, mock
+
+from karlsruher import pipeline
+from karlsruher.brain import Brain
+from karlsruher.pipeline import Pipeline, Stage
+
+
+user = mock.Mock(id=101, screen_name='user', protected=False)
+protected = mock.Mock(id=102, screen_name='protected', protected=True)
+
+mention_1 = mock.Mock(id=1, user=user, in_reply_to_status_id=None)
+mention_2 = mock.Mock(id=2, user=protected, in_reply_to_status_id=None)
+mention_3 = mock.Mock(id=3, user=user, in_reply_to_status_id=1)
+
+
+class PipelineTest(TestCase):
+    '''
+    Test the Pipeline and its stages
+    '''
+
+    def setUp(self):
+        self.karlsruher = mock.Mock(brain=Brain(), screen_name='me')
+        self.karlsruher.is_sleeping.return_value = False
+
+    def test_stage_counts(self):
+        '''Stage must count mentions and pages'''
+        stage = Stage(pipeline.no_replies)
+        self.assertEqual([mention_1, mention_2], stage(self.karlsruher, [mention_1, mention_2, mention_3]))
+        self.assertEqual([mention_1], stage(self.karlsruher, [mention_1]))
+        self.assertEqual((2, 4, 3), (stage.pages, stage.count_in, stage.count_out))
+        self.assertTrue(repr(stage).startswith('no_replies: 2 pages, 4 in, 3 out'))
+
+    def test_streams_pages(self):
+        '''Pipeline must pass pages lazily and skip empty ones'''
+        later = mock.Mock(side_effect=lambda _, page: page)
+        flow = Pipeline(self.karlsruher, pipeline.unprotected, Stage(later, 'later'))
+        pages = iter([[mention_2], [mention_1, mention_3]])
+        passed = flow.run(pages)
+        self.assertEqual(mention_1, next(passed))
+        self.assertEqual(1, later.call_count)
+        self.assertEqual([mention_3], list(passed))
+        self.assertEqual(2, flow.stages[0].pages)
+        self.assertEqual(1, flow.stages[1].pages)
+
+    def test_consume_logs_metrics(self):
+        '''Pipeline must log metrics per stage'''
+        flow = Pipeline(self.karlsruher, pipeline.no_replies, pipeline.unprotected)
+        with self.assertLogs('Pipeline', 'INFO') as logs:
+            self.assertEqual(1, flow.consume([[mention_1, mention_2, mention_3]]))
+        self.assertEqual(2, len(logs.output))
+        self.assertIn('unprotected: 1 pages, 2 in, 1 out', repr(flow))
+
+    def test_unseen_once(self):
+        '''Stage must pass mentions not remembered, once per page'''
+        self.karlsruher.brain.store('tweet', mention_1.id)
+        self.assertEqual([mention_2], pipeline.unseen(self.karlsruher, [mention_1, mention_2, mention_2]))
+        pipeline.remember(self.karlsruher, [mention_2])
+        self.assertEqual([], pipeline.unseen(self.karlsruher, [mention_2]))
+
+    def test_by_followers(self):
+        '''Stage must pass mentions by followers only'''
+        self.karlsruher.brain.store('follower', protected.id)
+        self.assertEqual([mention_2], pipeline.by_followers(self.karlsruher, [mention_1, mention_2]))
+
+    def test_awake(self):
+        '''Stage must pass nothing when sleeping'''
+        self.assertEqual([mention_1], pipeline.awake(self.karlsruher, [mention_1]))
+        self.karlsruher.is_sleeping.return_value = True
+        self.assertEqual([], pipeline.awake(self.karlsruher, [mention_1]))
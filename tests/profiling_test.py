@@ -0,0 +1,53 @@
+'''
+ProfilingTest
+'''
+
+import glob
+import os
+import pstats
+import tempfile
+
+from unittest import TestCase, mock
+
+from karlsruher.__main__ import profile
+from karlsruher.profiling import profiled
+
+
+def workload():
+    ''':return: Something to profile.'''
+    return sorted(str(number) for number in range(10000))
+
+
+class ProfilingTest(TestCase):
+    '''
+    Test profiling commands
+    '''
+
+    def setUp(self):
+        self.home = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.home.cleanup()
+
+    def test_writes_report_and_stats(self):
+        '''Profile must write a sorted report and loadable stats'''
+        with self.assertLogs('Profile', 'INFO'):
+            with profiled(self.home.name, 'test'):
+                workload()
+        report, = glob.glob(os.path.join(self.home.name, 'profile-test-*.txt'))
+        stats, = glob.glob(os.path.join(self.home.name, 'profile-test-*.prof'))
+        with open(report) as report_file:
+            content = report_file.read()
+        self.assertTrue(content.startswith('Profile of test in '))
+        self.assertIn('workload', content)
+        self.assertIn('Top allocations by line:', content)
+        self.assertTrue(pstats.Stats(stats).total_calls > 0)
+
+    def test_profiles_accounts(self):
+        '''Main must profile the commands of every account in this thread'''
+        karlsruher = mock.Mock(home=self.home.name)
+        runner = mock.Mock(accounts=[karlsruher], execute=mock.Mock(side_effect=[True]))
+        with self.assertLogs('Profile', 'INFO'):
+            self.assertTrue(profile(runner, [workload]))
+        runner.execute.assert_called_once_with(karlsruher, [workload])
+        self.assertEqual(1, len(glob.glob(os.path.join(self.home.name, 'profile-workload-*.prof'))))
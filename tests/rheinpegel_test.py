@@ -0,0 +1,162 @@
+'''
+PegelonlineTest
+'''
+
+import os
+import tempfile
+import time
+
+from unittest import TestCase, mock
+
+from karlsruher.brain import Brain
+from karlsruher.fakeapi import FakePegelonline
+from karlsruher.karlsruher import Karlsruher
+from karlsruher.rheinpegel import MAXAU, Pegelonline, measured, pegel, rhein, trend
+from karlsruher.timeseries import Rolling
+
+
+class PegelonlineTest(TestCase):
+    '''
+    Test fetching measurements from the local fake pegelonline API
+    '''
+
+    def setUp(self):
+        self.server = FakePegelonline().start()
+        self.brain = Brain()
+        self.pegelonline = Pegelonline(self.brain, self.server.base_url)
+        self.measurement_path = '/webservices/rest-api/v2/stations/{}/{}/currentmeasurement.json'
+
+    def tearDown(self):
+        self.pegelonline.close()
+        self.server.stop()
+
+    def requests(self, timeseries):
+        ''':return: Number of requests of a timeseries of Maxau.'''
+        return self.server.requests[self.measurement_path.format(MAXAU, timeseries)]
+
+    def test_measured_as_epoch(self):
+        '''Timestamps must be parsed with their offset'''
+        self.assertEqual(0, measured('1970-01-01T01:00:00+01:00'))
+
+    def test_trend(self):
+        '''Trend must need half the window and compare the rate to the threshold'''
+        self.assertIsNone(trend(Rolling(3600, [(0, 500), (1799, 600)])))
+        self.assertEqual('steigend', trend(Rolling(3600, [(0, 500), (1800, 502)]), 3))
+        self.assertEqual('fallend', trend(Rolling(3600, [(0, 500), (1800, 498)]), 3))
+        self.assertEqual('gleichbleibend', trend(Rolling(3600, [(0, 500), (1800, 501)]), 3))
+
+    def test_can_fetch_measurements(self):
+        '''Must fetch W and Q'''
+        pegel, fluss = self.pegelonline.measurements(MAXAU, ('W', 'Q'))
+        self.assertEqual(500, pegel['value'])
+        self.assertEqual(1000, fluss['value'])
+        self.assertEqual(1, self.requests('W'))
+        self.assertEqual(1, self.requests('Q'))
+
+    def test_caches_by_timestamp(self):
+        '''Must not request until the next measurement is due, then conditionally'''
+        self.pegelonline.measurements(MAXAU, ('W', 'Q'))
+        with Pegelonline(self.brain, self.server.base_url) as again:
+            self.assertEqual(500, again.measurements(MAXAU, 'W')[0]['value'])
+        self.assertEqual(1, self.requests('W'))
+
+        self.server.measure(MAXAU, 'W', 510, time.time() - 60)
+        with mock.patch.object(Pegelonline, 'interval', 0):
+            self.assertEqual(510, self.pegelonline.measurements(MAXAU, 'W')[0]['value'])
+            self.assertEqual(510, self.pegelonline.measurements(MAXAU, 'W')[0]['value'])
+            self.assertEqual(1000, self.pegelonline.measurements(MAXAU, 'Q')[0]['value'])
+        self.assertEqual(3, self.requests('W'))
+        self.assertEqual(2, self.requests('Q'))
+
+    def test_retries(self):
+        '''Must retry failing requests'''
+        self.server.failures = 1
+        self.assertEqual(500, self.pegelonline.measurements(MAXAU, 'W')[0]['value'])
+        self.assertEqual(2, self.requests('W'))
+
+    def test_fails_gracefully(self):
+        '''Must provide None for unknown measurements'''
+        with self.assertLogs('Pegelonline', 'ERROR'):
+            self.assertEqual([None], self.pegelonline.measurements('unknown', 'W'))
+        with self.assertLogs('Pegelonline', 'ERROR'):
+            with Pegelonline(base_url='http://127.0.0.1:1', retries=0) as unreachable:
+                self.assertEqual([None], unreachable.measurements(MAXAU, 'W'))
+
+    def test_can_fetch_stations_in_bulk(self):
+        '''Must fetch many stations with one request, cached ones not again'''
+        self.server.measure('c0ffee00-station', 'W', 300)
+        current = self.pegelonline.stations([MAXAU, 'c0ffee00-station', 'unknown'], ('W', 'Q'))
+        self.assertEqual([500, 1000], [measurement['value'] for measurement in current[MAXAU]])
+        self.assertEqual('MAXAU', current[MAXAU][0]['station'])
+        self.assertEqual(300, current['c0ffee00-station'][0]['value'])
+        self.assertEqual([None, None], current['unknown'])
+        self.assertEqual(1, sum(self.server.requests.values()))
+
+        current = self.pegelonline.stations([MAXAU, 'c0ffee00-station'], ('W',))
+        self.assertEqual(500, current[MAXAU][0]['value'])
+        self.assertEqual(1, sum(self.server.requests.values()))
+        self.assertEqual(500, self.pegelonline.measurements(MAXAU, ('W',))[0]['value'])
+        self.assertEqual(1, sum(self.server.requests.values()))
+
+    def test_falls_back_to_concurrent_requests(self):
+        '''Must fetch one by one when the bulk request fails'''
+        self.server.bulk = False
+        with self.assertLogs('Pegelonline', 'WARNING'):
+            current = self.pegelonline.stations([MAXAU], ('W', 'Q'))
+        self.assertEqual([500, 1000], [measurement['value'] for measurement in current[MAXAU]])
+        self.assertEqual(1, self.requests('W'))
+        self.assertEqual(1, self.requests('Q'))
+
+
+class RheinpegelTest(TestCase):
+    '''
+    Test the robot commands against the local fake pegelonline API
+    '''
+
+    def setUp(self):
+        self.server = FakePegelonline().start()
+        self.addCleanup(self.server.stop)
+        patcher = mock.patch('karlsruher.rheinpegel.PEGELONLINE_URL', self.server.base_url)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.brain = Brain()
+        self.bot = Karlsruher(tempfile.gettempdir(), self.brain, mock.Mock(me=mock.Mock(
+            return_value=mock.Mock(id=1, screen_name='TestRobot')
+        )))
+
+    def tearDown(self):
+        self.bot.aio.close()
+        if os.path.isfile(self.bot.lockfile):
+            os.remove(self.bot.lockfile)
+
+    def test_pegel(self):
+        '''Robot must record and log the measurements of all stations'''
+        with self.assertLogs('Karlsruher', 'WARNING'):
+            pegel(self.bot)
+        self.bot.stations = (MAXAU, 'unknown')
+        with self.assertLogs('Karlsruher', 'INFO') as logs:
+            pegel(self.bot)
+        self.assertEqual([
+            'INFO:Karlsruher:MAXAU: W 500.0 cm, Q 1000.0 m3/s',
+            'INFO:Karlsruher:unknown: no measurements'
+        ], logs.output)
+        self.assertEqual(1000.0, self.brain.series('{}/Q'.format(MAXAU))[0][1])
+
+    def test_rhein(self):
+        '''Robot must log the measurements and differences'''
+        self.brain.store('rhein', 'pegel', 490)
+        with self.assertLogs('Karlsruher', 'INFO') as logs:
+            rhein(self.bot)
+        self.assertIn('steht bei 500 cm (10) und fliesst mit 1000 m^3/s (0)', logs.output[0])
+        self.assertEqual(500, int(self.brain.get('rhein', 'pegel')))
+        self.assertEqual(0, len(self.bot.queue))
+
+        series = '{}/W'.format(MAXAU)
+        for hours in range(3, 0, -1):
+            self.brain.record(series, time.time() - hours * 3600, 500 - hours * 10)
+        with mock.patch('sys.argv', ['karlsruher', '-rhein', '--tweet']):
+            with self.assertLogs('Karlsruher', 'INFO') as logs:
+                rhein(self.bot)
+            rhein(self.bot)
+        self.assertIn('Tendenz steigend: +10.0 cm/h, zwischen 470 und 500 cm', logs.output[-1])
+        self.assertEqual(1, len(self.bot.queue))
@@ -0,0 +1,83 @@
+'''
+RunnerTest
+'''
+
+import os
+import tempfile
+import threading
+
+from unittest import mock
+from unittest import TestCase
+
+from karlsruher.brain import Brain
+from karlsruher.karlsruher import Karlsruher
+from karlsruher.runner import Runner
+
+
+def command(karlsruher):
+    '''Remember the account in its brain.'''
+    karlsruher.brain.store('test', 'command', karlsruher.home)
+
+
+def failing(karlsruher):
+    '''Fail for the account.'''
+    raise RuntimeError(karlsruher.home)
+
+
+class RunnerTest(TestCase):
+    '''
+    Test the Runner
+    '''
+
+    def setUp(self):
+        self.homes = [tempfile.mkdtemp(), tempfile.mkdtemp()]
+        self.runner = Runner(self.homes, workers=2, factory=lambda home, executor, pool_size: Karlsruher(
+            home, Brain(), mock.Mock(), executor, pool_size
+        ))
+
+    def tearDown(self):
+        self.runner.close()
+        for home in self.homes:
+            os.rmdir(home)
+
+    def test_can_repr(self):
+        self.assertIn('Running 2 accounts', str(self.runner))
+
+    def test_can_lock_all_accounts(self):
+        for home in self.homes:
+            self.assertTrue(os.path.isfile(os.path.join(home, 'lock')))
+        self.assertRaises(RuntimeError, Runner, self.homes[1:])
+
+    def test_can_isolate_accounts(self):
+        first, second = self.runner.accounts
+        self.assertIsNot(first.brain, second.brain)
+        self.assertIsNot(first.pacer, second.pacer)
+        self.assertIs(first.aio.executor, second.aio.executor)
+
+    def test_can_run_commands_for_all_accounts(self):
+        self.runner.run([command])
+        for karlsruher in self.runner.accounts:
+            self.assertEqual(karlsruher.home, karlsruher.brain.get('test', 'command'))
+
+    def test_can_survive_failing_commands(self):
+        with self.assertLogs('Runner', 'ERROR'):
+            futures = self.runner.submit([failing, command])
+            self.assertEqual([False, False], [future.result() for future in futures])
+        self.assertEqual(self.homes[0], self.runner.accounts[0].brain.get('test', 'command'))
+
+    def test_can_skip_busy_accounts(self):
+        started, proceed = threading.Event(), threading.Event()
+        def blocking(_):
+            started.set()
+            proceed.wait(5)
+        futures = self.runner.submit([blocking])
+        started.wait(5)
+        with self.assertLogs('Runner', 'WARNING'):
+            self.assertFalse(self.runner.execute(self.runner.accounts[0], [command]))
+        proceed.set()
+        self.assertEqual([True, True], [future.result() for future in futures])
+
+    def test_can_unlock_on_close(self):
+        self.runner.close()
+        for home in self.homes:
+            self.assertFalse(os.path.isfile(os.path.join(home, 'lock')))
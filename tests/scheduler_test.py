@@ -0,0 +1,61 @@
+'''
+SchedulerTest
+'''
+
+from unittest import mock
+from unittest import TestCase
+
+from karlsruher.scheduler import Scheduler
+
+
+class SchedulerTest(TestCase):
+    '''
+    Test the Scheduler
+    '''
+
+    def setUp(self):
+        self.scheduler = Scheduler()
+
+    def test_can_repr(self):
+        self.scheduler.every(60, 'test', mock.Mock())
+        self.assertEqual('Scheduling test every 60s.', str(self.scheduler))
+
+    def test_can_run_pending(self):
+        '''Must run due jobs only'''
+        often, seldom = mock.Mock(), mock.Mock()
+        self.scheduler.every(0, 'often', often, 'arg')
+        self.scheduler.every(3600, 'seldom', seldom)
+        self.assertEqual(0, self.scheduler.run_pending())
+        self.assertEqual(0, self.scheduler.run_pending())
+        often.assert_called_with('arg')
+        self.assertEqual(2, often.call_count)
+        self.assertEqual(0, seldom.call_count)
+        self.scheduler.jobs[1]['due'] = 0
+        self.assertEqual(0, self.scheduler.run_pending())
+        self.assertEqual(1, seldom.call_count)
+
+    def test_can_stagger(self):
+        '''Must not let all first runs fall due at once'''
+        with mock.patch('time.monotonic', return_value=100):
+            self.scheduler.every(60, 'first', mock.Mock())
+            self.scheduler.every(60, 'second', mock.Mock())
+            self.scheduler.every(5, 'frequent', mock.Mock())
+        self.assertEqual([100, 110, 105], [job['due'] for job in self.scheduler.jobs])
+
+    def test_can_survive_failing_jobs(self):
+        '''Must reschedule failing jobs'''
+        failing = mock.Mock(side_effect=RuntimeError('failing'))
+        self.scheduler.every(3600, 'failing', failing)
+        with self.assertLogs('Scheduler', 'ERROR'):
+            self.assertLess(3599, self.scheduler.run_pending())
+        self.assertEqual(1, failing.call_count)
+
+    def test_can_run_until_stopped(self):
+        '''Must stop gracefully'''
+        job = mock.Mock()
+        job.side_effect = lambda: job.call_count == 3 and self.scheduler.stop()
+        self.scheduler.every(0, 'job', job)
+        self.scheduler.every(0, 'never', mock.Mock())
+        self.scheduler.run()
+        self.assertEqual(3, job.call_count)
+        self.assertEqual(2, self.scheduler.jobs[1]['function'].call_count)
@@ -0,0 +1,45 @@
+'''
+RollingTest
+'''
+
+from unittest import TestCase
+
+from karlsruher.timeseries import Rolling
+
+
+class RollingTest(TestCase):
+    '''
+    Test rolling statistics
+    '''
+
+    def test_without_values(self):
+        '''Statistics must be None without values'''
+        rolling = Rolling(60)
+        self.assertEqual(0, len(rolling))
+        self.assertIsNone(rolling.average)
+        self.assertIsNone(rolling.minimum)
+        self.assertIsNone(rolling.maximum)
+        self.assertEqual(0.0, rolling.rate)
+        self.assertEqual('No values', repr(rolling))
+
+    def test_rolls_window(self):
+        '''Statistics must cover the window only'''
+        rolling = Rolling(60, [(0, 5), (30, 1), (60, 3)])
+        self.assertEqual((3, 3.0, 1, 5), (len(rolling), rolling.average, rolling.minimum, rolling.maximum))
+        rolling.add(61, 2)
+        self.assertEqual((3, 2.0, 1, 3), (len(rolling), rolling.average, rolling.minimum, rolling.maximum))
+        rolling.add(120, 4)
+        self.assertEqual((3, 3.0, 2, 4), (len(rolling), rolling.average, rolling.minimum, rolling.maximum))
+        self.assertEqual(1 / 60, rolling.rate)
+        self.assertEqual('3 values, average 3.0, min 2, max 4, +60.0 per hour', repr(rolling))
+
+    def test_matches_recomputing(self):
+        '''Statistics must equal the ones recomputed from the window'''
+        values = [(timestamp * 7, (timestamp * 37) % 101) for timestamp in range(1000)]
+        rolling = Rolling(300)
+        for index, (timestamp, value) in enumerate(values):
+            rolling.add(timestamp, value)
+            window = [v for t, v in values[:index + 1] if t >= timestamp - 300]
+            self.assertEqual(min(window), rolling.minimum)
+            self.assertEqual(max(window), rolling.maximum)
+            self.assertAlmostEqual(sum(window) / len(window), rolling.average)
@@ -1,6 +1,145 @@
-from unittest import TestCase
+'''
+VergissesTest
+'''
+
+import os
+import tempfile
+
+from datetime import datetime, timedelta
+from unittest import TestCase, mock
+
+from tweepy.error import TweepError
+
+from karlsruher.brain import Brain
+from karlsruher.karlsruher import Karlsruher
+from karlsruher.vergisses import SPACE, created, delete_aged_tweets, index_tweets
+
+
+now = datetime.utcnow()
+
+def tweet(tweet_id, days):
+    ''':return: A mocked tweet created days ago.'''
+    return mock.Mock(id=tweet_id, created_at=now - timedelta(days=days, minutes=1))
+
+timeline = [tweet(105, 1), tweet(104, 2), tweet(103, 8), tweet(102, 9), tweet(101, 30)]
+
+
+def user_timeline(count, max_id, trim_user, since_id=None):
+    ''':return: A page of the mocked timeline, like Twitter.'''
+    return [
+        tweet for tweet in timeline
+        if (max_id is None or tweet.id <= max_id) and (since_id is None or tweet.id > since_id)
+    ][:2]
+
 
 class VergissesTest(TestCase):
+    '''
+    Test deleting aged tweets
+    '''
+
+    def setUp(self):
+        self.api_mock = mock.Mock(
+            me=mock.MagicMock(return_value=mock.Mock(id=111, screen_name='TestRobot')),
+            user_timeline=mock.Mock(side_effect=user_timeline),
+            destroy_status=mock.Mock(),
+            update_status=mock.Mock(return_value=tweet(106, 0)),
+        )
+        self.bot = Karlsruher(tempfile.gettempdir(), Brain(), self.api_mock)
+
+    def tearDown(self):
+        self.bot.aio.close()
+        if os.path.isfile(self.bot.lockfile):
+            os.remove(self.bot.lockfile)
+
+    def test_created_as_epoch(self):
+        '''Creation must be the UTC epoch'''
+        self.assertEqual(86400, created(mock.Mock(created_at=datetime(1970, 1, 2))))
 
     def test_can_delete_aged_tweets(self):
-        self.fail('Not yet implemented')
+        '''Must index the timeline once and delete aged tweets only'''
+        delete_aged_tweets(self.bot)
+        self.assertEqual(
+            [mock.call(count=200, max_id=None, trim_user=True)] + [
+                mock.call(count=200, max_id=max_id, trim_user=True) for max_id in (103, 101, 100)
+            ] + [
+                mock.call(count=200, since_id=105, max_id=None, trim_user=True)
+            ], self.api_mock.user_timeline.call_args_list
+        )
+        self.assertEqual(
+            [101, 102, 103], sorted(call[0][0] for call in self.api_mock.destroy_status.call_args_list)
+        )
+        self.assertEqual([105, 104], sorted(self.bot.brain.entries(SPACE), reverse=True))
+
+        delete_aged_tweets(self.bot)
+        self.assertEqual(6, self.api_mock.user_timeline.call_count)
+        self.assertEqual(3, self.api_mock.destroy_status.call_count)
+
+    def test_keeps_failing_tweets(self):
+        '''Must keep tweets failing to delete, but forget gone ones'''
+        index_tweets(self.bot.brain, timeline)
+        self.bot.brain.store('vergisses', 'backfilled')
+        self.api_mock.destroy_status = mock.Mock(side_effect=[
+            TweepError('gone', api_code=144), TweepError('failing'), None
+        ])
+        with self.assertLogs('Karlsruher', 'ERROR'):
+            delete_aged_tweets(self.bot)
+        self.api_mock.user_timeline.assert_called_once_with(
+            count=200, since_id=105, max_id=None, trim_user=True
+        )
+        self.assertEqual(3, self.api_mock.destroy_status.call_count)
+        self.assertEqual(3, len(list(self.bot.brain.entries(SPACE))))
+
+    def test_tops_up_tweets_posted_elsewhere(self):
+        '''Must index tweets posted after the backfill, like from the web'''
+        delete_aged_tweets(self.bot)
+        posted = [tweet(108, 10), tweet(107, 10)]
+        timeline[:0] = posted
+        try:
+            delete_aged_tweets(self.bot)
+        finally:
+            del timeline[:2]
+        self.assertEqual(
+            mock.call(count=200, since_id=105, max_id=None, trim_user=True),
+            self.api_mock.user_timeline.call_args_list[-2]
+        )
+        self.assertEqual([104, 105], sorted(self.bot.brain.entries(SPACE)))
+        self.assertEqual(
+            [107, 108], sorted(call[0][0] for call in self.api_mock.destroy_status.call_args_list[3:])
+        )
+
+    def test_indexes_own_tweets(self):
+        '''Tweets sent must be indexed'''
+        self.bot.tweet('Hello')
+        self.bot.queue.enqueue('update_status', status='Queued')
+        self.bot.drain()
+        self.assertEqual([106], list(self.bot.brain.entries(SPACE)))
+        self.assertEqual([106], self.bot.brain.aged(SPACE, 0))
+        self.assertEqual([], self.bot.brain.aged(SPACE, 3600))
+
+    def test_can_delete_in_bulk(self):
+        '''Must skip failing tweets in later batches and count deletions'''
+        index_tweets(self.bot.brain, timeline)
+        self.bot.brain.store('vergisses', 'backfilled')
+        self.bot.bulk = 1
+        self.api_mock.destroy_status = mock.Mock(side_effect=[TweepError('failing'), None, None])
+        with self.assertLogs('Karlsruher', 'ERROR'):
+            delete_aged_tweets(self.bot)
+        self.assertEqual(
+            [101, 102, 103], [call[0][0] for call in self.api_mock.destroy_status.call_args_list]
+        )
+        self.assertEqual([101, 104, 105], sorted(self.bot.brain.entries(SPACE)))
+        self.assertEqual(2, int(self.bot.brain.get('vergisses', 'deleted')))
+
+    def test_resumes_after_interruption(self):
+        '''Must keep deletions of finished batches when interrupted'''
+        index_tweets(self.bot.brain, timeline)
+        self.bot.brain.store('vergisses', 'backfilled')
+        self.api_mock.destroy_status = mock.Mock(side_effect=[None, KeyboardInterrupt()])
+        delete_aged_tweets(self.bot, batch_size=1)
+        self.assertEqual([102, 103, 104, 105], sorted(self.bot.brain.entries(SPACE)))
+        self.api_mock.destroy_status = mock.Mock()
+        delete_aged_tweets(self.bot, batch_size=1)
+        self.assertEqual(
+            [102, 103], [call[0][0] for call in self.api_mock.destroy_status.call_args_list]
+        )
+        self.assertEqual(3, int(self.bot.brain.get('vergisses', 'deleted')))